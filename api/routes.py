@@ -1,13 +1,34 @@
-from fastapi import APIRouter, HTTPException
+from contextlib import nullcontext
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel, field_validator
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
+from config.settings import BATCH_MAX_KEYWORDS, SAMPLE_MAX_SIZE, STATS_FIELDS, TREND_INTERVALS, TREND_MAX_BUCKETS
+from core import codec
+from core.admission import AdmissionRejected
+from core.exporter import FORMATS as EXPORT_FORMATS, COMPRESSIONS as EXPORT_COMPRESSIONS, compression_available
+from core.profiler import Profiler
 from core.search_service import SearchService
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
-router = APIRouter()
+
+class CodecJSONResponse(JSONResponse):
+    """用core.codec序列化的JSON响应
+
+    路由直接返回该响应时跳过FastAPI的jsonable_encoder逐层转换，结果较大的接口（搜索、统计）直接返回它。
+    """
+
+    def render(self, content) -> bytes:
+        return codec.dumps(content)
+
+router = APIRouter(default_response_class=CodecJSONResponse)
 search_service = SearchService()
+profiler = Profiler()
+
+# 组合统计接口支持的维度
+STATS_DIMENSIONS = [*STATS_FIELDS, "keyword"]
 
 class SearchRequest(BaseModel):
     keyword: str
@@ -15,6 +36,13 @@ class SearchRequest(BaseModel):
     end_time: str
     context_chars: Optional[int] = None
     max_results: Optional[int] = None
+    page_size: Optional[int] = None
+    slices: Optional[int] = None
+    highlight: Optional[bool] = None
+    top_n: Optional[int] = None
+    ngram: Optional[int] = None
+    sample: Optional[int] = None
+    seed: Optional[int] = None
 
     @field_validator('start_time', 'end_time')
     @classmethod
@@ -49,28 +77,241 @@ class SearchRequest(BaseModel):
             raise ValueError("最大结果数必须大于等于1")
         return v
 
+    @field_validator('page_size')
+    @classmethod
+    def validate_page_size(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and not 1 <= v <= 10000:
+            raise ValueError("每页数量必须在1到10000之间")
+        return v
+
+    @field_validator('slices')
+    @classmethod
+    def validate_slices(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and not 1 <= v <= 64:
+            raise ValueError("分片数必须在1到64之间")
+        return v
+
+    @field_validator('top_n')
+    @classmethod
+    def validate_top_n(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 1:
+            raise ValueError("显示数量必须大于等于1")
+        return v
+
+    @field_validator('ngram')
+    @classmethod
+    def validate_ngram(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and not 1 <= v <= 10:
+            raise ValueError("邻接片段长度必须在1到10之间")
+        return v
+
+    @field_validator('sample')
+    @classmethod
+    def validate_sample(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and not 1 <= v <= SAMPLE_MAX_SIZE:
+            raise ValueError(f"样本量必须在1到{SAMPLE_MAX_SIZE}之间")
+        return v
+
+    @field_validator('seed')
+    @classmethod
+    def validate_seed(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and not 0 <= v < 2 ** 31:
+            raise ValueError("随机种子必须在0到2147483647之间")
+        return v
+
+def _profile_flag(http_request: Request) -> Optional[str]:
+    return http_request.headers.get("X-Profile") or http_request.query_params.get("profile")
+
 @router.post("/search")
-async def search(request: SearchRequest):
-    """搜索接口"""
+async def search(request: SearchRequest, http_request: Request):
+    """搜索接口；带X-Profile头或profile查询参数时剖析本次搜索，并在结果中返回剖析id"""
     try:
+        profile_flag = _profile_flag(http_request)
+        profiling = Profiler.requested(profile_flag)
+        if profiling and not profiler.authorize(profile_flag):
+            raise HTTPException(status_code=403, detail="性能剖析未开启或口令错误")
+
         # 执行搜索
-        result = search_service.search(
+        capture = profiler.capture("search", request.model_dump()) if profiling else nullcontext()
+        async with capture as profile_id:
+            result = await search_service.search(
+                keyword=request.keyword,
+                start_time=request.start_time,
+                end_time=request.end_time,
+                context_chars=request.context_chars,
+                max_results=request.max_results,
+                page_size=request.page_size,
+                slices=request.slices,
+                highlight=request.highlight,
+                top_n=request.top_n,
+                ngram=request.ngram,
+                sample=request.sample,
+                seed=request.seed
+            )
+        if profiling:
+            result["profile_id"] = profile_id
+        
+        return CodecJSONResponse({
+            "code": 200,
+            "message": "success",
+            "data": result
+        })
+    except HTTPException as e:
+        raise e
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        logger.error(f"搜索接口错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/search/stream")
+async def search_stream(request: SearchRequest):
+    """流式搜索接口，以NDJSON逐行返回进度帧，最后一行为完整结果"""
+    try:
+        stream = search_service.search_stream(
             keyword=request.keyword,
             start_time=request.start_time,
             end_time=request.end_time,
             context_chars=request.context_chars,
-            max_results=request.max_results
+            max_results=request.max_results,
+            page_size=request.page_size,
+            slices=request.slices,
+            highlight=request.highlight,
+            top_n=request.top_n,
+            ngram=request.ngram,
+            sample=request.sample,
+            seed=request.seed
         )
-        
-        return {
+        # 先取第一帧，使准入控制在开始响应前完成，过载时仍能返回429
+        first = await anext(stream)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        logger.error(f"流式搜索接口错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def frames():
+        try:
+            yield codec.dumps(first) + b"\n"
+            async for frame in stream:
+                yield codec.dumps(frame) + b"\n"
+        except Exception as e:
+            logger.error(f"流式搜索接口错误: {str(e)}")
+            yield codec.dumps({"type": "error", "message": str(e)}) + b"\n"
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(frames(), media_type="application/x-ndjson")
+
+class BatchSearchRequest(BaseModel):
+    keywords: List[str]
+    start_time: str
+    end_time: str
+    context_chars: Optional[int] = None
+    max_results: Optional[int] = None
+    page_size: Optional[int] = None
+    slices: Optional[int] = None
+    top_n: Optional[int] = None
+    ngram: Optional[int] = None
+
+    @field_validator('keywords')
+    @classmethod
+    def validate_keywords(cls, v: List[str]) -> List[str]:
+        keywords = [keyword for keyword in dict.fromkeys(v) if keyword]
+        if not keywords:
+            raise ValueError("关键词列表不能为空")
+        if len(keywords) > BATCH_MAX_KEYWORDS:
+            raise ValueError(f"关键词数量不能超过{BATCH_MAX_KEYWORDS}个")
+        return keywords
+
+    @field_validator('start_time', 'end_time')
+    @classmethod
+    def validate_date_format(cls, v: str) -> str:
+        try:
+            datetime.strptime(v, "%Y-%m-%d %H:%M:%S")
+            return v
+        except ValueError:
+            raise ValueError("日期格式必须是 YYYY-MM-DD HH:MM:SS")
+
+    @field_validator('end_time')
+    @classmethod
+    def validate_end_time(cls, v: str, info) -> str:
+        if 'start_time' in info.data:
+            start = datetime.strptime(info.data['start_time'], "%Y-%m-%d %H:%M:%S")
+            end = datetime.strptime(v, "%Y-%m-%d %H:%M:%S")
+            if end < start:
+                raise ValueError("结束时间不能早于开始时间")
+        return v
+
+    @field_validator('context_chars')
+    @classmethod
+    def validate_context_chars(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 1:
+            raise ValueError("上下文长度必须大于等于1")
+        return v
+
+    @field_validator('max_results')
+    @classmethod
+    def validate_max_results(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 1:
+            raise ValueError("最大结果数必须大于等于1")
+        return v
+
+    @field_validator('page_size')
+    @classmethod
+    def validate_page_size(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and not 1 <= v <= 10000:
+            raise ValueError("每页数量必须在1到10000之间")
+        return v
+
+    @field_validator('slices')
+    @classmethod
+    def validate_slices(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and not 1 <= v <= 64:
+            raise ValueError("分片数必须在1到64之间")
+        return v
+
+    @field_validator('top_n')
+    @classmethod
+    def validate_top_n(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 1:
+            raise ValueError("显示数量必须大于等于1")
+        return v
+
+    @field_validator('ngram')
+    @classmethod
+    def validate_ngram(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and not 1 <= v <= 10:
+            raise ValueError("邻接片段长度必须在1到10之间")
+        return v
+
+@router.post("/search/batch")
+async def search_batch(request: BatchSearchRequest):
+    """多关键词批量搜索接口"""
+    try:
+        result = await search_service.search_batch(
+            keywords=request.keywords,
+            start_time=request.start_time,
+            end_time=request.end_time,
+            context_chars=request.context_chars,
+            max_results=request.max_results,
+            page_size=request.page_size,
+            slices=request.slices,
+            top_n=request.top_n,
+            ngram=request.ngram
+        )
+
+        return CodecJSONResponse({
             "code": 200,
             "message": "success",
             "data": result
-        }
+        })
     except HTTPException as e:
         raise e
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
-        logger.error(f"搜索接口错误: {str(e)}")
+        logger.error(f"批量搜索接口错误: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/health")
@@ -117,17 +358,17 @@ class AuthorStatsRequest(BaseModel):
 async def get_author_stats(request: AuthorStatsRequest):
     """获取作者统计信息"""
     try:
-        result = search_service.get_author_stats(
+        result = await search_service.get_author_stats(
             start_time=request.start_time,
             end_time=request.end_time,
             top_n=request.top_n
         )
         
-        return {
+        return CodecJSONResponse({
             "code": 200,
             "message": "success",
             "data": result
-        }
+        })
     except HTTPException as e:
         raise e
     except Exception as e:
@@ -169,19 +410,528 @@ class MediaStatsRequest(BaseModel):
 async def get_media_stats(request: MediaStatsRequest):
     """获取媒体统计信息"""
     try:
-        result = search_service.get_media_stats(
+        result = await search_service.get_media_stats(
             start_time=request.start_time,
             end_time=request.end_time,
             top_n=request.top_n
         )
         
+        return CodecJSONResponse({
+            "code": 200,
+            "message": "success",
+            "data": result
+        })
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"媒体统计接口错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e)) 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """获取分段缓存统计信息"""
+    return {
+        "code": 200,
+        "message": "success",
+        "data": search_service.get_cache_stats()
+    }
+
+class CacheInvalidateRequest(BaseModel):
+    keyword: Optional[str] = None
+    index: Optional[str] = None
+
+@router.post("/cache/invalidate")
+async def invalidate_cache(request: CacheInvalidateRequest):
+    """按关键词和/或索引失效分段缓存，均不指定时清空全部缓存"""
+    try:
+        removed = search_service.invalidate_cache(keyword=request.keyword, index=request.index)
+
         return {
+            "code": 200,
+            "message": "success",
+            "data": {"removed": removed}
+        }
+    except Exception as e:
+        logger.error(f"缓存失效接口错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/admission/stats")
+async def get_admission_stats():
+    """获取搜索准入控制的额度占用和排队情况"""
+    return {
+        "code": 200,
+        "message": "success",
+        "data": search_service.get_admission_stats()
+    }
+
+@router.get("/coalescing/stats")
+async def get_coalescing_stats():
+    """获取并发请求合并统计信息"""
+    return {
+        "code": 200,
+        "message": "success",
+        "data": search_service.get_coalescing_stats()
+    }
+
+@router.get("/rollup/stats")
+async def get_rollup_stats():
+    """获取作者/媒体日汇总的回填进度"""
+    try:
+        return {
+            "code": 200,
+            "message": "success",
+            "data": search_service.get_rollup_stats()
+        }
+    except Exception as e:
+        logger.error(f"日汇总状态接口错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+class StatsRequest(BaseModel):
+    start_time: str
+    end_time: str
+    dimensions: List[str] = ["author", "media"]
+    keywords: Optional[List[str]] = None
+    top_n: Optional[int] = 10
+
+    @field_validator('start_time', 'end_time')
+    @classmethod
+    def validate_date_format(cls, v: str) -> str:
+        try:
+            datetime.strptime(v, "%Y-%m-%d %H:%M:%S")
+            return v
+        except ValueError:
+            raise ValueError("日期格式必须是 YYYY-MM-DD HH:MM:SS")
+
+    @field_validator('end_time')
+    @classmethod
+    def validate_end_time(cls, v: str, info) -> str:
+        if 'start_time' in info.data:
+            start = datetime.strptime(info.data['start_time'], "%Y-%m-%d %H:%M:%S")
+            end = datetime.strptime(v, "%Y-%m-%d %H:%M:%S")
+            if end < start:
+                raise ValueError("结束时间不能早于开始时间")
+        return v
+
+    @field_validator('dimensions')
+    @classmethod
+    def validate_dimensions(cls, v: List[str]) -> List[str]:
+        dimensions = list(dict.fromkeys(v))
+        if not dimensions:
+            raise ValueError("统计维度不能为空")
+        invalid = [dimension for dimension in dimensions if dimension not in STATS_DIMENSIONS]
+        if invalid:
+            raise ValueError(f"不支持的统计维度: {invalid}，可选: {list(STATS_DIMENSIONS)}")
+        return dimensions
+
+    @field_validator('keywords')
+    @classmethod
+    def validate_keywords(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        if v is None:
+            return v
+        keywords = [keyword for keyword in dict.fromkeys(v) if keyword]
+        if len(keywords) > BATCH_MAX_KEYWORDS:
+            raise ValueError(f"关键词数量不能超过{BATCH_MAX_KEYWORDS}个")
+        return keywords
+
+    @field_validator('top_n')
+    @classmethod
+    def validate_top_n(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 1:
+            raise ValueError("显示数量必须大于等于1")
+        return v
+
+@router.post("/stats")
+async def get_stats(request: StatsRequest):
+    """组合统计接口：一次请求返回多个统计维度"""
+    if 'keyword' in request.dimensions and not request.keywords:
+        raise HTTPException(status_code=400, detail="统计关键词维度时关键词列表不能为空")
+    try:
+        result = await search_service.get_stats(
+            start_time=request.start_time,
+            end_time=request.end_time,
+            dimensions=request.dimensions,
+            top_n=request.top_n,
+            keywords=request.keywords
+        )
+
+        return CodecJSONResponse({
+            "code": 200,
+            "message": "success",
+            "data": result
+        })
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"组合统计接口错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+class TrendRequest(BaseModel):
+    keyword: str
+    start_time: str
+    end_time: str
+    interval: str = "day"
+    media_top_n: Optional[int] = 0
+
+    @field_validator('keyword')
+    @classmethod
+    def validate_keyword(cls, v: str) -> str:
+        if not v:
+            raise ValueError("关键词不能为空")
+        return v
+
+    @field_validator('start_time', 'end_time')
+    @classmethod
+    def validate_date_format(cls, v: str) -> str:
+        try:
+            datetime.strptime(v, "%Y-%m-%d %H:%M:%S")
+            return v
+        except ValueError:
+            raise ValueError("日期格式必须是 YYYY-MM-DD HH:MM:SS")
+
+    @field_validator('end_time')
+    @classmethod
+    def validate_end_time(cls, v: str, info) -> str:
+        if 'start_time' in info.data:
+            start = datetime.strptime(info.data['start_time'], "%Y-%m-%d %H:%M:%S")
+            end = datetime.strptime(v, "%Y-%m-%d %H:%M:%S")
+            if end < start:
+                raise ValueError("结束时间不能早于开始时间")
+        return v
+
+    @field_validator('interval')
+    @classmethod
+    def validate_interval(cls, v: str) -> str:
+        if v not in TREND_INTERVALS:
+            raise ValueError(f"时间粒度必须是: {', '.join(TREND_INTERVALS)}")
+        return v
+
+    @field_validator('media_top_n')
+    @classmethod
+    def validate_media_top_n(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and not 0 <= v <= 100:
+            raise ValueError("媒体数量必须在0到100之间")
+        return v
+
+# 各粒度每个桶的最短时长（秒），用于估算桶数
+TREND_BUCKET_SECONDS = {"hour": 3600, "day": 86400, "week": 7 * 86400, "month": 28 * 86400}
+
+@router.post("/trend")
+async def get_trend(request: TrendRequest):
+    """关键词趋势：按add_time分桶的命中文档数，可附带命中最多的媒体各自的分布"""
+    try:
+        media_top_n = request.media_top_n or 0
+        span = datetime.strptime(request.end_time, "%Y-%m-%d %H:%M:%S") - datetime.strptime(request.start_time, "%Y-%m-%d %H:%M:%S")
+        buckets = (int(span.total_seconds() // TREND_BUCKET_SECONDS[request.interval]) + 2) * (1 + media_top_n)
+        if buckets > TREND_MAX_BUCKETS:
+            raise HTTPException(status_code=400, detail=f"桶数过多（约{buckets}个，上限{TREND_MAX_BUCKETS}），请缩小时间范围、增大粒度或减少媒体数量")
+
+        result = await search_service.get_trend(
+            keyword=request.keyword,
+            start_time=request.start_time,
+            end_time=request.end_time,
+            interval=request.interval,
+            media_top_n=media_top_n
+        )
+
+        return CodecJSONResponse({
             "code": 200,
             "message": "success",
             "data": result
+        })
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"趋势统计接口错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/indices")
+async def get_index_catalog():
+    """获取索引目录（实际存在的索引及其add_time范围）"""
+    return {
+        "code": 200,
+        "message": "success",
+        "data": search_service.get_index_catalog()
+    }
+
+@router.get("/profiles")
+async def list_profiles(http_request: Request):
+    """列出最近的剖析结果"""
+    if not profiler.authorize(_profile_flag(http_request)):
+        raise HTTPException(status_code=403, detail="性能剖析未开启或口令错误")
+    return {
+        "code": 200,
+        "message": "success",
+        "data": profiler.list_profiles()
+    }
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str, http_request: Request):
+    """下载折叠栈格式的剖析结果"""
+    if not profiler.authorize(_profile_flag(http_request)):
+        raise HTTPException(status_code=403, detail="性能剖析未开启或口令错误")
+    path = profiler.get_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="剖析结果不存在")
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=path.name)
+
+class JobRequest(BaseModel):
+    keyword: str
+    start_time: str
+    end_time: str
+    context_chars: Optional[int] = None
+    max_results: Optional[int] = None
+    page_size: Optional[int] = None
+    ngram: Optional[int] = None
+
+    @field_validator('keyword')
+    @classmethod
+    def validate_keyword(cls, v: str) -> str:
+        if not v:
+            raise ValueError("关键词不能为空")
+        return v
+
+    @field_validator('start_time', 'end_time')
+    @classmethod
+    def validate_date_format(cls, v: str) -> str:
+        try:
+            datetime.strptime(v, "%Y-%m-%d %H:%M:%S")
+            return v
+        except ValueError:
+            raise ValueError("日期格式必须是 YYYY-MM-DD HH:MM:SS")
+
+    @field_validator('end_time')
+    @classmethod
+    def validate_end_time(cls, v: str, info) -> str:
+        if 'start_time' in info.data:
+            start = datetime.strptime(info.data['start_time'], "%Y-%m-%d %H:%M:%S")
+            end = datetime.strptime(v, "%Y-%m-%d %H:%M:%S")
+            if end < start:
+                raise ValueError("结束时间不能早于开始时间")
+        return v
+
+    @field_validator('context_chars')
+    @classmethod
+    def validate_context_chars(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 1:
+            raise ValueError("上下文长度必须大于等于1")
+        return v
+
+    @field_validator('max_results')
+    @classmethod
+    def validate_max_results(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 1:
+            raise ValueError("最大结果数必须大于等于1")
+        return v
+
+    @field_validator('page_size')
+    @classmethod
+    def validate_page_size(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and not 1 <= v <= 10000:
+            raise ValueError("每页数量必须在1到10000之间")
+        return v
+
+    @field_validator('ngram')
+    @classmethod
+    def validate_ngram(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and not 1 <= v <= 10:
+            raise ValueError("邻接片段长度必须在1到10之间")
+        return v
+
+@router.post("/jobs")
+async def submit_job(request: JobRequest):
+    """提交后台搜索任务"""
+    try:
+        job = search_service.submit_job(
+            keyword=request.keyword,
+            start_time=request.start_time,
+            end_time=request.end_time,
+            context_chars=request.context_chars,
+            max_results=request.max_results,
+            page_size=request.page_size,
+            ngram=request.ngram
+        )
+
+        return {
+            "code": 200,
+            "message": "success",
+            "data": job
         }
+    except Exception as e:
+        logger.error(f"提交后台任务错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs")
+async def list_jobs():
+    """列出后台任务"""
+    return {
+        "code": 200,
+        "message": "success",
+        "data": search_service.list_jobs()
+    }
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """查询后台任务的状态与进度"""
+    job = search_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return {
+        "code": 200,
+        "message": "success",
+        "data": job
+    }
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """取消后台任务"""
+    job = search_service.cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return {
+        "code": 200,
+        "message": "success",
+        "data": job
+    }
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, top_n: Optional[int] = None):
+    """获取已完成后台任务的结果，格式同搜索接口"""
+    try:
+        job = search_service.get_job(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        if job["status"] != "completed":
+            raise HTTPException(status_code=409, detail=f"任务尚未完成，当前状态: {job['status']}")
+
+        return CodecJSONResponse({
+            "code": 200,
+            "message": "success",
+            "data": await search_service.get_job_result(job_id, top_n)
+        })
     except HTTPException as e:
         raise e
     except Exception as e:
-        logger.error(f"媒体统计接口错误: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        logger.error(f"获取后台任务结果错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+class ExportRequest(BaseModel):
+    keyword: str
+    start_time: str
+    end_time: str
+    format: str = "jsonl"
+    compression: str = "gzip"
+    context_chars: Optional[int] = None
+    max_results: Optional[int] = None
+    page_size: Optional[int] = None
+    slices: Optional[int] = None
+
+    @field_validator('keyword')
+    @classmethod
+    def validate_keyword(cls, v: str) -> str:
+        if not v:
+            raise ValueError("关键词不能为空")
+        return v
+
+    @field_validator('start_time', 'end_time')
+    @classmethod
+    def validate_date_format(cls, v: str) -> str:
+        try:
+            datetime.strptime(v, "%Y-%m-%d %H:%M:%S")
+            return v
+        except ValueError:
+            raise ValueError("日期格式必须是 YYYY-MM-DD HH:MM:SS")
+
+    @field_validator('end_time')
+    @classmethod
+    def validate_end_time(cls, v: str, info) -> str:
+        if 'start_time' in info.data:
+            start = datetime.strptime(info.data['start_time'], "%Y-%m-%d %H:%M:%S")
+            end = datetime.strptime(v, "%Y-%m-%d %H:%M:%S")
+            if end < start:
+                raise ValueError("结束时间不能早于开始时间")
+        return v
+
+    @field_validator('format')
+    @classmethod
+    def validate_format(cls, v: str) -> str:
+        if v not in EXPORT_FORMATS:
+            raise ValueError(f"导出格式必须是: {', '.join(EXPORT_FORMATS)}")
+        return v
+
+    @field_validator('compression')
+    @classmethod
+    def validate_compression(cls, v: str) -> str:
+        if v not in EXPORT_COMPRESSIONS:
+            raise ValueError(f"压缩方式必须是: {', '.join(EXPORT_COMPRESSIONS)}")
+        return v
+
+    @field_validator('context_chars')
+    @classmethod
+    def validate_context_chars(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 1:
+            raise ValueError("上下文长度必须大于等于1")
+        return v
+
+    @field_validator('max_results')
+    @classmethod
+    def validate_max_results(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and v < 1:
+            raise ValueError("最大结果数必须大于等于1")
+        return v
+
+    @field_validator('page_size')
+    @classmethod
+    def validate_page_size(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and not 1 <= v <= 10000:
+            raise ValueError("每页数量必须在1到10000之间")
+        return v
+
+    @field_validator('slices')
+    @classmethod
+    def validate_slices(cls, v: Optional[int]) -> Optional[int]:
+        if v is not None and not 1 <= v <= 64:
+            raise ValueError("分片数必须在1到64之间")
+        return v
+
+@router.post("/export")
+async def export_contexts(request: ExportRequest):
+    """导出关键词上下文，边从ES拉取边以压缩的JSONL/CSV流式返回"""
+    try:
+        if not compression_available(request.compression):
+            raise HTTPException(status_code=400, detail=f"服务端不支持{request.compression}压缩，请安装zstandard或使用gzip")
+
+        chunks = search_service.export_contexts(
+            keyword=request.keyword,
+            start_time=request.start_time,
+            end_time=request.end_time,
+            fmt=request.format,
+            compression=request.compression,
+            context_chars=request.context_chars,
+            max_results=request.max_results,
+            page_size=request.page_size,
+            slices=request.slices
+        )
+        # 先取第一块，使准入控制在开始响应前完成，过载时仍能返回429
+        first = await anext(chunks)
+    except HTTPException as e:
+        raise e
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        logger.error(f"导出接口错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def body():
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            # 响应已开始，无法再返回错误状态码；截断的压缩流在客户端解压时会报错
+            logger.error(f"导出接口错误: {str(e)}")
+        finally:
+            await chunks.aclose()
+
+    suffix, media_type = EXPORT_COMPRESSIONS[request.compression]
+    filename = f"contexts-{datetime.now():%Y%m%d-%H%M%S}.{request.format}.{suffix}"
+    return StreamingResponse(body(), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
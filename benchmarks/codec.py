@@ -0,0 +1,105 @@
+"""JSON编解码基准
+
+用合成语料构造一页scroll响应（ES命中格式）和一次搜索接口的返回结果，比较标准库json与orjson
+解码scroll页、编码接口响应的耗时。接口响应另外列出FastAPI默认路径（jsonable_encoder后再用json编码）。
+
+用法：
+    python -m benchmarks.codec                    # 默认每页1000条，重复20次
+    python -m benchmarks.codec --page-size 5000 --repeat 10
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.corpus import WORDS, generate_month
+from core.extractor import count_documents
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def scroll_page(page_size: int, seed: int) -> bytes:
+    """一页scroll响应的原始字节"""
+    hits = list(generate_month(2024, 1, page_size, seed))
+    response = {
+        "_scroll_id": "FGluY2x1ZGVfY29udGV4dF91dWlkDXF1ZXJ5QW5kRmV0Y2gBFnNjcm9sbA==",
+        "took": 12,
+        "timed_out": False,
+        "hits": {"total": {"value": page_size * 10, "relation": "eq"}, "max_score": 1.0, "hits": hits}
+    }
+    return json.dumps(response, ensure_ascii=False).encode("utf-8")
+
+
+def search_response(docs: List[Dict[str, Any]], keyword: str, top_n: int) -> Dict[str, Any]:
+    """与/api/search结构相同的返回结果"""
+    collocations, _ = count_documents(docs, keyword, 50, 2)
+    return {
+        "code": 200,
+        "message": "success",
+        "data": {
+            "total": len(docs),
+            "parsed": collocations.total,
+            "max_results": len(docs),
+            "approximate": collocations.approximate,
+            "cached_segments": 0,
+            "words": collocations.top_words(top_n),
+            "neighbors": collocations.neighbors(top_n)
+        }
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int) -> float:
+    """重复执行，返回耗时中位数（毫秒）"""
+    func()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def print_rows(title: str, size: int, rows: Dict[str, Optional[float]]):
+    print(f"\n{title}（{size / 1e6:.2f} MB）")
+    print(f"{'编解码器':<28}{'耗时(ms)':>12}{'MB/s':>12}{'相对json':>12}")
+    baseline = rows["json"]
+    for name, ms in rows.items():
+        if ms is None:
+            print(f"{name:<28}{'未安装':>12}")
+            continue
+        print(f"{name:<28}{ms:>12.2f}{size / 1e6 / (ms / 1000):>12.1f}{baseline / ms:>11.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON编解码基准")
+    parser.add_argument("--page-size", type=int, default=1000, help="scroll页的文档数")
+    parser.add_argument("--top-n", type=int, default=2000, help="接口响应中的词语数量")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    raw = scroll_page(args.page_size, args.seed)
+    print_rows("解码scroll页", len(raw), {
+        "json": measure(lambda: json.loads(raw), args.repeat),
+        "orjson": measure(lambda: orjson.loads(raw), args.repeat) if orjson else None
+    })
+
+    docs = json.loads(raw)["hits"]["hits"]
+    response = search_response(docs, WORDS[1][0], args.top_n)
+    encoded = json.dumps(response, ensure_ascii=False).encode("utf-8")
+
+    from fastapi.encoders import jsonable_encoder
+    print_rows("编码接口响应", len(encoded), {
+        "json": measure(lambda: json.dumps(response, ensure_ascii=False).encode("utf-8"), args.repeat),
+        "orjson": measure(lambda: orjson.dumps(response), args.repeat) if orjson else None,
+        "jsonable_encoder + json": measure(
+            lambda: json.dumps(jsonable_encoder(response), ensure_ascii=False).encode("utf-8"), args.repeat)
+    })
+
+
+if __name__ == "__main__":
+    main()
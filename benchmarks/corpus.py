@@ -0,0 +1,76 @@
+"""合成语料生成
+
+按 qb{YYYY}{MM}1 的月度索引布局生成中文文档，字段与线上一致
+（title、content、retweet_title、retweet_content、add_time、author、media_name）。
+同样的参数和随机种子总是生成同样的语料，便于不同版本之间对比。
+"""
+import itertools
+import random
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Tuple
+
+# 常见词及其大致权重，基准场景的关键词从中选取
+WORDS = [
+    ("经济", 30), ("发展", 30), ("市场", 25), ("公司", 25), ("政府", 20), ("科技", 20),
+    ("创新", 15), ("教育", 15), ("文化", 15), ("健康", 12), ("体育", 10), ("新闻", 10),
+    ("价格", 10), ("消费", 10), ("投资", 8), ("手机", 8), ("发布会", 6), ("人工智能", 6),
+    ("新能源", 5), ("芯片", 5), ("房地产", 5), ("乡村振兴", 3), ("碳中和", 3), ("数字化", 3),
+]
+FILLER = "的了在是和有也就都而及与着或一个我们他们这个那些进行已经没有可以因为所以但是如果"
+PUNCTUATION = "，。、；！？"
+MEDIA = ["新华网", "人民网", "央视新闻", "澎湃新闻", "新浪微博", "今日头条", "腾讯新闻", "财新网",
+         "界面新闻", "第一财经", "南方周末", "环球时报"]
+
+
+def month_range(start: str, months: int) -> List[Tuple[int, int]]:
+    """从YYYY-MM开始的连续months个月"""
+    year, month = int(start[:4]), int(start[5:7])
+    result = []
+    for _ in range(months):
+        result.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return result
+
+
+def _sentence(rnd: random.Random, words: List[str], cum_weights: List[int]) -> str:
+    count = rnd.randint(4, 12)
+    parts = []
+    for word in rnd.choices(words, cum_weights=cum_weights, k=count):
+        parts.append(word)
+        parts.extend(rnd.choices(FILLER, k=rnd.randint(1, 4)))
+    parts.append(rnd.choice(PUNCTUATION))
+    return "".join(parts)
+
+
+def generate_month(year: int, month: int, docs: int, seed: int = 0,
+                   authors: int = 2000) -> Iterator[Dict[str, Any]]:
+    """生成一个月度索引的文档（ES命中格式，含_index、_id、_source）"""
+    rnd = random.Random(f"{seed}-{year}-{month}")
+    words = [word for word, _ in WORDS]
+    weights = list(itertools.accumulate(weight for _, weight in WORDS))
+    index = f"qb{year}{month:02d}1"
+    for i in range(docs):
+        add_time = datetime(year, month, rnd.randint(1, 28), rnd.randint(0, 23), rnd.randint(0, 59), rnd.randint(0, 59))
+        source = {
+            "title": _sentence(rnd, words, weights),
+            "content": "".join(_sentence(rnd, words, weights) for _ in range(rnd.randint(3, 30))),
+            "add_time": add_time.strftime("%Y-%m-%d %H:%M:%S"),
+            # 作者按长尾分布，少数作者发文量很大
+            "author": f"作者{int(rnd.paretovariate(1.2)) % authors}",
+            "media_name": rnd.choice(MEDIA)
+        }
+        if rnd.random() < 0.2:
+            source["retweet_title"] = _sentence(rnd, words, weights)
+            source["retweet_content"] = "".join(_sentence(rnd, words, weights) for _ in range(rnd.randint(1, 10)))
+        yield {"_index": index, "_id": f"{year}{month:02d}-{i}", "_score": 1.0, "_source": source}
+
+
+def generate_corpus(start: str = "2024-01", months: int = 12, docs_per_month: int = 2000,
+                    seed: int = 0) -> Dict[str, List[Dict[str, Any]]]:
+    """生成索引名 -> 文档列表"""
+    corpus = {}
+    for year, month in month_range(start, months):
+        docs = list(generate_month(year, month, docs_per_month, seed))
+        docs.sort(key=lambda doc: doc["_source"]["add_time"])
+        corpus[f"qb{year}{month:02d}1"] = docs
+    return corpus
@@ -0,0 +1,395 @@
+"""本地ES替身
+
+只实现本服务用到的接口和查询语法，数据来自benchmarks.corpus生成的合成语料：
+- POST /{index}/_search：bool/range/match_phrase(_prefix)查询，slice、highlight、_source=false或字段列表，
+  terms/composite/filters/min/max/date_histogram聚合，scroll；function_score的random_score按(seed, 索引, id)的哈希排序
+- POST /_search/scroll、DELETE /_search/scroll
+- POST /{index}/_pit、DELETE /_pit，以及带pit的 POST /_search（按sort排序、search_after翻页，隐含_shard_doc排序键）
+- POST /{index}/_count
+- GET /_cat/indices/{pattern}
+
+用法：python -m benchmarks.fake_es --port 9299 --months 12 --docs-per-month 2000
+"""
+import argparse
+import asyncio
+import hashlib
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from benchmarks.corpus import generate_corpus
+
+TEXT_FIELDS = ("title", "content", "retweet_title", "retweet_content")
+
+
+def _field_value(doc: Dict[str, Any], field: str) -> Any:
+    if field == "_index":
+        return doc["_index"]
+    return doc["_source"].get(field[:-len(".keyword")] if field.endswith(".keyword") else field)
+
+
+def matches(doc: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    """按查询DSL判断文档是否命中（只支持本服务用到的子集）"""
+    if not query or "match_all" in query:
+        return True
+    if "bool" in query:
+        clauses = query["bool"]
+        for key in ("must", "filter"):
+            if not all(matches(doc, clause) for clause in _as_list(clauses.get(key))):
+                return False
+        if any(matches(doc, clause) for clause in _as_list(clauses.get("must_not"))):
+            return False
+        should = _as_list(clauses.get("should"))
+        if should:
+            required = clauses.get("minimum_should_match", 0 if clauses.get("must") or clauses.get("filter") else 1)
+            if sum(1 for clause in should if matches(doc, clause)) < required:
+                return False
+        return True
+    if "range" in query:
+        for field, bounds in query["range"].items():
+            value = _field_value(doc, field)
+            if value is None:
+                return False
+            if "gte" in bounds and value < bounds["gte"]:
+                return False
+            if "gt" in bounds and value <= bounds["gt"]:
+                return False
+            if "lte" in bounds and value > bounds["lte"]:
+                return False
+            if "lt" in bounds and value >= bounds["lt"]:
+                return False
+        return True
+    for key in ("match_phrase_prefix", "match_phrase"):
+        if key in query:
+            for field, spec in query[key].items():
+                phrase = spec["query"] if isinstance(spec, dict) else spec
+                value = _field_value(doc, field)
+                if not isinstance(value, str) or phrase not in value:
+                    return False
+            return True
+    if "term" in query:
+        return all(_field_value(doc, field) == (spec["value"] if isinstance(spec, dict) else spec)
+                   for field, spec in query["term"].items())
+    if "function_score" in query:
+        return matches(doc, query["function_score"].get("query"))
+    raise ValueError(f"不支持的查询: {list(query)}")
+
+
+def _random_score(doc: Dict[str, Any], seed: Any) -> float:
+    """random_score的替身：同样的seed对同一文档总是给出同样的[0, 1)分数"""
+    digest = hashlib.blake2b(f"{seed}:{doc['_index']}:{doc['_id']}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _bucket_start(value: datetime, interval: str) -> datetime:
+    """calendar_interval为1h/1d/1w/1M时value所在桶的起点，周从周一开始"""
+    if interval == "1h":
+        return value.replace(minute=0, second=0)
+    day = value.replace(hour=0, minute=0, second=0)
+    if interval == "1d":
+        return day
+    if interval == "1w":
+        return day - timedelta(days=day.weekday())
+    if interval == "1M":
+        return day.replace(day=1)
+    raise ValueError(f"不支持的calendar_interval: {interval}")
+
+
+def _next_bucket(start: datetime, interval: str) -> datetime:
+    if interval == "1h":
+        return start + timedelta(hours=1)
+    if interval == "1d":
+        return start + timedelta(days=1)
+    if interval == "1w":
+        return start + timedelta(weeks=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _phrases(query: Any) -> List[str]:
+    """查询中出现的所有短语，用于生成高亮片段"""
+    phrases = []
+    if isinstance(query, dict):
+        for key, value in query.items():
+            if key in ("match_phrase_prefix", "match_phrase"):
+                for spec in value.values():
+                    phrases.append(spec["query"] if isinstance(spec, dict) else spec)
+            else:
+                phrases.extend(_phrases(value))
+    elif isinstance(query, list):
+        for item in query:
+            phrases.extend(_phrases(item))
+    return list(dict.fromkeys(phrases))
+
+
+class FakeElasticsearch:
+    def __init__(self, corpus: Dict[str, List[Dict[str, Any]]], latency: float = 0.0):
+        self.corpus = corpus
+        self.latency = latency
+        self.scrolls: Dict[str, List[Any]] = {}
+        self.pits: Dict[str, List[str]] = {}
+        self.requests = Counter()
+
+    def resolve(self, expression: str, ignore_unavailable: bool) -> Optional[List[str]]:
+        """解析索引表达式，存在不可用索引且未忽略时返回None"""
+        names = []
+        for name in expression.split(","):
+            if name.endswith("*"):
+                names.extend(index for index in self.corpus if index.startswith(name[:-1]))
+            elif name in self.corpus:
+                names.append(name)
+            elif not ignore_unavailable:
+                return None
+        return names
+
+    def _shape(self, doc: Dict[str, Any], body: Dict[str, Any], phrases: List[str]) -> Dict[str, Any]:
+        hit = {key: value for key, value in doc.items() if key != "_source"}
+        source = body.get("_source", True)
+        if isinstance(source, list):
+            hit["_source"] = {field: value for field, value in doc["_source"].items() if field in source}
+        elif source is not False:
+            hit["_source"] = doc["_source"]
+        highlight = body.get("highlight")
+        if highlight:
+            size = highlight.get("fragment_size", 100)
+            pre, post = highlight["pre_tags"][0], highlight["post_tags"][0]
+            fragments = {}
+            for field in highlight["fields"]:
+                text = doc["_source"].get(field) or ""
+                for phrase in phrases:
+                    position = text.find(phrase)
+                    if position >= 0:
+                        start = max(0, position - size // 2)
+                        fragments[field] = [text[start:position] + pre + phrase + post
+                                            + text[position + len(phrase):start + size]]
+                        break
+            if fragments:
+                hit["highlight"] = fragments
+        return hit
+
+    def _aggregate(self, docs: List[Dict[str, Any]], aggs: Dict[str, Any]) -> Dict[str, Any]:
+        result = {}
+        for name, spec in aggs.items():
+            if "terms" in spec:
+                counts = Counter(_field_value(doc, spec["terms"]["field"]) for doc in docs)
+                counts.pop(None, None)
+                top = counts.most_common(spec["terms"].get("size", 10))
+                buckets = []
+                for key, count in top:
+                    bucket = {"key": key, "doc_count": count}
+                    if "aggs" in spec:
+                        bucket.update(self._aggregate(
+                            [doc for doc in docs if _field_value(doc, spec["terms"]["field"]) == key], spec["aggs"]))
+                    buckets.append(bucket)
+                result[name] = {"buckets": buckets,
+                                "sum_other_doc_count": sum(counts.values()) - sum(count for _, count in top)}
+            elif "composite" in spec:
+                composite = spec["composite"]
+                field = composite["sources"][0]["key"]["terms"]["field"]
+                counts = Counter(_field_value(doc, field) for doc in docs)
+                counts.pop(None, None)
+                keys = sorted(counts)
+                after = composite.get("after", {}).get("key")
+                if after is not None:
+                    keys = [key for key in keys if key > after]
+                keys = keys[:composite.get("size", 10)]
+                result[name] = {"buckets": [{"key": {"key": key}, "doc_count": counts[key]} for key in keys]}
+                if keys:
+                    result[name]["after_key"] = {"key": keys[-1]}
+            elif "filters" in spec:
+                result[name] = {"buckets": {
+                    key: {"doc_count": sum(1 for doc in docs if matches(doc, query))}
+                    for key, query in spec["filters"]["filters"].items()
+                }}
+            elif "date_histogram" in spec:
+                histogram = spec["date_histogram"]
+                interval = histogram["calendar_interval"]
+                counts = Counter()
+                for doc in docs:
+                    value = _field_value(doc, histogram["field"])
+                    if value is not None:
+                        counts[_bucket_start(datetime.strptime(value, TIME_FORMAT), interval)] += 1
+                keys = sorted(counts)
+                bounds = histogram.get("extended_bounds")
+                if histogram.get("min_doc_count", 1) == 0 and (keys or bounds):
+                    first = min(keys[:1] + ([_bucket_start(datetime.strptime(bounds["min"], TIME_FORMAT), interval)]
+                                            if bounds else []))
+                    last = max(keys[-1:] + ([_bucket_start(datetime.strptime(bounds["max"], TIME_FORMAT), interval)]
+                                            if bounds else []))
+                    keys = []
+                    while first <= last:
+                        keys.append(first)
+                        first = _next_bucket(first, interval)
+                result[name] = {"buckets": [
+                    {"key_as_string": key.strftime(TIME_FORMAT), "key": int(key.timestamp() * 1000),
+                     "doc_count": counts[key]}
+                    for key in keys
+                ]}
+            elif "min" in spec or "max" in spec:
+                kind = "min" if "min" in spec else "max"
+                values = [value for value in (_field_value(doc, spec[kind]["field"]) for doc in docs) if value is not None]
+                value = (min if kind == "min" else max)(values) if values else None
+                result[name] = {"value": value, "value_as_string": value}
+            else:
+                raise ValueError(f"不支持的聚合: {list(spec)}")
+        return result
+
+    async def search(self, request: web.Request) -> web.Response:
+        self.requests["search"] += 1
+        await asyncio.sleep(self.latency)
+        body = await request.json() if request.can_read_body else {}
+        indices = self.resolve(request.match_info["index"], request.query.get("ignore_unavailable") == "true")
+        if indices is None:
+            return web.json_response({"error": {"type": "index_not_found_exception"}, "status": 404}, status=404)
+
+        query = body.get("query")
+        docs = [doc for index in indices for doc in self.corpus[index] if matches(doc, query)]
+        random_score = (query or {}).get("function_score", {}).get("random_score")
+        if random_score is not None:
+            seed = random_score.get("seed")
+            docs = sorted(docs, key=lambda doc: _random_score(doc, seed), reverse=True)
+        if "slice" in body:
+            slice_id, slice_max = body["slice"]["id"], body["slice"]["max"]
+            docs = [doc for position, doc in enumerate(docs) if position % slice_max == slice_id]
+
+        size = body.get("size", 10)
+        phrases = _phrases(query) if "highlight" in body else []
+        response: Dict[str, Any] = {
+            "took": 1,
+            "timed_out": False,
+            "hits": {"total": {"value": len(docs), "relation": "eq"},
+                     "hits": [self._shape(doc, body, phrases) for doc in docs[:size]]}
+        }
+        if "aggs" in body:
+            response["aggregations"] = self._aggregate(docs, body["aggs"])
+        if "scroll" in request.query:
+            scroll_id = uuid.uuid4().hex
+            self.scrolls[scroll_id] = [docs, size, size, body, phrases]
+            response["_scroll_id"] = scroll_id
+        return web.json_response(response)
+
+    async def scroll(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if request.method == "DELETE":
+            self.requests["clear_scroll"] += 1
+            scroll_ids = _as_list(body["scroll_id"])
+            freed = sum(1 for scroll_id in scroll_ids if self.scrolls.pop(scroll_id, None) is not None)
+            return web.json_response({"succeeded": True, "num_freed": freed})
+
+        self.requests["scroll"] += 1
+        await asyncio.sleep(self.latency)
+        state = self.scrolls.get(body["scroll_id"])
+        if state is None:
+            return web.json_response({"error": {"type": "search_context_missing_exception"}, "status": 404}, status=404)
+        docs, position, size, search_body, phrases = state
+        state[1] = position + size
+        return web.json_response({
+            "_scroll_id": body["scroll_id"],
+            "hits": {"total": {"value": len(docs), "relation": "eq"},
+                     "hits": [self._shape(doc, search_body, phrases) for doc in docs[position:position + size]]}
+        })
+
+    async def open_pit(self, request: web.Request) -> web.Response:
+        self.requests["open_pit"] += 1
+        indices = self.resolve(request.match_info["index"], request.query.get("ignore_unavailable") == "true")
+        if indices is None:
+            return web.json_response({"error": {"type": "index_not_found_exception"}, "status": 404}, status=404)
+        pit_id = uuid.uuid4().hex
+        self.pits[pit_id] = indices
+        return web.json_response({"id": pit_id})
+
+    async def close_pit(self, request: web.Request) -> web.Response:
+        self.requests["close_pit"] += 1
+        body = await request.json()
+        freed = self.pits.pop(body["id"], None) is not None
+        return web.json_response({"succeeded": True, "num_freed": int(freed)})
+
+    async def pit_search(self, request: web.Request) -> web.Response:
+        """在PIT上搜索：文档按sort字段和在PIT中的位置（相当于_shard_doc）排序"""
+        self.requests["pit_search"] += 1
+        await asyncio.sleep(self.latency)
+        body = await request.json()
+        pit_id = body["pit"]["id"]
+        indices = self.pits.get(pit_id)
+        if indices is None:
+            return web.json_response({"error": {"type": "search_context_missing_exception"}, "status": 404},
+                                     status=404)
+
+        fields = [next(iter(spec)) if isinstance(spec, dict) else spec for spec in body.get("sort", [])]
+        query = body.get("query")
+        docs = [doc for index in indices for doc in self.corpus[index]]
+        keyed = sorted(
+            ([_field_value(doc, field) for field in fields] + [position], doc)
+            for position, doc in enumerate(docs) if matches(doc, query)
+        )
+        after = body.get("search_after")
+        if after is not None:
+            keyed = [(key, doc) for key, doc in keyed if key > after]
+        hits = []
+        for key, doc in keyed[:body.get("size", 10)]:
+            hit = self._shape(doc, body, [])
+            hit["sort"] = key
+            hits.append(hit)
+        return web.json_response({"pit_id": pit_id, "took": 1, "timed_out": False,
+                                  "hits": {"hits": hits}})
+
+    async def count(self, request: web.Request) -> web.Response:
+        self.requests["count"] += 1
+        await asyncio.sleep(self.latency)
+        body = await request.json() if request.can_read_body else {}
+        indices = self.resolve(request.match_info["index"], request.query.get("ignore_unavailable") == "true")
+        if indices is None:
+            return web.json_response({"error": {"type": "index_not_found_exception"}, "status": 404}, status=404)
+        query = body.get("query")
+        return web.json_response({"count": sum(1 for index in indices for doc in self.corpus[index] if matches(doc, query))})
+
+    async def cat_indices(self, request: web.Request) -> web.Response:
+        self.requests["cat"] += 1
+        indices = self.resolve(request.match_info["pattern"], True)
+        return web.json_response([{"index": index, "docs.count": str(len(self.corpus[index]))} for index in indices])
+
+    async def stats(self, request: web.Request) -> web.Response:
+        """基准脚本用：请求计数和未清理的scroll数"""
+        return web.json_response({**self.requests, "open_scrolls": len(self.scrolls), "open_pits": len(self.pits)})
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_route("*", "/_search/scroll", self.scroll)
+        app.router.add_get("/_cat/indices/{pattern}", self.cat_indices)
+        app.router.add_get("/_fake/stats", self.stats)
+        app.router.add_post("/_search", self.pit_search)
+        app.router.add_delete("/_pit", self.close_pit)
+        app.router.add_post("/{index}/_pit", self.open_pit)
+        app.router.add_post("/{index}/_search", self.search)
+        app.router.add_post("/{index}/_count", self.count)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地ES替身")
+    parser.add_argument("--port", type=int, default=9299)
+    parser.add_argument("--start", default="2024-01", help="第一个月份，YYYY-MM")
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--docs-per-month", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="每个请求额外的模拟延迟")
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.start, args.months, args.docs_per_month, args.seed)
+    fake = FakeElasticsearch(corpus, args.latency_ms / 1000)
+    web.run_app(fake.build_app(), port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""性能基准
+
+启动本地ES替身和服务进程，按场景并发请求接口，统计吞吐、延迟分位数和服务进程峰值内存，
+并与保存的基线对比。
+
+用法：
+    python -m benchmarks.run                      # 运行全部场景并与基线对比
+    python -m benchmarks.run --only search        # 只运行名称包含search的场景
+    python -m benchmarks.run --save-baseline      # 把本次结果保存为基线
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+
+
+def _search(name: str, keyword: str, months: int, max_results: int, context_chars: int,
+            concurrency: int, requests: int) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "path": "/api/search",
+        "body": {
+            "keyword": keyword,
+            "start_time": "2024-01-01 00:00:00",
+            "end_time": f"2024-{months:02d}-28 23:59:59",
+            "max_results": max_results,
+            "context_chars": context_chars,
+            "top_n": 100
+        },
+        "concurrency": concurrency,
+        "requests": requests
+    }
+
+
+def _stats(name: str, path: str, months: int, concurrency: int, requests: int) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "path": path,
+        "body": {
+            "start_time": "2024-01-01 00:00:00",
+            "end_time": f"2024-{months:02d}-28 23:59:59",
+            "top_n": 100
+        },
+        "concurrency": concurrency,
+        "requests": requests
+    }
+
+
+SCENARIOS = [
+    _search("search-1m-1k-ctx10", "经济", 1, 1000, 10, 1, 10),
+    _search("search-3m-10k-ctx50", "经济", 3, 10000, 50, 1, 5),
+    _search("search-12m-10k-ctx50", "发展", 12, 10000, 50, 1, 3),
+    _search("search-3m-1k-ctx10-c8", "市场", 3, 1000, 10, 8, 32),
+    _search("search-rare-12m-ctx50", "碳中和", 12, 10000, 50, 1, 5),
+    _stats("author-stats-3m", "/api/author-stats", 3, 1, 10),
+    _stats("author-stats-12m-c8", "/api/author-stats", 12, 8, 32),
+    _stats("media-stats-3m", "/api/media-stats", 3, 1, 10),
+    _stats("media-stats-12m-c8", "/api/media-stats", 12, 8, 32),
+]
+
+
+def percentile(values: List[float], p: float) -> float:
+    """最近秩法计算分位数"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class ProcessMemory:
+    """通过/proc读取进程的峰值常驻内存（仅Linux），每个场景开始前重置峰值"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+
+    def reset_peak(self) -> bool:
+        try:
+            # 写入5会把VmHWM重置为当前RSS
+            Path(f"/proc/{self.pid}/clear_refs").write_text("5")
+            return True
+        except OSError:
+            return False
+
+    def peak_mb(self) -> Optional[float]:
+        try:
+            for line in Path(f"/proc/{self.pid}/status").read_text().splitlines():
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+        return None
+
+
+async def _wait_ready(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as response:
+                    if response.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"等待服务就绪超时: {url}")
+
+
+async def run_scenario(session: aiohttp.ClientSession, base_url: str, scenario: Dict[str, Any],
+                       memory: ProcessMemory) -> Dict[str, Any]:
+    url = base_url + scenario["path"]
+    # 预热一次，不计入统计
+    async with session.post(url, json=scenario["body"]) as response:
+        await response.read()
+
+    peak_resettable = memory.reset_peak()
+    semaphore = asyncio.Semaphore(scenario["concurrency"])
+    latencies: List[float] = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            async with session.post(url, json=scenario["body"]) as response:
+                await response.read()
+                if response.status != 200:
+                    errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(scenario["requests"])])
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": scenario["requests"],
+        "concurrency": scenario["concurrency"],
+        "errors": errors,
+        "throughput_rps": round(scenario["requests"] / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "peak_rss_mb": memory.peak_mb(),
+        "peak_rss_scope": "scenario" if peak_resettable else "process"
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """与基线对比，返回回归说明；p95变慢或吞吐下降超过tolerance视为回归"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {result['p95_ms']}ms")
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: 吞吐 {base['throughput_rps']} -> {result['throughput_rps']} req/s")
+        if result["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: 错误数 {base.get('errors', 0)} -> {result['errors']}")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]]):
+    header = f"{'场景':<28}{'并发':>5}{'请求':>6}{'错误':>5}{'吞吐/s':>9}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'峰值MB':>9}{'p95基线':>10}"
+    print(header)
+    for name, result in results.items():
+        base = baseline.get(name, {}).get("p95_ms", "-")
+        print(f"{name:<28}{result['concurrency']:>5}{result['requests']:>6}{result['errors']:>5}"
+              f"{result['throughput_rps']:>9}{result['p50_ms']:>9}{result['p95_ms']:>9}{result['p99_ms']:>9}"
+              f"{str(result['peak_rss_mb']):>9}{str(base):>10}")
+
+
+async def run(args: argparse.Namespace) -> int:
+    workdir = Path(tempfile.mkdtemp(prefix="es-bench-"))
+    es_port, app_port = args.es_port, args.app_port
+    env = {
+        **os.environ,
+        "ES_HOST": "127.0.0.1",
+        "ES_PORT": str(es_port),
+        "ES_PASSWORD": "",
+        "LOG_DIR": str(workdir / "logs"),
+        "LOG_LEVEL": "WARNING",
+        "ROLLUP_DB_PATH": str(workdir / "rollup.db"),
+        "ROLLUP_BACKFILL_DAYS": "0",
+    }
+    if not args.with_caches:
+        # 默认关闭缓存和请求合并，测量的是完整的拉取与处理链路
+        env.update({"SEGMENT_CACHE_ENABLED": "false", "SEARCH_COALESCE_ENABLED": "false"})
+
+    fake_es = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_es", "--port", str(es_port), "--months", str(args.months),
+         "--docs-per-month", str(args.docs_per_month), "--latency-ms", str(args.latency_ms)],
+        cwd=ROOT, env=env)
+    app = None
+    try:
+        # ES替身就绪后再启动服务，保证索引目录首次刷新成功
+        await _wait_ready(f"http://127.0.0.1:{es_port}/_fake/stats", timeout=300)
+        app = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port),
+             "--log-level", "warning"],
+            cwd=ROOT, env=env)
+        await _wait_ready(f"http://127.0.0.1:{app_port}/api/health")
+
+        memory = ProcessMemory(app.pid)
+        scenarios = [scenario for scenario in SCENARIOS if not args.only or args.only in scenario["name"]]
+        results = {}
+        timeout = aiohttp.ClientTimeout(total=600)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            for scenario in scenarios:
+                results[scenario["name"]] = await run_scenario(session, f"http://127.0.0.1:{app_port}", scenario, memory)
+            # 给被取消请求的scroll清理留出时间
+            await asyncio.sleep(1)
+            async with session.get(f"http://127.0.0.1:{es_port}/_fake/stats") as response:
+                es_stats = await response.json()
+    finally:
+        processes = [process for process in (app, fake_es) if process is not None]
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+
+    baseline_path = BASELINE_DIR / f"{args.baseline}.json"
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))["results"] if baseline_path.exists() else {}
+    print_table(results, baseline)
+    print(f"ES替身请求统计: {es_stats}")
+    if es_stats.get("open_scrolls"):
+        print(f"警告: 有 {es_stats['open_scrolls']} 个scroll未清理")
+
+    report = {
+        "config": {
+            "months": args.months,
+            "docs_per_month": args.docs_per_month,
+            "latency_ms": args.latency_ms,
+            "with_caches": args.with_caches
+        },
+        "results": results
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        merged = {**baseline, **results}
+        baseline_path.write_text(json.dumps({**report, "results": merged}, ensure_ascii=False, indent=2) + "\n",
+                                 encoding="utf-8")
+        print(f"基线已保存: {baseline_path}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"回归: {regression}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ES模糊词查询服务性能基准")
+    parser.add_argument("--only", help="只运行名称包含该字符串的场景")
+    parser.add_argument("--months", type=int, default=12, help="合成语料的月份数")
+    parser.add_argument("--docs-per-month", type=int, default=2000, help="每个月度索引的文档数")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="ES替身每个请求的模拟延迟")
+    parser.add_argument("--with-caches", action="store_true", help="开启分段缓存和请求合并")
+    parser.add_argument("--es-port", type=int, default=9399)
+    parser.add_argument("--app-port", type=int, default=8199)
+    parser.add_argument("--baseline", default="default", help="基线名称（benchmarks/baselines/<名称>.json）")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="判定回归的相对变化阈值")
+    parser.add_argument("--output", help="把本次结果写入JSON文件")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
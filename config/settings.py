@@ -11,6 +11,12 @@ ES_PORT = int(os.getenv('ES_PORT', '9200'))
 ES_USERNAME = os.getenv('ES_USERNAME', 'elastic')
 ES_PASSWORD = os.getenv('ES_PASSWORD', '')
 
+# ES连接池配置
+ES_POOL_SIZE = int(os.getenv('ES_POOL_SIZE', 20))
+ES_CONNECT_TIMEOUT = float(os.getenv('ES_CONNECT_TIMEOUT', 5))
+ES_REQUEST_TIMEOUT = float(os.getenv('ES_REQUEST_TIMEOUT', 30))
+ES_KEEPALIVE_TIMEOUT = float(os.getenv('ES_KEEPALIVE_TIMEOUT', 60))
+
 # API配置
 API_HOST = os.getenv('API_HOST', '0.0.0.0')
 API_PORT = int(os.getenv('API_PORT', '8000'))
@@ -20,16 +26,37 @@ LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 LOG_FORMAT = os.getenv('LOG_FORMAT', '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 LOG_DIR = os.getenv('LOG_DIR', 'logs')
 
+# 按请求开启的性能剖析：请求带 X-Profile 头或 profile 查询参数时采样剖析该次搜索
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')  # 非空时，X-Profile/profile的值必须与之相同
+PROFILING_INTERVAL_MS = float(os.getenv('PROFILING_INTERVAL_MS', 5))  # 采样间隔（毫秒）
+PROFILING_KEEP = int(os.getenv('PROFILING_KEEP', 50))  # 保留最近多少份剖析结果
+PROFILE_DIR = os.path.join(LOG_DIR, 'profiles')
+
 # 查询配置
 MAX_RESULTS = int(os.getenv('MAX_RESULTS', '10000'))
-print(f"MAX_RESULTS: {MAX_RESULTS}")
 CONTEXT_CHARS = int(os.getenv('CONTEXT_CHARS', '50'))
-print(f"CONTEXT_CHARS: {CONTEXT_CHARS}")
 SCROLL_TIMEOUT = os.getenv('SCROLL_TIMEOUT', '5m')
 BATCH_SIZE = int(os.getenv('BATCH_SIZE', 1000))
+SCROLL_SLICES = int(os.getenv('SCROLL_SLICES', 1))
+INDEX_CONCURRENCY = int(os.getenv('INDEX_CONCURRENCY', 4))
+PIPELINE_QUEUE_PAGES = int(os.getenv('PIPELINE_QUEUE_PAGES', 2))
+STREAM_TOP_N = int(os.getenv('STREAM_TOP_N', 100))
+BATCH_MAX_KEYWORDS = int(os.getenv('BATCH_MAX_KEYWORDS', 100))
+
+# 抽样分析配置：样本量上限不超过索引的max_result_window
+SAMPLE_MAX_SIZE = int(os.getenv('SAMPLE_MAX_SIZE', 10000))
+SAMPLE_CONFIDENCE = float(os.getenv('SAMPLE_CONFIDENCE', 0.95))  # 估算值置信区间的置信水平
+
+# 搭配统计配置
+COLLOCATION_NGRAM = int(os.getenv('COLLOCATION_NGRAM', 2))  # 统计关键词左右1~N字的邻接片段
+COLLOCATION_TOP_N = int(os.getenv('COLLOCATION_TOP_N', 50))  # 邻接片段默认返回数量
+COLLOCATION_MAX_ENTRIES = int(os.getenv('COLLOCATION_MAX_ENTRIES', 200000))  # 单个计数表的条目上限
 
-# 线程配置
-MAX_WORKERS = int(os.getenv('MAX_WORKERS', 4))
+# 上下文提取进程池配置
+MAX_WORKERS = int(os.getenv('MAX_WORKERS', 4))  # 进程数，小于等于1时不使用进程池
+EXTRACT_CHUNK_SIZE = int(os.getenv('EXTRACT_CHUNK_SIZE', 250))  # 每次提交给工作进程的文档数
+EXTRACT_INLINE_THRESHOLD = int(os.getenv('EXTRACT_INLINE_THRESHOLD', 200))  # 少于该文档数时直接在当前进程处理
 
 # 查询字段配置
 SEARCH_FIELDS = [
@@ -39,9 +66,73 @@ SEARCH_FIELDS = [
     'retweet_content'
 ]
 
+# 统计维度 -> ES字段
+STATS_FIELDS = {
+    'author': 'author.keyword',
+    'media': 'media_name.keyword'
+}
+
+# 关键词趋势配置：粒度 -> ES calendar_interval
+TREND_INTERVALS = {
+    'hour': '1h',
+    'day': '1d',
+    'week': '1w',
+    'month': '1M'
+}
+TREND_MAX_BUCKETS = int(os.getenv('TREND_MAX_BUCKETS', 10000))  # 单次趋势查询的桶数上限（含各媒体的分布）
+
+# 高亮片段模式配置：开启后只从ES获取关键词附近的片段而非完整文档
+HIGHLIGHT_MODE = os.getenv('HIGHLIGHT_MODE', 'false').lower() == 'true'
+HIGHLIGHT_FRAGMENTS = int(os.getenv('HIGHLIGHT_FRAGMENTS', 1))
+HIGHLIGHT_PRE_TAG = '\ue000'
+HIGHLIGHT_POST_TAG = '\ue001'
+
+# 文本折叠配置：提取上下文时把全角字符折叠为半角、繁体字折叠为简体（需安装opencc），关键词同样折叠；
+# 只影响本地匹配和统计，ES查询仍使用原样的关键词
+TEXT_FOLD_WIDTH = os.getenv('TEXT_FOLD_WIDTH', 'false').lower() == 'true'
+TEXT_FOLD_TRADITIONAL = os.getenv('TEXT_FOLD_TRADITIONAL', 'false').lower() == 'true'
+
+# 分段缓存配置：已结束月份的分段结果永久缓存，当前月份短时缓存
+SEGMENT_CACHE_ENABLED = os.getenv('SEGMENT_CACHE_ENABLED', 'true').lower() == 'true'
+SEGMENT_CACHE_MAX_BYTES = int(os.getenv('SEGMENT_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+SEGMENT_CACHE_OPEN_TTL = float(os.getenv('SEGMENT_CACHE_OPEN_TTL', 60))  # 秒
+
+# 合并参数相同的并发搜索，共享同一次ES拉取
+SEARCH_COALESCE_ENABLED = os.getenv('SEARCH_COALESCE_ENABLED', 'true').lower() == 'true'
+
+# 作者/媒体日汇总配置：已结束的日期在后台汇总到本地SQLite，统计接口只把未汇总部分交给ES
+ROLLUP_ENABLED = os.getenv('ROLLUP_ENABLED', 'true').lower() == 'true'
+ROLLUP_DB_PATH = os.getenv('ROLLUP_DB_PATH', 'data/rollup.db')
+ROLLUP_BACKFILL_DAYS = int(os.getenv('ROLLUP_BACKFILL_DAYS', 365))  # 后台回填最近多少天
+ROLLUP_INTERVAL = float(os.getenv('ROLLUP_INTERVAL', 3600))  # 后台回填间隔（秒）
+ROLLUP_COMPOSITE_SIZE = int(os.getenv('ROLLUP_COMPOSITE_SIZE', 10000))  # composite聚合每页取值数
+ROLLUP_REFRESH_DAYS = int(os.getenv('ROLLUP_REFRESH_DAYS', 3))  # 每次回填时重新汇总最近多少个已结束的日期，补上延迟入库的文档
+ROLLUP_MAX_REMAINDER_DAYS = float(os.getenv('ROLLUP_MAX_REMAINDER_DAYS', 7))  # 未汇总部分超过该天数时整个范围改用terms聚合
+
+# 重型搜索准入控制：按估算成本限制同时进行的搜索，过载时排队，超时或排队已满返回429
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+ADMISSION_MAX_SCROLLS = int(os.getenv('ADMISSION_MAX_SCROLLS', 32))  # 全局同时打开的scroll上下文上限
+ADMISSION_MAX_DOCUMENTS = int(os.getenv('ADMISSION_MAX_DOCUMENTS', 200000))  # 同时进行的搜索预计拉取的文档总数上限
+ADMISSION_CHEAP_DOCUMENTS = int(os.getenv('ADMISSION_CHEAP_DOCUMENTS', 2000))  # 不超过该文档数的搜索不排队
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', 50))  # 最多排队的请求数
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 10))  # 最长排队时间（秒）
+ADMISSION_COUNT_ENABLED = os.getenv('ADMISSION_COUNT_ENABLED', 'true').lower() == 'true'  # 用_count估算命中数
+
+# 后台搜索任务：基于PIT+search_after逐页拉取，计数定期落盘，服务重启或ES出错后从检查点继续
+JOB_DIR = os.getenv('JOB_DIR', 'data/jobs')
+JOB_MAX_CONCURRENT = int(os.getenv('JOB_MAX_CONCURRENT', 2))  # 同时运行的任务数
+JOB_SPILL_PAGES = int(os.getenv('JOB_SPILL_PAGES', 20))  # 每处理多少页把计数落盘并记录检查点
+JOB_PIT_KEEP_ALIVE = os.getenv('JOB_PIT_KEEP_ALIVE', '10m')  # PIT保留时间，超时后从当前月份开头重新拉取
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))  # 连续失败多少次后任务失败
+JOB_RETRY_DELAY = float(os.getenv('JOB_RETRY_DELAY', 10))  # 失败后重试的基础等待时间（秒）
+
 # 索引前缀
 INDEX_PREFIX = 'qb'
 
+# 索引目录配置：定期从ES获取实际存在的索引及其时间范围，查询前跳过不存在或时间范围外的索引
+INDEX_CATALOG_ENABLED = os.getenv('INDEX_CATALOG_ENABLED', 'true').lower() == 'true'
+INDEX_CATALOG_INTERVAL = float(os.getenv('INDEX_CATALOG_INTERVAL', 300))  # 刷新间隔（秒）
+
 # 错误重试配置
 MAX_RETRIES = 3
 RETRY_DELAY = 1  # 秒 
\ No newline at end of file
@@ -0,0 +1,142 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+from config.settings import (
+    ADMISSION_MAX_SCROLLS, ADMISSION_MAX_DOCUMENTS, ADMISSION_CHEAP_DOCUMENTS,
+    ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT
+)
+from core.metrics import metrics
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """过载时拒绝请求，retry_after为建议的重试等待秒数"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """按估算成本对搜索做准入控制
+
+    每个搜索占用 scroll 上下文数和文档数两项额度，全局额度用尽时按到达顺序排队，
+    排队已满或等待超过queue_timeout时拒绝。估算文档数不超过cheap_documents的搜索计入用量但不排队，
+    在重型搜索排满时仍能立即执行。单个请求的成本超过全局额度时按全局额度计，保证它能单独执行。
+    """
+
+    def __init__(self, max_scrolls: int = ADMISSION_MAX_SCROLLS, max_documents: int = ADMISSION_MAX_DOCUMENTS,
+                 cheap_documents: int = ADMISSION_CHEAP_DOCUMENTS, max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.max_scrolls = max_scrolls
+        self.max_documents = max_documents
+        self.cheap_documents = cheap_documents
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.scrolls = 0
+        self.documents = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.bypassed = 0
+        # 已准入请求的平均占用时长（指数滑动平均），用于估算Retry-After
+        self._average_hold: Optional[float] = None
+        self._waiters: Deque[Tuple[int, int, asyncio.Future]] = deque()
+
+    def _fits(self, scrolls: int, documents: int) -> bool:
+        return self.scrolls + scrolls <= self.max_scrolls and self.documents + documents <= self.max_documents
+
+    def _acquire(self, scrolls: int, documents: int):
+        self.scrolls += scrolls
+        self.documents += documents
+
+    def _release(self, scrolls: int, documents: int):
+        self.scrolls -= scrolls
+        self.documents -= documents
+        # 按到达顺序唤醒额度足够的等待者
+        while self._waiters:
+            waiter_scrolls, waiter_documents, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if not self._fits(waiter_scrolls, waiter_documents):
+                break
+            self._waiters.popleft()
+            self._acquire(waiter_scrolls, waiter_documents)
+            future.set_result(None)
+
+    def retry_after(self) -> int:
+        hold = self._average_hold if self._average_hold is not None else self.queue_timeout
+        return max(1, math.ceil(hold))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.rejected += 1
+        metrics.inc("admission_total", outcome="rejected")
+        logger.warning(f"搜索被拒绝: {reason}, 当前占用 scroll: {self.scrolls}/{self.max_scrolls}, "
+                       f"文档: {self.documents}/{self.max_documents}, 排队: {len(self._waiters)}")
+        return AdmissionRejected(f"服务繁忙，{reason}，请稍后重试", self.retry_after())
+
+    @asynccontextmanager
+    async def admit(self, scrolls: int, documents: int) -> AsyncIterator[None]:
+        """占用(scrolls, documents)额度执行上下文内的代码，过载时抛出AdmissionRejected"""
+        scrolls = min(scrolls, self.max_scrolls)
+        documents = min(documents, self.max_documents)
+
+        if documents <= self.cheap_documents:
+            self.bypassed += 1
+            metrics.inc("admission_total", outcome="bypassed")
+            self._acquire(scrolls, documents)
+        elif not self._waiters and self._fits(scrolls, documents):
+            self.admitted += 1
+            metrics.inc("admission_total", outcome="admitted")
+            self._acquire(scrolls, documents)
+        else:
+            if len(self._waiters) >= self.max_queue:
+                raise self._reject("排队请求已满")
+
+            self.queued += 1
+            metrics.inc("admission_total", outcome="queued")
+            future = asyncio.get_running_loop().create_future()
+            waiter = (scrolls, documents, future)
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(future, self.queue_timeout)
+            except BaseException as e:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                if future.done() and not future.cancelled():
+                    # 额度已分配但等待方被取消，归还额度
+                    self._release(scrolls, documents)
+                if isinstance(e, asyncio.TimeoutError):
+                    raise self._reject(f"排队超过{self.queue_timeout:g}秒")
+                raise
+            self.admitted += 1
+            metrics.inc("admission_total", outcome="admitted")
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(scrolls, documents)
+            if documents > self.cheap_documents:
+                hold = time.monotonic() - started
+                self._average_hold = hold if self._average_hold is None else 0.8 * self._average_hold + 0.2 * hold
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "scrolls": self.scrolls,
+            "max_scrolls": self.max_scrolls,
+            "documents": self.documents,
+            "max_documents": self.max_documents,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "bypassed": self.bypassed,
+            "average_hold_seconds": round(self._average_hold, 3) if self._average_hold is not None else None
+        }
@@ -0,0 +1,31 @@
+"""JSON编解码
+
+安装orjson时使用orjson（C实现，直接在bytes和对象之间转换），否则退回标准库json。
+dumps总是返回UTF-8编码的bytes，非ASCII字符原样输出（同json.dumps(..., ensure_ascii=False)）。
+"""
+import json
+from typing import Any, Union
+
+try:
+    # 可选依赖：安装orjson后使用其C实现
+    import orjson
+except ImportError:
+    orjson = None
+
+CODEC = "orjson" if orjson is not None else "json"
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson不支持的类型（如超过64位的整数）交给标准库处理
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,115 @@
+import heapq
+import sys
+from collections import Counter
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config.settings import COLLOCATION_NGRAM, COLLOCATION_MAX_ENTRIES
+
+
+class CollocationCounter:
+    """关键词上下文及左右邻接n-gram的增量计数器
+
+    所有计数都是哈希表上的O(1)增量更新，取前N名用堆完成，无需对全部条目排序。
+    某个计数表的条目数超过max_entries时，只保留计数最高的一半，
+    此后低频长尾的计数为近似值（approximate标记为True），高频条目不受影响。
+    """
+
+    def __init__(self, keyword: str, ngram: int = COLLOCATION_NGRAM, max_entries: int = COLLOCATION_MAX_ENTRIES):
+        self.keyword = keyword
+        self.ngram = ngram
+        self.max_entries = max_entries
+        self.total = 0
+        self.approximate = False
+        self.contexts: Counter = Counter()
+        self.left: Dict[int, Counter] = {n: Counter() for n in range(1, ngram + 1)}
+        self.right: Dict[int, Counter] = {n: Counter() for n in range(1, ngram + 1)}
+
+    def add(self, context: str, offset: Optional[int] = None):
+        """记录一条上下文；offset为关键词在上下文中的位置，缺省时取第一次出现的位置"""
+        if offset is None:
+            offset = context.find(self.keyword)
+        self.total += 1
+        self.contexts[context] += 1
+        if offset < 0:
+            return
+
+        left = context[:offset]
+        right = context[offset + len(self.keyword):]
+        for n in range(1, self.ngram + 1):
+            if len(left) >= n:
+                self.left[n][left[-n:]] += 1
+            if len(right) >= n:
+                self.right[n][right[:n]] += 1
+        self._prune_if_needed()
+
+    def update(self, contexts: Iterable[str]):
+        for context in contexts:
+            self.add(context)
+
+    def merge(self, other: "CollocationCounter"):
+        """合并另一个计数器（如其他页或其他工作进程的部分结果）"""
+        self.total += other.total
+        self.approximate = self.approximate or other.approximate
+        self.contexts.update(other.contexts)
+        for n in range(1, self.ngram + 1):
+            self.left[n].update(other.left.get(n, {}))
+            self.right[n].update(other.right.get(n, {}))
+        self._prune_if_needed()
+
+    def _prune_if_needed(self):
+        for counter in self._counters():
+            if len(counter) > self.max_entries:
+                keep = heapq.nlargest(self.max_entries // 2, counter.items(), key=itemgetter(1))
+                counter.clear()
+                counter.update(dict(keep))
+                self.approximate = True
+
+    def size_bytes(self) -> int:
+        """估算占用的内存字节数（每个条目按字符串大小加上字典与整数的固定开销计算）"""
+        return sum(sys.getsizeof(word) + 100 for counter in self._counters() for word in counter)
+
+    def to_state(self) -> Dict[str, Any]:
+        """导出为可JSON序列化的字典，用于落盘"""
+        return {
+            "keyword": self.keyword,
+            "ngram": self.ngram,
+            "total": self.total,
+            "approximate": self.approximate,
+            "contexts": dict(self.contexts),
+            "left": {str(n): dict(counter) for n, counter in self.left.items()},
+            "right": {str(n): dict(counter) for n, counter in self.right.items()}
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any], max_entries: int = COLLOCATION_MAX_ENTRIES) -> "CollocationCounter":
+        counter = cls(state["keyword"], state["ngram"], max_entries)
+        counter.total = state["total"]
+        counter.approximate = state["approximate"]
+        counter.contexts.update(state["contexts"])
+        for n in range(1, counter.ngram + 1):
+            counter.left[n].update(state["left"].get(str(n), {}))
+            counter.right[n].update(state["right"].get(str(n), {}))
+        return counter
+
+    def _counters(self) -> List[Counter]:
+        return [self.contexts, *self.left.values(), *self.right.values()]
+
+    @staticmethod
+    def top(counter: Counter, top_n: Optional[int] = None) -> List[Tuple[str, int]]:
+        """取计数最高的top_n项，未指定时返回全部（按计数降序）"""
+        if top_n is None:
+            return counter.most_common()
+        return heapq.nlargest(top_n, counter.items(), key=itemgetter(1))
+
+    def top_words(self, top_n: Optional[int] = None) -> List[Dict[str, Any]]:
+        return [{"word": word, "count": count} for word, count in self.top(self.contexts, top_n)]
+
+    def neighbors(self, top_n: Optional[int] = None) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+        """左右邻接n-gram频次，按n分组"""
+        return {
+            side: {
+                str(n): [{"word": word, "count": count} for word, count in self.top(counters[n], top_n)]
+                for n in counters
+            }
+            for side, counters in (("left", self.left), ("right", self.right))
+        }
@@ -1,44 +1,124 @@
+import asyncio
 import json
-from typing import Dict, List, Optional, Any
-import requests
-from requests.auth import HTTPBasicAuth
-from tenacity import retry, stop_after_attempt, wait_exponential
-from datetime import datetime
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple, Union
+import aiohttp
+from tenacity import RetryCallState, retry, retry_if_exception, stop_after_attempt, wait_exponential
+from datetime import datetime, timedelta
 from config.settings import (
     ES_HOST, ES_PORT, ES_USERNAME, ES_PASSWORD,
-    SCROLL_TIMEOUT, MAX_RETRIES, RETRY_DELAY, MAX_RESULTS
+    SCROLL_TIMEOUT, MAX_RETRIES, RETRY_DELAY, MAX_RESULTS,
+    BATCH_SIZE, SCROLL_SLICES, INDEX_CONCURRENCY, PIPELINE_QUEUE_PAGES,
+    SEARCH_FIELDS, STATS_FIELDS, HIGHLIGHT_PRE_TAG, HIGHLIGHT_POST_TAG, HIGHLIGHT_FRAGMENTS,
+    ES_POOL_SIZE, ES_CONNECT_TIMEOUT, ES_REQUEST_TIMEOUT, ES_KEEPALIVE_TIMEOUT,
+    ROLLUP_COMPOSITE_SIZE, INDEX_PREFIX, INDEX_CATALOG_ENABLED, JOB_PIT_KEEP_ALIVE, TREND_INTERVALS
 )
+from core import codec
+from core.hits import HIT_SOURCE_FIELDS, Hit, compact_hits
+from core.index_catalog import IndexCatalog
+from core.metrics import metrics, timed
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+def _is_retryable(exception: BaseException) -> bool:
+    """4xx错误（429除外）如索引不存在、请求体错误等，重试也不会成功，直接抛出；任务取消不重试"""
+    if not isinstance(exception, Exception):
+        return False
+    if isinstance(exception, aiohttp.ClientResponseError):
+        return exception.status == 429 or exception.status >= 500
+    return True
+
+def _count_retry(retry_state: RetryCallState):
+    metrics.inc("es_retries_total")
+
+def _operation(method: str, endpoint: str) -> str:
+    """ES请求的操作类型，用作指标标签"""
+    path = endpoint.split("?", 1)[0]
+    if path.startswith("_search/scroll"):
+        return "clear_scroll" if method == "DELETE" else "scroll"
+    if path.startswith("_cat/"):
+        return "cat"
+    if path.endswith("/_count"):
+        return "count"
+    if path == "_pit" or path.endswith("/_pit"):
+        return "close_pit" if method == "DELETE" else "open_pit"
+    return "search"
+
 class ESClient:
     def __init__(self):
         self.base_url = f"http://{ES_HOST}:{ES_PORT}"
-        self.auth = HTTPBasicAuth(ES_USERNAME, ES_PASSWORD) if ES_USERNAME and ES_PASSWORD else None
+        self.auth = aiohttp.BasicAuth(ES_USERNAME, ES_PASSWORD) if ES_USERNAME and ES_PASSWORD else None
         self.headers = {"Content-Type": "application/json"}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.catalog = IndexCatalog(self)
+        self._background_tasks = set()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的长连接会话（首次使用时在当前事件循环中创建）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=ES_POOL_SIZE,
+                limit_per_host=ES_POOL_SIZE,
+                keepalive_timeout=ES_KEEPALIVE_TIMEOUT
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=ES_REQUEST_TIMEOUT,
+                sock_connect=ES_CONNECT_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                auth=self.auth,
+                headers=self.headers
+            )
+        return self._session
+
+    def start(self):
+        """启动索引目录的定期刷新（需在事件循环中调用）"""
+        if INDEX_CATALOG_ENABLED:
+            self.catalog.start()
+
+    async def close(self):
+        """停止索引目录刷新并关闭连接池"""
+        await self.catalog.close()
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
 
     @retry(
         stop=stop_after_attempt(MAX_RETRIES),
         wait=wait_exponential(multiplier=1, min=4, max=10),
+        retry=retry_if_exception(_is_retryable),
+        before_sleep=_count_retry,
         reraise=True
     )
-    def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
-        """发送请求到ES"""
+    async def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
+        """发送请求到ES，按操作类型分别记录往返耗时、响应字节数和JSON解码耗时"""
         url = f"{self.base_url}/{endpoint}"
+        operation = _operation(method, endpoint)
+        metrics.inc("es_requests_total", operation=operation)
         try:
-            response = requests.request(
-                method=method,
-                url=url,
-                auth=self.auth,
-                headers=self.headers,
-                json=data,
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"ES请求失败: {str(e)}")
+            session = self._get_session()
+            with timed(f"es_{operation}"):
+                async with session.request(method, url, json=data) as response:
+                    response.raise_for_status()
+                    protocol = response.connection.protocol if response.connection is not None else None
+                    try:
+                        body = await response.read()
+                    except asyncio.CancelledError:
+                        # 响应体收完时连接已放回连接池，但因流控暂停的读取要等读完缓冲才恢复；
+                        # 此时被取消不恢复的话，复用这条连接的下一个请求（如清理scroll）收不到响应，一直等到超时
+                        if protocol is not None:
+                            protocol.resume_reading()
+                        raise
+            metrics.inc("es_response_bytes_total", len(body), operation=operation)
+            with timed("es_decode"):
+                return codec.loads(body)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"ES请求失败: {str(e) or type(e).__name__}")
             raise
 
     def _validate_time_format(self, time_str: str) -> str:
@@ -52,294 +132,694 @@ class ESClient:
             logger.error(f"时间格式错误: {time_str}, 错误信息: {str(e)}")
             raise ValueError(f"时间格式必须为 'YYYY-MM-DD HH:MM:SS', 当前格式: {time_str}")
 
-    def search_with_scroll(self, index: str, query: Dict, size: int = 1000, max_results: int = MAX_RESULTS) -> List[Dict]:
-        """使用scroll API进行分页查询"""
+    async def _open_scroll(self, index: str, search_data: Dict) -> Dict:
+        """发起scroll查询；等待响应时被取消的，响应到达后仍清理已创建的scroll，避免其在ES上占用到SCROLL_TIMEOUT"""
+        request = asyncio.ensure_future(self._make_request(
+            "POST", f"{index}/_search?scroll={SCROLL_TIMEOUT}&ignore_unavailable=true", search_data))
         try:
+            return await asyncio.shield(request)
+        except asyncio.CancelledError:
+            request.add_done_callback(self._clear_orphan_scroll)
+            raise
+
+    def _clear_orphan_scroll(self, request: asyncio.Future):
+        if request.cancelled() or request.exception() is not None:
+            return
+        scroll_id = request.result().get("_scroll_id")
+        if scroll_id:
+            self._clear_scrolls([scroll_id])
+
+    def _clear_scrolls(self, scroll_ids: List[str]):
+        """在后台任务中清理scroll；发起清理的任务随后被取消（如调用方读完最后一页即结束）也不会中断清理"""
+        task = asyncio.ensure_future(self._make_request("DELETE", "_search/scroll", {"scroll_id": scroll_ids}))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._scrolls_cleared)
+
+    def _scrolls_cleared(self, task: asyncio.Future):
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"清理scroll失败: {str(task.exception())}")
+
+    async def _produce_scroll_pages(self, index: str, body: Dict, size: int, slices: int,
+                                    queue: asyncio.Queue, meta: Dict[str, Any]):
+        """将单个索引的scroll分页放入队列，slices大于1时并发拉取多个分片
+
+        body为查询请求体（query及highlight、_source等可选项），分页相关参数在此补充。
+
+        队列中依次放入每页的hits，正常结束放入None，出错时放入异常对象。
+        """
+        scroll_ids = set()
+        slice_totals: List[int] = []
+
+        async def scroll_slice(slice_id: int):
             # 初始化scroll
             search_data = {
-                "query": query,
+                **body,
                 "size": size,
                 "sort": ["_doc"],
                 "track_total_hits": True
             }
-            
-            response = self._make_request("POST", f"{index}/_search?scroll={SCROLL_TIMEOUT}", search_data)
-            scroll_id = response["_scroll_id"]
+            if slices > 1:
+                search_data["slice"] = {"id": slice_id, "max": slices}
+
+            response = await self._open_scroll(index, search_data)
+            scroll_id = response.get("_scroll_id")
+            if scroll_id:
+                scroll_ids.add(scroll_id)
+            slice_totals.append(response["hits"]["total"]["value"])
+            if len(slice_totals) == slices:
+                # 全部分片打开后一次记下该索引的命中数，被取消时不会只记入部分分片
+                self._record_index_total(meta, index, sum(slice_totals))
             hits = response["hits"]["hits"]
-            total_hits = response["hits"]["total"]["value"]
-            results = hits
 
-            # 继续获取数据直到没有更多结果
-            while hits and len(results) < max_results:  # 使用传入的max_results
+            # 继续获取数据直到没有更多结果；队列满时在此等待消费方
+            while hits:
+                metrics.inc("es_pages_total")
+                await queue.put(hits)
                 scroll_data = {
                     "scroll": SCROLL_TIMEOUT,
                     "scroll_id": scroll_id
                 }
-                response = self._make_request("POST", "_search/scroll", scroll_data)
+                response = await self._make_request("POST", "_search/scroll", scroll_data)
+                scroll_id = response.get("_scroll_id", scroll_id)
+                scroll_ids.add(scroll_id)
                 hits = response["hits"]["hits"]
-                results.extend(hits)
-
-            # 清理scroll
-            self._make_request("DELETE", "_search/scroll", {"scroll_id": scroll_id})
-            
-            # 添加总数信息到每个结果中
-            for result in results:
-                result["_source"] = result.get("_source", {})
-                result["_source"]["total_hits"] = total_hits
-            
-            return results[:max_results]  # 确保不超过最大限制
 
+        tasks = [asyncio.create_task(scroll_slice(i)) for i in range(slices)]
+        try:
+            await asyncio.gather(*tasks)
+            await queue.put(None)
         except Exception as e:
             logger.error(f"Scroll查询失败: {str(e)}")
-            raise
+            await queue.put(e)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # 清理scroll
+            if scroll_ids:
+                self._clear_scrolls(list(scroll_ids))
+
+    def _record_index_total(self, meta: Dict[str, Any], index: str, total: int):
+        """记录索引的命中数并累加到meta["total"]，已记录的索引不重复计入"""
+        index_totals = meta.setdefault("index_totals", {})
+        if index not in index_totals:
+            index_totals[index] = total
+            meta["total"] = meta.get("total", 0) + total
+
+    async def _count_index_totals(self, segments: List[Tuple[str, Dict]], meta: Dict[str, Any]):
+        """对尚未记录命中数的索引并发执行_count，补全meta中的命中总数
+
+        达到max_results后未开始或被取消的索引读不到命中数，不补全时total会随INDEX_CONCURRENCY和时序变化。
+        """
+        missing = [(index, body) for index, body in segments if index not in meta.get("index_totals", {})]
+        if not missing:
+            return
+
+        async def count(index: str, body: Dict) -> int:
+            response = await self._make_request("POST", f"{index}/_count?ignore_unavailable=true",
+                                                {"query": body["query"]})
+            return response["count"]
+
+        counts = await asyncio.gather(*[count(index, body) for index, body in missing], return_exceptions=True)
+        for (index, _), total in zip(missing, counts):
+            if isinstance(total, Exception):
+                logger.warning(f"统计索引 {index} 命中数失败: {str(total)}")
+                continue
+            self._record_index_total(meta, index, total)
+
+    async def count_segment_totals(self, keyword: str, segments: List[Tuple[str, str, str]], meta: Dict[str, Any]):
+        """补全plan_segments切分出的分段中尚未记录的命中数，结果写入meta"""
+        await self._count_index_totals(
+            [(index, self._build_search_body(keyword, segment_start, segment_end))
+             for index, segment_start, segment_end in segments], meta)
+
+    async def iter_index_pages(self, segments: List[Tuple[str, Dict]], size: int = BATCH_SIZE,
+                               max_results: int = MAX_RESULTS, slices: int = SCROLL_SLICES,
+                               meta: Optional[Dict[str, Any]] = None) -> AsyncIterator[Tuple[str, Optional[List[Dict]]]]:
+        """按索引顺序逐页产出(索引名, hits)
+
+        segments为(索引名, 查询请求体)列表。各索引并发拉取（受INDEX_CONCURRENCY限制），
+        每个索引最多预取PIPELINE_QUEUE_PAGES页，因此内存占用只与页数上限有关，与结果总量无关。
+        某个索引的结果全部产出后再产出(索引名, None)，恰好在上限处取完的索引也产出；
+        查询失败或因达到上限被截断的索引不会产出该结束标记。
+        命中总数累加到meta["total"]，各索引命中数记录在meta["index_totals"]；因达到上限提前结束时，
+        在产出最后一页前用_count补全其余索引的命中数，total与并发数和时序无关。
+        """
+        meta = meta if meta is not None else {}
+        meta.setdefault("total", 0)
+        indices = [index for index, _ in segments]
+        semaphore = asyncio.Semaphore(INDEX_CONCURRENCY)
+        queues = [asyncio.Queue(maxsize=PIPELINE_QUEUE_PAGES) for _ in segments]
+
+        async def produce(index: str, body: Dict, queue: asyncio.Queue):
+            async with semaphore:
+                await self._produce_scroll_pages(index, body, size, slices, queue, meta)
+
+        producers = [asyncio.create_task(produce(index, body, queue)) for (index, body), queue in zip(segments, queues)]
+        fetched = 0
+        try:
+            for index, queue in zip(indices, queues):
+                index_fetched = 0
+                while True:
+                    page = await queue.get()
+                    if page is None:
+                        yield index, None
+                        break
+                    if isinstance(page, Exception):
+                        if len(indices) == 1:
+                            raise page
+                        logger.warning(f"查询索引 {index} 失败: {str(page)}")
+                        break
+                    cut = len(page) > max_results - fetched
+                    page = page[:max_results - fetched]
+                    fetched += len(page)
+                    index_fetched += len(page)
+                    if fetched >= max_results:
+                        await self._count_index_totals(segments, meta)
+                    yield index, page
+                    if fetched >= max_results:
+                        if not cut and index_fetched == meta.get("index_totals", {}).get(index):
+                            # 恰好在上限处取完该索引，结果是完整的，仍产出结束标记
+                            yield index, None
+                        return
+        finally:
+            # 已达到上限或调用方提前结束，取消剩余索引的查询
+            for producer in producers:
+                producer.cancel()
+            await asyncio.gather(*producers, return_exceptions=True)
+
+    async def open_point_in_time(self, index: str, keep_alive: str = JOB_PIT_KEEP_ALIVE) -> str:
+        """在索引上打开PIT（时间点视图），返回PIT id"""
+        response = await self._make_request("POST", f"{index}/_pit?keep_alive={keep_alive}&ignore_unavailable=true")
+        return response["id"]
+
+    async def close_point_in_time(self, pit_id: str):
+        await self._make_request("DELETE", "_pit", {"id": pit_id})
+
+    async def search_after_page(self, pit_id: str, keyword: str, start_time: str, end_time: str, size: int,
+                                search_after: Optional[List[Any]] = None,
+                                keep_alive: str = JOB_PIT_KEEP_ALIVE) -> Dict[str, Any]:
+        """在PIT上按add_time顺序取一页关键词搜索结果
+
+        PIT会自动追加_shard_doc作为唯一的排序键，每条hit带有sort值，最后一条的sort值作为下一页的search_after。
+        响应中的pit_id可能变化，后续请求应使用最新的id。
+        """
+        body = {
+            **self._build_search_body(keyword, start_time, end_time, source_fields=HIT_SOURCE_FIELDS),
+            "size": size,
+            "pit": {"id": pit_id, "keep_alive": keep_alive},
+            "sort": [{"add_time": "asc"}],
+            "track_total_hits": False
+        }
+        if search_after is not None:
+            body["search_after"] = search_after
+        return await self._make_request("POST", "_search", body)
 
     def get_index_for_date(self, date_str: str) -> str:
         """根据日期获取对应的索引名"""
         # 假设date_str格式为 "YYYY-MM-DD"
         year = date_str[:4]
         month = date_str[5:7]
-        return f"qb{year}{month}1"
+        return f"{INDEX_PREFIX}{year}{month}1"
 
-    def search(self, keyword: str, start_time: str, end_time: str, max_results: int = MAX_RESULTS) -> List[Dict]:
-        """搜索关键词"""
+    def _build_keyword_clauses(self, keyword: str) -> List[Dict[str, Any]]:
+        """构建单个关键词在各检索字段上的匹配子句"""
+        return [
+            {
+                "match_phrase_prefix": {
+                    "title": {
+                        "query": keyword,
+                        "boost": 2
+                    }
+                }
+            },
+            {
+                "match_phrase_prefix": {
+                    "content": {
+                        "query": keyword
+                    }
+                }
+            },
+            {
+                "match_phrase_prefix": {
+                    "retweet_title": {
+                        "query": keyword,
+                        "boost": 2
+                    }
+                }
+            },
+            {
+                "match_phrase_prefix": {
+                    "retweet_content": {
+                        "query": keyword
+                    }
+                }
+            }
+        ]
+
+    def _build_keyword_query(self, keyword: Union[str, List[str]], start_time: str, end_time: str) -> Dict[str, Any]:
+        """构建关键词+时间范围查询，传入多个关键词时匹配任意一个即可"""
+        keywords = [keyword] if isinstance(keyword, str) else keyword
+        return {
+            "bool": {
+                "must": [
+                    {
+                        "bool": {
+                            "should": [clause for kw in keywords for clause in self._build_keyword_clauses(kw)],
+                            "minimum_should_match": 1
+                        }
+                    },
+                    {
+                        "range": {
+                            "add_time": {
+                                "gte": start_time,
+                                "lte": end_time
+                            }
+                        }
+                    }
+                ]
+            }
+        }
+
+    def _build_highlight(self, fragment_size: int) -> Dict[str, Any]:
+        """构建只返回关键词附近片段的高亮配置"""
+        return {
+            "pre_tags": [HIGHLIGHT_PRE_TAG],
+            "post_tags": [HIGHLIGHT_POST_TAG],
+            "fragment_size": fragment_size,
+            "number_of_fragments": HIGHLIGHT_FRAGMENTS,
+            "no_match_size": 0,
+            "fields": {field: {} for field in SEARCH_FIELDS}
+        }
+
+    def _build_search_body(self, keyword: Union[str, List[str]], start_time: str, end_time: str,
+                           highlight_size: Optional[int] = None,
+                           source_fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """构建关键词搜索的请求体，指定highlight_size时不返回_source，只返回高亮片段；
+        指定source_fields时_source只返回这些字段"""
+        body: Dict[str, Any] = {"query": self._build_keyword_query(keyword, start_time, end_time)}
+        if highlight_size:
+            body["_source"] = False
+            body["highlight"] = self._build_highlight(highlight_size)
+        elif source_fields:
+            body["_source"] = source_fields
+        return body
+
+    def plan_segments(self, start_time: str, end_time: str) -> List[Tuple[str, str, str]]:
+        """将时间范围按月度索引切分，返回(索引名, 段开始时间, 段结束时间)列表"""
+        start_time = self._validate_time_format(start_time)
+        end_time = self._validate_time_format(end_time)
+        segments = []
+        for index in self._get_indices(self.get_index_for_date(start_time), self.get_index_for_date(end_time)):
+            month_start, month_end = self.get_index_time_bounds(index)
+            segment_start, segment_end = max(start_time, month_start), min(end_time, month_end)
+            if self.catalog.covers(index, segment_start, segment_end):
+                segments.append((index, segment_start, segment_end))
+        return segments
+
+    def get_index_time_bounds(self, index: str) -> Tuple[str, str]:
+        """获取月度索引覆盖的起止时间"""
+        month_start = datetime.strptime(index[2:8], "%Y%m")
+        next_month_start = datetime.strptime(self._get_next_index(index)[2:8], "%Y%m")
+        return (month_start.strftime("%Y-%m-%d %H:%M:%S"),
+                (next_month_start - timedelta(seconds=1)).strftime("%Y-%m-%d %H:%M:%S"))
+
+    async def iter_segment_pages(self, keyword: str, segments: List[Tuple[str, str, str]], max_results: int = MAX_RESULTS,
+                                 page_size: int = BATCH_SIZE, slices: int = SCROLL_SLICES,
+                                 meta: Optional[Dict[str, Any]] = None,
+                                 highlight_size: Optional[int] = None) -> AsyncIterator[Tuple[str, Optional[List[Dict]]]]:
+        """按plan_segments切分出的时间段搜索关键词，产出(索引名, hits)，每段以(索引名, None)结束
+
+        每段只查询该段自身的时间范围，因此各段结果互不依赖，可单独缓存。
+        非高亮模式下_source只返回HIT_SOURCE_FIELDS。
+        """
+        try:
+            index_segments = [
+                (index, self._build_search_body(keyword, segment_start, segment_end, highlight_size,
+                                                source_fields=HIT_SOURCE_FIELDS))
+                for index, segment_start, segment_end in segments
+            ]
+            logger.info(f"ES分段查询 - 关键词: {keyword}, 索引: {[index for index, _ in index_segments]}")
+
+            async with aclosing(self.iter_index_pages(index_segments, page_size, max_results, slices, meta)) as pages:
+                async for index, page in pages:
+                    yield index, page
+
+        except Exception as e:
+            logger.error(f"分段搜索失败: {str(e)}")
+            raise
+
+    async def iter_search_pages(self, keyword: Union[str, List[str]], start_time: str, end_time: str, max_results: int = MAX_RESULTS,
+                                page_size: int = BATCH_SIZE, slices: int = SCROLL_SLICES,
+                                meta: Optional[Dict[str, Any]] = None,
+                                highlight_size: Optional[int] = None,
+                                source_fields: Optional[List[str]] = None) -> AsyncIterator[List[Dict]]:
+        """搜索关键词（可传入多个，匹配任意一个），按页流式产出结果，命中总数写入meta["total"]
+
+        指定highlight_size时不返回_source，只返回各字段关键词附近长度约为highlight_size的高亮片段；
+        指定source_fields时_source只返回这些字段。
+        """
         try:
             # 验证并格式化时间
             start_time = self._validate_time_format(start_time)
             end_time = self._validate_time_format(end_time)
             
             # 构建查询
-            query = {
-                "bool": {
-                    "must": [
-                        {
-                            "bool": {
-                                "should": [
-                                    {
-                                        "match_phrase_prefix": {
-                                            "title": {
-                                                "query": keyword,
-                                                "boost": 2
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "match_phrase_prefix": {
-                                            "content": {
-                                                "query": keyword
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "match_phrase_prefix": {
-                                            "retweet_title": {
-                                                "query": keyword,
-                                                "boost": 2
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "match_phrase_prefix": {
-                                            "retweet_content": {
-                                                "query": keyword
-                                            }
-                                        }
-                                    }
-                                ],
-                                "minimum_should_match": 1
-                            }
-                        },
-                        {
-                            "range": {
-                                "add_time": {
-                                    "gte": start_time,
-                                    "lte": end_time
-                                }
-                            }
-                        }
-                    ]
-                }
-            }
+            body = self._build_search_body(keyword, start_time, end_time, highlight_size, source_fields)
+            query = body["query"]
 
             # 获取时间范围内的所有索引
             start_index = self.get_index_for_date(start_time)
             end_index = self.get_index_for_date(end_time)
+            indices = self.catalog.prune(self._get_indices(start_index, end_index), start_time, end_time)
             
             logger.info(f"ES查询信息 - 查询语句: {json.dumps(query, ensure_ascii=False)}, "
                        f"开始索引: {start_index}, 结束索引: {end_index}")
-            
-            # 如果开始和结束索引相同，直接查询
-            if start_index == end_index:
-                results = self.search_with_scroll(start_index, query, max_results=max_results)
-                logger.info(f"单索引查询完成 - 索引: {start_index}, 结果数量: {len(results)}")
-                return results
-            
-            # 否则需要查询多个索引
-            all_results = []
-            current_index = start_index
-            while current_index <= end_index and len(all_results) < max_results:
-                try:
-                    results = self.search_with_scroll(current_index, query, max_results=max_results - len(all_results))
-                    logger.info(f"多索引查询 - 当前索引: {current_index}, 结果数量: {len(results)}")
-                    all_results.extend(results)
-                except Exception as e:
-                    logger.warning(f"查询索引 {current_index} 失败: {str(e)}")
-                # 更新索引（这里需要根据实际的索引命名规则调整）
-                current_index = self._get_next_index(current_index)
-            
-            logger.info(f"多索引查询完成 - 总结果数量: {len(all_results)}")
-            return all_results[:max_results]  # 确保不超过最大限制
+
+            index_segments = [(index, body) for index in indices]
+            async with aclosing(self.iter_index_pages(index_segments, page_size, max_results, slices, meta)) as pages:
+                async for _, page in pages:
+                    if page is not None:
+                        yield page
 
         except Exception as e:
             logger.error(f"搜索失败: {str(e)}")
             raise
 
-    def get_author_aggregation(self, start_time: str, end_time: str, top_n: int) -> Dict[str, Any]:
-        """获取作者聚合统计"""
-        try:
-            # 验证并格式化时间
-            start_time = self._validate_time_format(start_time)
-            end_time = self._validate_time_format(end_time)
+    async def count_hits(self, keyword: Union[str, List[str]], start_time: str, end_time: str,
+                         limit: Optional[int] = None) -> int:
+        """统计关键词（可传入多个，匹配任意一个）在时间范围内的命中数
 
-            # 获取时间范围内的所有索引
-            start_index = self.get_index_for_date(start_time)
-            end_index = self.get_index_for_date(end_time)
+        指定limit时每个分片数到limit即停止，结果只适合与limit比较。
+        """
+        start_time = self._validate_time_format(start_time)
+        end_time = self._validate_time_format(end_time)
+        indices = self.catalog.prune(
+            self._get_indices(self.get_index_for_date(start_time), self.get_index_for_date(end_time)),
+            start_time, end_time)
+        if not indices:
+            return 0
 
-            # 获取所有需要查询的索引
-            indices = []
-            current_index = start_index
-            while current_index <= end_index:
-                indices.append(current_index)
-                current_index = self._get_next_index(current_index)
+        params = "ignore_unavailable=true" + (f"&terminate_after={limit}" if limit else "")
+        response = await self._make_request("POST", f"{','.join(indices)}/_count?{params}",
+                                            {"query": self._build_keyword_query(keyword, start_time, end_time)})
+        return response["count"]
 
-            query = {
-                "bool": {
-                    "must": [
-                        {
-                            "range": {
-                                "add_time": {
-                                    "gte": start_time,
-                                    "lte": end_time
-                                }
+    async def sample_search(self, keyword: str, start_time: str, end_time: str, size: int,
+                            seed: int) -> Tuple[List[Hit], int]:
+        """从时间范围内全部命中文档中均匀随机抽取size篇，返回(紧凑的Hit列表, 命中总数)
+
+        在所有月度索引上用一次搜索，以带种子的random_score替换相关性得分，ES取得分最高的size篇，
+        相当于不放回的简单随机抽样；同样的seed在数据不变时抽到同样的文档。
+        整个样本一次返回并在提取前一直留在内存中，因此转换为Hit，原始响应随即释放。
+        """
+        start_time = self._validate_time_format(start_time)
+        end_time = self._validate_time_format(end_time)
+        indices = self.catalog.prune(
+            self._get_indices(self.get_index_for_date(start_time), self.get_index_for_date(end_time)),
+            start_time, end_time)
+        if not indices:
+            return [], 0
+
+        body = {
+            "query": {
+                "function_score": {
+                    "query": self._build_keyword_query(keyword, start_time, end_time),
+                    "random_score": {"seed": seed, "field": "_seq_no"},
+                    "boost_mode": "replace"
+                }
+            },
+            "_source": HIT_SOURCE_FIELDS,
+            "size": size,
+            "track_total_hits": True
+        }
+        logger.info(f"ES抽样查询 - 关键词: {keyword}, 样本量: {size}, 种子: {seed}, 索引: {indices}")
+        response = await self._make_request("POST", f"{','.join(indices)}/_search?ignore_unavailable=true", body)
+        hits = response["hits"]
+        return compact_hits(hits["hits"]), hits["total"]["value"]
+
+    async def get_aggregations(self, start_time: str, end_time: str, dimensions: List[str], top_n: int,
+                               keywords: Optional[List[str]] = None) -> Dict[str, Any]:
+        """在一次请求中用并列聚合计算多个统计维度
+
+        dimensions取值为STATS_FIELDS中的维度（author、media）以及keyword；
+        keyword维度用filters聚合统计每个关键词的命中文档数。
+        """
+        # 验证并格式化时间
+        start_time = self._validate_time_format(start_time)
+        end_time = self._validate_time_format(end_time)
+
+        # 获取时间范围内的所有索引
+        start_index = self.get_index_for_date(start_time)
+        end_index = self.get_index_for_date(end_time)
+
+        # 获取所有需要查询的索引，跳过不存在或时间范围外的索引
+        indices = self.catalog.prune(self._get_indices(start_index, end_index), start_time, end_time)
+
+        query = {
+            "bool": {
+                "must": [
+                    {
+                        "range": {
+                            "add_time": {
+                                "gte": start_time,
+                                "lte": end_time
                             }
                         }
-                    ]
-                }
+                    }
+                ]
             }
+        }
 
-            aggs = {
-                "author_stats": {
+        aggs = {}
+        for dimension in dimensions:
+            if dimension in STATS_FIELDS:
+                aggs[f"{dimension}_stats"] = {
                     "terms": {
-                        "field": "author.keyword",  # 使用 author_name 字段
+                        "field": STATS_FIELDS[dimension],
                         "size": top_n,
                         "order": {
                             "_count": "desc"
                         }
                     }
                 }
+        if "keyword" in dimensions and keywords:
+            aggs["keyword_stats"] = {
+                "filters": {
+                    "filters": {
+                        keyword: {
+                            "bool": {
+                                "should": self._build_keyword_clauses(keyword),
+                                "minimum_should_match": 1
+                            }
+                        }
+                        for keyword in keywords
+                    }
+                }
             }
 
-            # 使用所有索引进行查询
-            indices_str = ",".join(indices)
-            logger.info(f"作者统计查询 - 使用索引: {indices_str}")
-            
-            response = self._make_request("POST", f"{indices_str}/_search", {
+        # 使用所有索引进行查询
+        indices_str = ",".join(indices)
+        logger.info(f"统计查询 - 维度: {dimensions}, 使用索引: {indices_str}")
+
+        if indices:
+            response = await self._make_request("POST", f"{indices_str}/_search?ignore_unavailable=true", {
                 "query": query,
                 "aggs": aggs,
-                "size": 0
+                "size": 0,
+                "track_total_hits": True
+            })
+        else:
+            response = {"hits": {"total": {"value": 0}}}
+
+        # 处理聚合结果
+        aggregations = response.get("aggregations", {})
+        result: Dict[str, Any] = {"total_docs": response["hits"]["total"]["value"]}
+        for dimension in dimensions:
+            if dimension in STATS_FIELDS:
+                stats = aggregations.get(f"{dimension}_stats", {"buckets": [], "sum_other_doc_count": 0})
+                buckets = stats["buckets"]
+                result[dimension] = {
+                    "total": stats["sum_other_doc_count"] + len(buckets),
+                    "top": [
+                        {
+                            dimension: bucket["key"],
+                            "count": bucket["doc_count"]
+                        }
+                        for bucket in buckets
+                    ]
+                }
+        if "keyword_stats" in aggs:
+            buckets = aggregations.get("keyword_stats", {}).get("buckets", {})
+            result["keyword"] = [
+                {"keyword": keyword, "count": buckets.get(keyword, {}).get("doc_count", 0)}
+                for keyword in keywords
+            ]
+        return result
+
+    async def get_keyword_trend(self, keyword: Union[str, List[str]], start_time: str, end_time: str, interval: str,
+                                media_top_n: int = 0) -> Dict[str, Any]:
+        """按add_time统计关键词命中文档数的时间分布，只返回聚合桶，不拉取文档
+
+        interval为TREND_INTERVALS中的粒度，空桶同样返回；media_top_n大于0时另外返回命中最多的前N个媒体各自的分布。
+        """
+        start_time = self._validate_time_format(start_time)
+        end_time = self._validate_time_format(end_time)
+        indices = self.catalog.prune(
+            self._get_indices(self.get_index_for_date(start_time), self.get_index_for_date(end_time)),
+            start_time, end_time)
+
+        histogram = {
+            "date_histogram": {
+                "field": "add_time",
+                "calendar_interval": TREND_INTERVALS[interval],
+                "format": "yyyy-MM-dd HH:mm:ss",
+                "min_doc_count": 0,
+                "extended_bounds": {"min": start_time, "max": end_time}
+            }
+        }
+        aggs: Dict[str, Any] = {"trend": histogram}
+        if media_top_n > 0:
+            aggs["media"] = {
+                "terms": {"field": STATS_FIELDS["media"], "size": media_top_n, "order": {"_count": "desc"}},
+                "aggs": {"trend": histogram}
+            }
+
+        logger.info(f"趋势查询 - 关键词: {keyword}, 粒度: {interval}, 索引: {indices}")
+        if indices:
+            response = await self._make_request("POST", f"{','.join(indices)}/_search?ignore_unavailable=true", {
+                "query": self._build_keyword_query(keyword, start_time, end_time),
+                "aggs": aggs,
+                "size": 0,
+                "track_total_hits": True
             })
+        else:
+            response = {"hits": {"total": {"value": 0}}}
 
-            # 处理聚合结果
-            buckets = response["aggregations"]["author_stats"]["buckets"]
-            total_authors = response["aggregations"]["author_stats"]["sum_other_doc_count"] + len(buckets)
+        aggregations = response.get("aggregations", {})
 
+        def buckets(trend: Dict[str, Any]) -> List[Dict[str, Any]]:
+            return [{"time": bucket["key_as_string"], "count": bucket["doc_count"]} for bucket in trend.get("buckets", [])]
+
+        result: Dict[str, Any] = {
+            "total": response["hits"]["total"]["value"],
+            "interval": interval,
+            "buckets": buckets(aggregations.get("trend", {}))
+        }
+        if media_top_n > 0:
+            result["media"] = [
+                {"media": bucket["key"], "count": bucket["doc_count"], "buckets": buckets(bucket["trend"])}
+                for bucket in aggregations.get("media", {}).get("buckets", [])
+            ]
+        return result
+
+    async def get_author_aggregation(self, start_time: str, end_time: str, top_n: int) -> Dict[str, Any]:
+        """获取作者聚合统计"""
+        try:
+            result = await self.get_aggregations(start_time, end_time, ["author"], top_n)
             return {
-                "total_authors": total_authors,
-                "top_authors": [
-                    {
-                        "author": bucket["key"],
-                        "count": bucket["doc_count"]
-                    }
-                    for bucket in buckets
-                ]
+                "total_authors": result["author"]["total"],
+                "top_authors": result["author"]["top"]
             }
 
         except Exception as e:
             logger.error(f"作者聚合查询失败: {str(e)}")
             raise
 
-    def get_media_aggregation(self, start_time: str, end_time: str, top_n: int) -> Dict[str, Any]:
+    async def get_media_aggregation(self, start_time: str, end_time: str, top_n: int) -> Dict[str, Any]:
         """获取媒体聚合统计"""
         try:
-            # 验证并格式化时间
-            start_time = self._validate_time_format(start_time)
-            end_time = self._validate_time_format(end_time)
+            result = await self.get_aggregations(start_time, end_time, ["media"], top_n)
+            return {
+                "total_media": result["media"]["total"],
+                "top_media": result["media"]["top"]
+            }
 
-            # 获取时间范围内的所有索引
-            start_index = self.get_index_for_date(start_time)
-            end_index = self.get_index_for_date(end_time)
+        except Exception as e:
+            logger.error(f"媒体聚合查询失败: {str(e)}")
+            raise
+
+    async def get_term_counts(self, field: str, ranges: List[Tuple[str, str]],
+                              page_size: int = ROLLUP_COMPOSITE_SIZE) -> Dict[str, int]:
+        """用composite聚合分页取出若干时间范围内某字段全部取值的精确文档数
+
+        与terms聚合不同，composite聚合遍历全部取值，结果不受分片近似误差影响。
+        """
+        if not ranges:
+            return {}
 
-            # 获取所有需要查询的索引
-            indices = []
-            current_index = start_index
-            while current_index <= end_index:
-                indices.append(current_index)
-                current_index = self._get_next_index(current_index)
+        start_time = min(self._validate_time_format(start) for start, _ in ranges)
+        end_time = max(self._validate_time_format(end) for _, end in ranges)
+        indices = self.catalog.prune(
+            self._get_indices(self.get_index_for_date(start_time), self.get_index_for_date(end_time)),
+            start_time, end_time)
+        if not indices:
+            return {}
 
-            query = {
+        body = {
+            "size": 0,
+            "query": {
                 "bool": {
-                    "must": [
-                        {
-                            "range": {
-                                "add_time": {
-                                    "gte": start_time,
-                                    "lte": end_time
-                                }
-                            }
-                        }
-                    ]
+                    "should": [{"range": {"add_time": {"gte": start, "lte": end}}} for start, end in ranges],
+                    "minimum_should_match": 1
                 }
-            }
-
-            aggs = {
-                "media_stats": {
-                    "terms": {
-                        "field": "media_name.keyword",  # 使用 media_name 字段
-                        "size": top_n,
-                        "order": {
-                            "_count": "desc"
-                        }
+            },
+            "aggs": {
+                "term_counts": {
+                    "composite": {
+                        "size": page_size,
+                        "sources": [{"key": {"terms": {"field": field}}}]
                     }
                 }
             }
+        }
 
-            # 使用所有索引进行查询
-            indices_str = ",".join(indices)
-            logger.info(f"媒体统计查询 - 使用索引: {indices_str}")
-            
-            response = self._make_request("POST", f"{indices_str}/_search", {
-                "query": query,
-                "aggs": aggs,
-                "size": 0
-            })
+        counts: Dict[str, int] = {}
+        while True:
+            response = await self._make_request("POST", f"{','.join(indices)}/_search?ignore_unavailable=true", body)
+            aggregation = response["aggregations"]["term_counts"]
+            for bucket in aggregation["buckets"]:
+                counts[bucket["key"]["key"]] = bucket["doc_count"]
+            after_key = aggregation.get("after_key")
+            if not aggregation["buckets"] or after_key is None:
+                break
+            body["aggs"]["term_counts"]["composite"]["after"] = after_key
+        return counts
 
-            # 处理聚合结果
-            buckets = response["aggregations"]["media_stats"]["buckets"]
-            total_media = response["aggregations"]["media_stats"]["sum_other_doc_count"] + len(buckets)
+    async def list_indices(self) -> List[str]:
+        """从_cat/indices获取实际存在的月度索引"""
+        response = await self._make_request("GET", f"_cat/indices/{INDEX_PREFIX}*?format=json&h=index")
+        return sorted(item["index"] for item in response)
 
-            return {
-                "total_media": total_media,
-                "top_media": [
-                    {
-                        "media": bucket["key"],
-                        "count": bucket["doc_count"]
+    async def get_index_time_ranges(self, indices: List[str]) -> Dict[str, Tuple[str, str]]:
+        """一次聚合获取各索引中add_time的最小/最大值，空索引不在结果中"""
+        time_format = {"field": "add_time", "format": "yyyy-MM-dd HH:mm:ss"}
+        response = await self._make_request("POST", f"{','.join(indices)}/_search?ignore_unavailable=true", {
+            "size": 0,
+            "aggs": {
+                "indices": {
+                    "terms": {"field": "_index", "size": len(indices)},
+                    "aggs": {
+                        "min_time": {"min": time_format},
+                        "max_time": {"max": time_format}
                     }
-                    for bucket in buckets
-                ]
+                }
             }
+        })
+        return {
+            bucket["key"]: (bucket["min_time"]["value_as_string"], bucket["max_time"]["value_as_string"])
+            for bucket in response["aggregations"]["indices"]["buckets"]
+        }
 
-        except Exception as e:
-            logger.error(f"媒体聚合查询失败: {str(e)}")
-            raise
+    def _get_indices(self, start_index: str, end_index: str) -> List[str]:
+        """获取起止索引之间（含两端）的所有月度索引"""
+        indices = []
+        current_index = start_index
+        while current_index <= end_index:
+            indices.append(current_index)
+            current_index = self._get_next_index(current_index)
+        return indices
 
     def _get_next_index(self, current_index: str) -> str:
         """获取下一个索引名"""
@@ -355,4 +835,4 @@ class ESClient:
             month += 1
             
         # 返回新的索引名
-        return f"qb{year}{month:02d}1" 
\ No newline at end of file
+        return f"{INDEX_PREFIX}{year}{month:02d}1" 
\ No newline at end of file
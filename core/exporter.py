@@ -0,0 +1,84 @@
+"""上下文导出的编码与压缩
+
+每批文档编码为JSONL或CSV后单独压缩成一个gzip成员或zstd帧。多个成员/帧直接拼接仍是合法的
+压缩流，因此各批可以在进程池中并行编码压缩，主进程只需按顺序写出。
+这里的函数都是模块级纯函数，可以提交到进程池中执行。
+"""
+import csv
+import io
+import zlib
+from typing import Any, Dict, Iterator, List
+from config.settings import SEARCH_FIELDS
+from core import codec
+from core.extractor import find_context, iter_field_items
+from core.normalizer import fold, fold_table
+
+try:
+    # 可选依赖：安装zstandard后支持zstd压缩
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FORMATS = ("jsonl", "csv")
+COMPRESSIONS = {"gzip": ("gz", "application/gzip"), "zstd": ("zst", "application/zstd")}
+# 导出只需检索字段和记录中的元数据，其余_source字段不从ES拉取
+SOURCE_FIELDS = SEARCH_FIELDS + ["add_time", "media_name"]
+CSV_COLUMNS = ["id", "index", "field", "add_time", "media", "context"]
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+
+def compression_available(compression: str) -> bool:
+    return compression == "gzip" or (compression == "zstd" and zstandard is not None)
+
+
+def iter_context_records(doc: Dict[str, Any], keyword: str, context_chars: int) -> Iterator[Dict[str, Any]]:
+    """产出文档每个检索字段的上下文记录，与计数使用的上下文一致"""
+    source = doc.get("_source", {})
+    table = fold_table()
+    keyword = fold(keyword, table)
+    for field, text in iter_field_items(doc):
+        if isinstance(text, str):
+            context = find_context(text, keyword, context_chars, table)
+            if context:
+                yield {
+                    "id": doc.get("_id"),
+                    "index": doc.get("_index"),
+                    "field": field,
+                    "add_time": source.get("add_time"),
+                    "media": source.get("media_name"),
+                    "context": context
+                }
+
+
+def encode_records(records: List[Dict[str, Any]], fmt: str, header: bool = False) -> bytes:
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, lineterminator="\n")
+        if header:
+            writer.writeheader()
+        writer.writerows(records)
+        return buffer.getvalue().encode("utf-8")
+    return b"".join(codec.dumps(record) + b"\n" for record in records)
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    """压缩为一个独立的gzip成员或zstd帧"""
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def export_chunk(docs: List[Dict[str, Any]], keyword: str, context_chars: int, fmt: str,
+                 compression: str) -> bytes:
+    """提取一批文档的上下文，编码并压缩；没有上下文时返回空字节串"""
+    records = [record for doc in docs for record in iter_context_records(doc, keyword, context_chars)]
+    if not records:
+        return b""
+    return compress(encode_records(records, fmt), compression)
+
+
+def export_header(fmt: str, compression: str) -> bytes:
+    """导出流的开头：CSV为表头，JSONL为空的压缩成员"""
+    return compress(encode_records([], fmt, header=True), compression)
@@ -0,0 +1,154 @@
+"""上下文提取与计数
+
+这里的函数都是模块级纯函数，既可以在当前进程中直接调用，也可以提交到进程池中执行。
+"""
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from config.settings import SEARCH_FIELDS, CONTEXT_CHARS, HIGHLIGHT_PRE_TAG, HIGHLIGHT_POST_TAG
+from core.collocation import CollocationCounter
+from core.hits import Hit
+from core.matcher import AhoCorasick
+from core.normalizer import Folding, clean_text, context_window, find, fold, fold_table, needs_full_clean
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def iter_field_items(doc: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    """产出文档各检索字段的(字段名, 文本)；高亮模式下文本为去掉高亮标记的片段，doc也可以是紧凑的Hit"""
+    if isinstance(doc, Hit):
+        yield from doc.iter_fields()
+        return
+
+    highlight = doc.get("highlight")
+    if highlight is not None:
+        for field in SEARCH_FIELDS:
+            for fragment in highlight.get(field, []):
+                yield field, fragment.replace(HIGHLIGHT_PRE_TAG, "").replace(HIGHLIGHT_POST_TAG, "")
+        return
+
+    source = doc.get("_source", {})
+    for field in SEARCH_FIELDS:
+        if field in source:
+            yield field, source[field]
+
+
+def iter_field_texts(doc: Dict[str, Any]) -> Iterator[Any]:
+    """产出文档各检索字段的文本"""
+    for _, text in iter_field_items(doc):
+        yield text
+
+
+def find_context(text: str, keyword: str, context_chars: int = CONTEXT_CHARS,
+                 table: Optional[Folding] = None) -> str:
+    """定位（折叠后的）关键词第一次出现的位置，返回清理并折叠后的上下文，未出现时返回空字符串
+
+    结果与先清理整篇再截取相同：匹配结束前有会被清理掉的字符时，关键词可能被这些字符隔开，退回清理整篇后定位。
+    """
+    index = find(text, keyword, table)
+    if needs_full_clean(text, len(text) if index == -1 else index + len(keyword)):
+        text = clean_text(text)
+        index = find(text, keyword, table)
+    if index == -1:
+        return ""
+    context, _ = context_window(text, index, len(keyword), context_chars, table)
+    return context
+
+
+def process_document(doc: Dict[str, Any], keyword: str, context_chars: int = CONTEXT_CHARS,
+                     table: Optional[Folding] = None) -> List[str]:
+    """处理单个文档，返回所有匹配的内容列表；table为折叠转换表，keyword应已用同一张表折叠"""
+    try:
+        matches = []
+
+        # 处理所有可能的字段，只清理关键词附近的窗口
+        for text in iter_field_texts(doc):
+            if isinstance(text, str):
+                context = find_context(text, keyword, context_chars, table)
+                if context:
+                    matches.append(context)
+
+        return matches
+    except Exception as e:
+        logger.error(f"处理文档失败: {str(e)}")
+        return []
+
+
+def process_document_batch(doc: Dict[str, Any], matcher: AhoCorasick, context_chars: int = CONTEXT_CHARS,
+                           table: Optional[Folding] = None) -> List[Tuple[str, str, int]]:
+    """处理单个文档，一次扫描提取所有关键词每一处出现的上下文，返回(关键词, 上下文, 关键词在上下文中的位置)列表
+
+    折叠时不用matcher，改为只折叠可能匹配的位置开始的一小段来比对，再只折叠截取的窗口；
+    匹配密集、窗口合计比正文还长时改为折叠一次整篇。正文有会被清理掉的字符时先清理整篇，与find_context一致。
+    """
+    try:
+        matches = []
+        patterns = tuple(matcher.patterns)
+
+        for text in iter_field_texts(doc):
+            if isinstance(text, str) and text:
+                if needs_full_clean(text, len(text)):
+                    text = clean_text(text)
+                window_table = table
+                if table is None:
+                    found = matcher.finditer(text)
+                else:
+                    found = list(table.finditer(text, patterns))
+                    if len(found) * 2 * context_chars > len(text):
+                        text, window_table = table.fold(text), None
+                for index, keyword in found:
+                    context, offset = context_window(text, index, len(keyword), context_chars, window_table)
+                    matches.append((keyword, context, offset))
+
+        return matches
+    except Exception as e:
+        logger.error(f"处理文档失败: {str(e)}")
+        return []
+
+
+@lru_cache(maxsize=32)
+def _get_matcher(keywords: Tuple[str, ...]) -> AhoCorasick:
+    """同一组关键词在工作进程内只构建一次匹配器"""
+    return AhoCorasick(keywords)
+
+
+def count_documents(docs: List[Dict[str, Any]], keyword: str, context_chars: int,
+                    ngram: int) -> Tuple[CollocationCounter, Dict[str, float]]:
+    """处理一批文档，返回这批文档的部分计数，以及提取（折叠+定位+截取并清理上下文）与计数两个阶段的耗时"""
+    table = fold_table()
+    keyword = fold(keyword, table)
+    collocations = CollocationCounter(keyword, ngram)
+    timings = {"extract": 0.0, "count": 0.0}
+    for doc in docs:
+        started = time.perf_counter()
+        contexts = process_document(doc, keyword, context_chars, table)
+        extracted = time.perf_counter()
+        collocations.update(contexts)
+        timings["extract"] += extracted - started
+        timings["count"] += time.perf_counter() - extracted
+    return collocations, timings
+
+
+def count_documents_batch(docs: List[Dict[str, Any]], keywords: Tuple[str, ...], context_chars: int,
+                          ngram: int) -> Tuple[Dict[str, CollocationCounter], Dict[str, float]]:
+    """多关键词版本的count_documents，返回每个关键词的部分计数及各阶段耗时"""
+    table = fold_table()
+    # 折叠后相同的关键词共用一个模式，匹配结果计入其中每个关键词
+    originals: Dict[str, List[str]] = {}
+    for keyword in keywords:
+        originals.setdefault(fold(keyword, table), []).append(keyword)
+    matcher = _get_matcher(tuple(originals))
+    collocations = {keyword: CollocationCounter(pattern, ngram)
+                    for pattern, group in originals.items() for keyword in group}
+    timings = {"extract": 0.0, "count": 0.0}
+    for doc in docs:
+        started = time.perf_counter()
+        matches = process_document_batch(doc, matcher, context_chars, table)
+        extracted = time.perf_counter()
+        for pattern, context, offset in matches:
+            for keyword in originals[pattern]:
+                collocations[keyword].add(context, offset)
+        timings["extract"] += extracted - started
+        timings["count"] += time.perf_counter() - extracted
+    return collocations, timings
@@ -0,0 +1,58 @@
+"""检索结果的紧凑表示
+
+ES返回的每条命中是带_index、_id、_score和完整_source的嵌套字典，一次性返回上万条结果时字典本身的开销
+远大于需要的文本。Hit只保留文档id、索引、add_time和各检索字段的文本（按SEARCH_FIELDS顺序存放，缺失为None），
+使用__slots__，不带实例字典。命中总数等结果级信息不写入每条记录，由调用方单独获取。
+"""
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from config.settings import SEARCH_FIELDS
+
+# 构建Hit只需从ES取回这些字段
+HIT_SOURCE_FIELDS = SEARCH_FIELDS + ["add_time"]
+
+
+class Hit:
+    __slots__ = ("id", "index", "add_time", "texts")
+
+    def __init__(self, id: str, index: str, add_time: Optional[str], texts: Tuple[Optional[str], ...]):
+        self.id = id
+        self.index = index
+        self.add_time = add_time
+        self.texts = texts
+
+    @classmethod
+    def from_es(cls, hit: Dict[str, Any]) -> "Hit":
+        source = hit.get("_source") or {}
+        # 索引名在同一结果集中大量重复，驻留后各记录共享同一个字符串
+        return cls(hit.get("_id"), sys.intern(hit.get("_index", "")), source.get("add_time"),
+                   tuple(source.get(field) for field in SEARCH_FIELDS))
+
+    def get(self, field: str) -> Optional[str]:
+        """按字段名取文本，字段不在SEARCH_FIELDS中或文档缺失该字段时返回None"""
+        try:
+            return self.texts[SEARCH_FIELDS.index(field)]
+        except ValueError:
+            return None
+
+    def iter_fields(self) -> Iterator[Tuple[str, str]]:
+        """产出文档存在的(字段名, 文本)，顺序同SEARCH_FIELDS"""
+        for field, text in zip(SEARCH_FIELDS, self.texts):
+            if text is not None:
+                yield field, text
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "index": self.index, "add_time": self.add_time, **dict(self.iter_fields())}
+
+    def __getstate__(self):
+        return self.id, self.index, self.add_time, self.texts
+
+    def __setstate__(self, state):
+        self.id, self.index, self.add_time, self.texts = state
+
+    def __repr__(self) -> str:
+        return f"Hit(id={self.id!r}, index={self.index!r}, add_time={self.add_time!r})"
+
+
+def compact_hits(page: List[Dict[str, Any]]) -> List[Hit]:
+    return [Hit.from_es(hit) for hit in page]
@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from config.settings import INDEX_CATALOG_INTERVAL
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class IndexCatalog:
+    """月度索引目录：记录实际存在的索引及每个索引中add_time的最小/最大值，用于查询前剪枝
+
+    目录未加载成功前不做剪枝。尚未结束的月份（包括目录刷新后才创建的索引）
+    仍可能写入新数据，只按最小时间剪枝，不按最大时间剪枝。
+    """
+
+    def __init__(self, es_client):
+        self.es_client = es_client
+        # 索引名 -> (最小add_time, 最大add_time)，空索引为(None, None)；None表示目录尚未加载
+        self.indices: Optional[Dict[str, Tuple[Optional[str], Optional[str]]]] = None
+        self.refreshed_at: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """启动定期刷新任务（需在事件循环中调用）"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"索引目录刷新失败: {str(e)}")
+            await asyncio.sleep(INDEX_CATALOG_INTERVAL)
+
+    async def refresh(self):
+        names = await self.es_client.list_indices()
+        bounds = await self.es_client.get_index_time_ranges(names) if names else {}
+        self.indices = {name: bounds.get(name, (None, None)) for name in names}
+        self.refreshed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        logger.info(f"索引目录已刷新 - 索引数: {len(self.indices)}")
+
+    def covers(self, index: str, start_time: str, end_time: str) -> bool:
+        """判断索引是否可能包含[start_time, end_time]内的数据"""
+        if self.indices is None:
+            return True
+        _, month_end = self.es_client.get_index_time_bounds(index)
+        is_open = month_end >= datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if index not in self.indices:
+            return is_open
+        min_time, max_time = self.indices[index]
+        if min_time is None:
+            return is_open
+        if end_time < min_time:
+            return False
+        return is_open or start_time <= max_time
+
+    def prune(self, indices: List[str], start_time: str, end_time: str) -> List[str]:
+        pruned = [index for index in indices if self.covers(index, start_time, end_time)]
+        if len(pruned) < len(indices):
+            logger.info(f"索引剪枝 - 跳过: {[index for index in indices if index not in pruned]}")
+        return pruned
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.indices is not None,
+            "refreshed_at": self.refreshed_at,
+            "indices": [
+                {"index": index, "min_time": min_time, "max_time": max_time}
+                for index, (min_time, max_time) in sorted((self.indices or {}).items())
+            ]
+        }
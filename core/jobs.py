@@ -0,0 +1,394 @@
+"""后台搜索任务
+
+用于同步接口无法在请求超时内完成的大规模提取。任务按月度分段，在每个索引上打开PIT，
+按add_time顺序用search_after逐页拉取并提取上下文，计数在内存中累积JOB_SPILL_PAGES页后
+写成一个压缩的落盘文件，同时记录检查点（已落盘的文件、当前分段、PIT id和search_after）。
+
+服务重启或ES出错后，任务丢弃检查点之后未落盘的部分，从检查点所在页继续；
+PIT已过期时，丢弃当前分段已落盘的文件，从该分段开头重新拉取。
+全部分段完成后合并落盘文件得到最终结果。
+
+每个任务一个目录：job.json（参数、状态、进度、检查点）、spill/（落盘的部分计数）、result.json.gz（最终结果）。
+"""
+import asyncio
+import gzip
+import os
+import shutil
+import uuid
+from contextlib import AsyncExitStack
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import aiohttp
+from config.settings import (
+    JOB_DIR, JOB_MAX_CONCURRENT, JOB_SPILL_PAGES, JOB_MAX_ATTEMPTS, JOB_RETRY_DELAY, COLLOCATION_TOP_N
+)
+from core import codec
+from core.admission import AdmissionController, AdmissionRejected
+from core.collocation import CollocationCounter
+from core.es_client import ESClient
+from core.worker_pool import ExtractionPool
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def _write_json(path: Path, data: Any, compress: bool = False):
+    """先写临时文件再替换，崩溃时不会留下半个文件"""
+    tmp = path.with_name(path.name + ".tmp")
+    content = codec.dumps(data)
+    tmp.write_bytes(gzip.compress(content, compresslevel=5) if compress else content)
+    os.replace(tmp, path)
+
+
+def _read_json(path: Path, compress: bool = False) -> Any:
+    content = path.read_bytes()
+    return codec.loads(gzip.decompress(content) if compress else content)
+
+
+class JobManager:
+    def __init__(self, es_client: ESClient, extraction_pool: ExtractionPool, directory: str = JOB_DIR,
+                 max_concurrent: int = JOB_MAX_CONCURRENT, admission: Optional[AdmissionController] = None):
+        self.es_client = es_client
+        self.extraction_pool = extraction_pool
+        self.admission = admission
+        self.directory = Path(directory)
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    def start(self):
+        """加载已有任务，未完成的从检查点继续（需在事件循环中调用）"""
+        if not self.directory.exists():
+            return
+        for path in sorted(self.directory.glob("*/job.json")):
+            try:
+                job = _read_json(path)
+            except (OSError, ValueError) as e:
+                logger.error(f"读取任务失败: {path}, {str(e)}")
+                continue
+            self.jobs[job["id"]] = job
+            if job["status"] in ACTIVE_STATUSES:
+                logger.info(f"恢复后台任务 - id: {job['id']}, 检查点: 分段 {job['checkpoint']['segment']}, "
+                            f"已拉取 {job['checkpoint']['fetched']}")
+                job["status"] = "queued"
+                self._launch(job)
+
+    async def close(self):
+        """停止运行中的任务；任务状态保持未完成，下次启动时从检查点继续"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _job_dir(self, job_id: str) -> Path:
+        return self.directory / job_id
+
+    def _save(self, job: Dict[str, Any]):
+        job["updated_at"] = datetime.now().strftime(TIME_FORMAT)
+        _write_json(self._job_dir(job["id"]) / "job.json", job)
+
+    def _launch(self, job: Dict[str, Any]):
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks[job["id"]] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job["id"], None))
+
+    def submit(self, keyword: str, start_time: str, end_time: str, context_chars: int, max_results: Optional[int],
+               page_size: int, ngram: int) -> Dict[str, Any]:
+        """创建任务并排队执行，max_results为空表示拉取全部命中文档"""
+        job_id = uuid.uuid4().hex[:16]
+        now = datetime.now().strftime(TIME_FORMAT)
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "params": {
+                "keyword": keyword,
+                "start_time": start_time,
+                "end_time": end_time,
+                "context_chars": context_chars,
+                "max_results": max_results,
+                "page_size": page_size,
+                "ngram": ngram
+            },
+            "segments": self.es_client.plan_segments(start_time, end_time),
+            # 已落盘的进度：segment之前的分段已完成，当前分段从search_after之后继续
+            "checkpoint": {
+                "segment": 0,
+                "pit_id": None,
+                "search_after": None,
+                "fetched": 0,
+                "segment_fetched": 0,
+                "spills": []
+            },
+            "progress": {"total": None, "fetched": 0, "pages": 0},
+            "attempts": 0,
+            "error": None,
+            "result": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        (self._job_dir(job_id) / "spill").mkdir(parents=True, exist_ok=True)
+        self._save(job)
+        self.jobs[job_id] = job
+        self._launch(job)
+        logger.info(f"创建后台任务 - id: {job_id}, 关键词: {keyword}, 时间范围: {start_time} 至 {end_time}, "
+                    f"分段数: {len(job['segments'])}")
+        return self.describe(job)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if job["status"] in ACTIVE_STATUSES:
+            job["status"] = "cancelled"
+            self._save(job)
+            task = self._tasks.get(job_id)
+            if task is not None:
+                task.cancel()
+            logger.info(f"取消后台任务 - id: {job_id}")
+        return self.describe(job)
+
+    def describe(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """任务的状态与进度（不含检查点细节）"""
+        progress = job["progress"]
+        total = progress["total"]
+        if total is not None and job["params"]["max_results"] is not None:
+            total = min(total, job["params"]["max_results"])
+        return {
+            "id": job["id"],
+            "status": job["status"],
+            "params": job["params"],
+            "progress": {
+                **progress,
+                "percent": round(100 * progress["fetched"] / total, 2) if total else None,
+                "segments_done": job["checkpoint"]["segment"],
+                "segments": len(job["segments"]),
+                "spills": len(job["checkpoint"]["spills"])
+            },
+            "attempts": job["attempts"],
+            "error": job["error"],
+            "result": job["result"],
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"]
+        }
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        return self.describe(job) if job is not None else None
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """全部任务，新的在前"""
+        jobs = sorted(self.jobs.values(), key=lambda job: job["created_at"], reverse=True)
+        return [self.describe(job) for job in jobs]
+
+    async def load_result(self, job_id: str) -> Optional[CollocationCounter]:
+        """已完成任务的合并计数"""
+        job = self.jobs.get(job_id)
+        if job is None or job["status"] != "completed":
+            return None
+        state = await asyncio.to_thread(_read_json, self._job_dir(job_id) / "result.json.gz", True)
+        return CollocationCounter.from_state(state)
+
+    async def build_result(self, job_id: str, top_n: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """按搜索接口的格式返回已完成任务的结果"""
+        collocations = await self.load_result(job_id)
+        if collocations is None:
+            return None
+        job = self.jobs[job_id]
+        return {
+            "total": job["progress"]["total"],
+            "parsed": collocations.total,
+            "max_results": job["progress"]["fetched"],
+            "approximate": collocations.approximate,
+            "words": collocations.top_words(top_n),
+            "neighbors": collocations.neighbors(top_n or COLLOCATION_TOP_N)
+        }
+
+    async def _run(self, job: Dict[str, Any]):
+        async with self._semaphore:
+            if job["status"] != "queued":
+                return
+            job["status"] = "running"
+            self._save(job)
+            while True:
+                try:
+                    await self._extract(job)
+                    await self._finish(job)
+                    return
+                except asyncio.CancelledError:
+                    if job["status"] == "cancelled":
+                        await asyncio.shield(self._close_pit(job))
+                        shutil.rmtree(self._job_dir(job["id"]) / "spill", ignore_errors=True)
+                    raise
+                except Exception as e:
+                    job["attempts"] += 1
+                    job["error"] = str(e) or type(e).__name__
+                    if job["attempts"] >= JOB_MAX_ATTEMPTS:
+                        job["status"] = "failed"
+                        self._save(job)
+                        await self._close_pit(job)
+                        logger.error(f"后台任务失败 - id: {job['id']}, 错误: {job['error']}")
+                        return
+                    self._save(job)
+                    delay = JOB_RETRY_DELAY * job["attempts"]
+                    logger.warning(f"后台任务出错，{delay:g}秒后从检查点继续 - id: {job['id']}, "
+                                   f"第{job['attempts']}次, 错误: {job['error']}")
+                    await asyncio.sleep(delay)
+
+    async def _close_pit(self, job: Dict[str, Any]):
+        pit_id = job["checkpoint"]["pit_id"]
+        if pit_id:
+            try:
+                await self.es_client.close_point_in_time(pit_id)
+            except Exception as e:
+                logger.warning(f"关闭PIT失败: {str(e)}")
+
+    def _discard_uncommitted(self, job: Dict[str, Any]):
+        """删除检查点之外的落盘文件（写完文件、记录检查点之前中断时留下的）"""
+        committed = set(job["checkpoint"]["spills"])
+        for path in (self._job_dir(job["id"]) / "spill").iterdir():
+            if path.name not in committed:
+                path.unlink(missing_ok=True)
+
+    def _restart_segment(self, job: Dict[str, Any]):
+        """PIT过期时放弃当前分段已落盘的部分，从分段开头重新拉取"""
+        checkpoint = job["checkpoint"]
+        prefix = f"{checkpoint['segment']:04d}-"
+        checkpoint["spills"] = [name for name in checkpoint["spills"] if not name.startswith(prefix)]
+        checkpoint["fetched"] -= checkpoint["segment_fetched"]
+        checkpoint["segment_fetched"] = 0
+        checkpoint["pit_id"] = None
+        checkpoint["search_after"] = None
+        job["progress"]["fetched"] = checkpoint["fetched"]
+        self._save(job)
+        self._discard_uncommitted(job)
+
+    async def _commit(self, job: Dict[str, Any], collocations: CollocationCounter, pit_id: Optional[str],
+                      search_after: Optional[List[Any]], segment_fetched: int, segment_done: bool):
+        """把内存中的计数落盘，再推进检查点到已落盘的位置"""
+        checkpoint = job["checkpoint"]
+        if collocations.total:
+            name = f"{checkpoint['segment']:04d}-{len(checkpoint['spills']):05d}.json.gz"
+            await asyncio.to_thread(_write_json, self._job_dir(job["id"]) / "spill" / name,
+                                    collocations.to_state(), True)
+            checkpoint["spills"].append(name)
+        checkpoint["fetched"] = job["progress"]["fetched"]
+        # 有进展后重新计算连续失败次数
+        job["attempts"] = 0
+        if segment_done:
+            checkpoint.update(segment=checkpoint["segment"] + 1, pit_id=None, search_after=None, segment_fetched=0)
+        else:
+            checkpoint.update(pit_id=pit_id, search_after=search_after, segment_fetched=segment_fetched)
+        self._save(job)
+
+    async def _admit(self, stack: AsyncExitStack, documents: int):
+        """占用准入额度拉取一批（JOB_SPILL_PAGES页），与同步搜索共用额度；被拒绝时等待后重试，不计入失败次数"""
+        if self.admission is None:
+            return
+        while True:
+            try:
+                await stack.enter_async_context(self.admission.admit(1, documents))
+                return
+            except AdmissionRejected as e:
+                logger.info(f"后台任务等待准入额度，{e.retry_after}秒后重试")
+                await asyncio.sleep(e.retry_after)
+
+    async def _extract(self, job: Dict[str, Any]):
+        params = job["params"]
+        keyword, context_chars, ngram = params["keyword"], params["context_chars"], params["ngram"]
+        max_results = params["max_results"]
+        checkpoint, progress = job["checkpoint"], job["progress"]
+
+        # 从检查点继续：检查点之后处理过的页没有落盘，重新拉取
+        self._discard_uncommitted(job)
+        progress["fetched"] = checkpoint["fetched"]
+        if progress["total"] is None:
+            progress["total"] = await self.es_client.count_hits(keyword, params["start_time"], params["end_time"])
+            self._save(job)
+
+        while checkpoint["segment"] < len(job["segments"]):
+            if max_results is not None and progress["fetched"] >= max_results:
+                break
+            index, segment_start, segment_end = job["segments"][checkpoint["segment"]]
+            resumed = checkpoint["pit_id"] is not None
+            if not resumed:
+                checkpoint["pit_id"] = await self.es_client.open_point_in_time(index)
+                self._save(job)
+
+            # 检查点只在落盘时推进，以下变量记录未落盘的进度
+            pit_id, search_after = checkpoint["pit_id"], checkpoint["search_after"]
+            segment_fetched = checkpoint["segment_fetched"]
+            collocations = CollocationCounter(keyword, ngram)
+            pages = 0
+            restarted = False
+            # 每批页在落盘后归还准入额度，重新排队，排队中的同步搜索可以先执行
+            async with AsyncExitStack() as admitted:
+                while True:
+                    if pages == 0:
+                        await self._admit(admitted, params["page_size"] * JOB_SPILL_PAGES)
+                    try:
+                        response = await self.es_client.search_after_page(
+                            pit_id, keyword, segment_start, segment_end, params["page_size"], search_after)
+                    except aiohttp.ClientResponseError as e:
+                        if e.status != 404 or not resumed:
+                            raise
+                        logger.warning(f"PIT已失效，从分段开头重新拉取 - id: {job['id']}, 索引: {index}")
+                        self._restart_segment(job)
+                        restarted = True
+                        break
+
+                    hits = response["hits"]["hits"]
+                    if max_results is not None:
+                        hits = hits[:max_results - progress["fetched"]]
+                    if not hits:
+                        break
+
+                    partial = await self.extraction_pool.count(hits, keyword, context_chars, ngram)
+                    collocations.merge(partial)
+                    progress["fetched"] += len(hits)
+                    progress["pages"] += 1
+                    segment_fetched += len(hits)
+                    pit_id = response.get("pit_id", pit_id)
+                    search_after = hits[-1]["sort"]
+                    if max_results is not None and progress["fetched"] >= max_results:
+                        break
+
+                    pages += 1
+                    if pages >= JOB_SPILL_PAGES:
+                        await self._commit(job, collocations, pit_id, search_after, segment_fetched, segment_done=False)
+                        await admitted.aclose()
+                        collocations = CollocationCounter(keyword, ngram)
+                        pages = 0
+                        resumed = True
+
+            if not restarted:
+                checkpoint["pit_id"] = pit_id
+                await self._close_pit(job)
+                await self._commit(job, collocations, None, None, 0, segment_done=True)
+
+    async def _finish(self, job: Dict[str, Any]):
+        """合并全部落盘文件得到最终结果"""
+        params = job["params"]
+        job_dir = self._job_dir(job["id"])
+
+        def merge() -> CollocationCounter:
+            collocations = CollocationCounter(params["keyword"], params["ngram"])
+            for name in job["checkpoint"]["spills"]:
+                collocations.merge(CollocationCounter.from_state(_read_json(job_dir / "spill" / name, compress=True)))
+            _write_json(job_dir / "result.json.gz", collocations.to_state(), True)
+            return collocations
+
+        collocations = await asyncio.to_thread(merge)
+        job["status"] = "completed"
+        job["error"] = None
+        job["result"] = {
+            "parsed": collocations.total,
+            "approximate": collocations.approximate,
+            "completed_at": datetime.now().strftime(TIME_FORMAT)
+        }
+        self._save(job)
+        shutil.rmtree(job_dir / "spill", ignore_errors=True)
+        logger.info(f"后台任务完成 - id: {job['id']}, 拉取文档: {job['progress']['fetched']}, 上下文: {collocations.total}")
@@ -0,0 +1,77 @@
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+try:
+    # 可选依赖：安装pyahocorasick后使用其C实现，否则使用下方纯Python实现
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+class AhoCorasick:
+    """Aho-Corasick多模式匹配器，一次扫描找出文本中所有关键词的全部出现位置"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        # 每个状态的转移表、失败指针、以及在该状态结束的模式下标
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        self._automaton = None
+
+        for pattern in patterns:
+            if pattern and pattern not in self.patterns:
+                self._add(pattern)
+
+        if ahocorasick is not None and self.patterns:
+            self._automaton = ahocorasick.Automaton()
+            for pattern in self.patterns:
+                self._automaton.add_word(pattern, pattern)
+            self._automaton.make_automaton()
+        else:
+            self._build()
+
+    def _add(self, pattern: str):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(len(self.patterns))
+        self.patterns.append(pattern)
+
+    def _build(self):
+        """按BFS顺序计算失败指针，并合并后缀状态的输出（根的子状态失败指针为根）"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, str]]:
+        """产出(起始位置, 关键词)，包含所有出现（含相互重叠的）"""
+        if self._automaton is not None:
+            for end, pattern in self._automaton.iter(text):
+                yield end - len(pattern) + 1, pattern
+            return
+
+        goto, fail, output, patterns = self._goto, self._fail, self._output, self.patterns
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for pattern_index in output[state]:
+                pattern = patterns[pattern_index]
+                yield position - len(pattern) + 1, pattern
@@ -0,0 +1,124 @@
+"""分阶段耗时与计数指标
+
+全局指标以Prometheus文本格式导出（/metrics）；同时把每个阶段的耗时累加到当前请求的计时字典中，
+由中间件写入Server-Timing响应头。请求计时字典通过contextvars传递，请求内创建的任务共享同一个字典。
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 指标名 -> (类型, 说明)
+METRIC_HELP = {
+    "stage_seconds": ("histogram", "各处理阶段耗时（秒），并发执行的阶段分别计时"),
+    "http_request_seconds": ("histogram", "API请求耗时（秒）"),
+    "http_requests_total": ("counter", "API请求数"),
+    "es_requests_total": ("counter", "ES请求数（含重试）"),
+    "es_retries_total": ("counter", "ES请求失败后的重试次数"),
+    "es_response_bytes_total": ("counter", "ES响应字节数"),
+    "es_pages_total": ("counter", "拉取的非空结果页数"),
+    "documents_processed_total": ("counter", "处理的文档数"),
+    "matches_total": ("counter", "提取出的关键词上下文数"),
+    "admission_total": ("counter", "搜索准入结果（admitted/queued/rejected/bypassed）"),
+}
+METRIC_PREFIX = "es_fuzzy_"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """线程安全的计数器与直方图"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        # 名称 -> 标签 -> [各桶计数, 总和, 总数]
+        self._histograms: Dict[str, Dict[LabelKey, list]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = [[0] * len(BUCKETS), 0.0, 0]
+            position = bisect_left(BUCKETS, value)
+            if position < len(BUCKETS):
+                histogram[0][position] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def render(self) -> str:
+        """导出为Prometheus文本格式"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted({**self._counters, **self._histograms}.items()):
+                metric_type, help_text = METRIC_HELP.get(name, ("untyped", name))
+                full_name = METRIC_PREFIX + name
+                lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {metric_type}")
+                for labels, value in sorted(series.items()):
+                    if name in self._histograms:
+                        buckets, total, count = value
+                        cumulative = 0
+                        for bound, bucket_count in zip(BUCKETS, buckets):
+                            cumulative += bucket_count
+                            lines.append(f"{full_name}_bucket{_labels(labels, le=str(bound))} {cumulative}")
+                        lines.append(f"{full_name}_bucket{_labels(labels, le='+Inf')} {count}")
+                        lines.append(f"{full_name}_sum{_labels(labels)} {total}")
+                        lines.append(f"{full_name}_count{_labels(labels)} {count}")
+                    else:
+                        lines.append(f"{full_name}{_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: LabelKey, **extra: str) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+metrics = Metrics()
+
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def start_request_timings() -> Dict[str, float]:
+    """为当前请求创建计时字典，此后本请求内记录的阶段耗时都会累加进来"""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def record_stage(stage: str, seconds: float):
+    metrics.observe("stage_seconds", seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    """按Server-Timing格式输出各阶段累计耗时（毫秒）"""
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
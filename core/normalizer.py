@@ -0,0 +1,164 @@
+"""文本规范化
+
+提取上下文时先在原文中定位关键词，只清理截取出的窗口，单篇文档的开销与窗口大小而不是正文长度相关；
+清理会删掉匹配结束前的字符时（关键词可能被emoji隔开），退回清理整篇后再定位，结果与清理整篇后截取一致。
+可选的折叠（全角转半角、繁体转简体）都是逐字一对一的映射，折叠前后文本长度不变：
+在原文中按字符类定位折叠后的关键词，只折叠截取出的窗口，不折叠整篇正文。
+"""
+import re
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Pattern, Tuple
+from config.settings import TEXT_FOLD_WIDTH, TEXT_FOLD_TRADITIONAL
+from utils.logger import get_logger
+
+try:
+    # 可选依赖：安装opencc后支持繁体转简体
+    import opencc
+except ImportError:
+    opencc = None
+
+logger = get_logger(__name__)
+
+# 无法编码的字符：emoji等基本多文种平面以外的字符，以及孤立的代理对字符
+_UNSUPPORTED = re.compile(r'[\U00010000-\U0010ffff\ud800-\udfff]')
+
+# 全角ASCII（！到～）及全角空格
+_WIDTH_TABLE = {code: code - 0xFEE0 for code in range(0xFF01, 0xFF5F)}
+_WIDTH_TABLE[0x3000] = 0x20
+
+# 逐字转换的CJK范围：扩展A区和基本区
+_CJK_RANGES = [(0x3400, 0x4DC0), (0x4E00, 0xA000)]
+
+# 每个进程缓存的关键词正则数上限，超出后清空重建
+_MAX_CACHED_PATTERNS = 256
+
+
+def clean_text(text: str) -> str:
+    """移除无法编码的字符"""
+    return _UNSUPPORTED.sub('', text)
+
+
+def needs_full_clean(text: str, end: int) -> bool:
+    """text[:end]中是否有清理时会删掉的字符；有的话清理整篇后关键词可能出现在更靠前的位置"""
+    return _UNSUPPORTED.search(text, 0, end) is not None
+
+
+def _traditional_table() -> Dict[int, int]:
+    """繁体 -> 简体的逐字映射，只保留一对一转换的字"""
+    converter = opencc.OpenCC('t2s')
+    chars = [chr(code) for start, end in _CJK_RANGES for code in range(start, end)]
+    converted = converter.convert("\n".join(chars)).split("\n")
+    return {ord(char): ord(simplified) for char, simplified in zip(chars, converted)
+            if len(simplified) == 1 and simplified != char}
+
+
+class Folding:
+    """一张逐字折叠转换表，以及按折叠后的字符反查原文字符类的正则"""
+
+    def __init__(self, table: Dict[int, int]):
+        self.table = table
+        variants: Dict[str, List[str]] = {}
+        for code, folded in table.items():
+            # 折叠目标本身还会被折叠成别的字时，原文中的它不算匹配
+            variants.setdefault(chr(folded), [] if folded in table else [chr(folded)]).append(chr(code))
+        self._classes = {char: "[" + "".join(re.escape(variant) for variant in chars) + "]"
+                         for char, chars in variants.items()}
+        self._patterns: Dict[str, Pattern] = {}
+        self._starts: Dict[Tuple[str, ...], Tuple[Pattern, Dict[str, List[str]], int]] = {}
+
+    def fold(self, text: str) -> str:
+        return text.translate(self.table)
+
+    def _class(self, char: str) -> str:
+        """原文中折叠后等于char的字符；char本身会被折叠成别的字时（关键词未折叠）匹配不到任何字符"""
+        if char in self._classes:
+            return self._classes[char]
+        return "(?!)" if ord(char) in self.table else re.escape(char)
+
+    def pattern(self, keyword: str) -> Pattern:
+        """在原文中匹配折叠后等于keyword（应已折叠）的片段的正则"""
+        pattern = self._patterns.get(keyword)
+        if pattern is None:
+            if len(self._patterns) >= _MAX_CACHED_PATTERNS:
+                self._patterns.clear()
+            pattern = self._patterns[keyword] = re.compile("".join(self._class(char) for char in keyword))
+        return pattern
+
+    def finditer(self, text: str, patterns: Tuple[str, ...]) -> Iterator[Tuple[int, str]]:
+        """产出折叠后的text中各模式（应已折叠）每一处出现的(起始位置, 模式)，包含相互重叠的
+
+        先用一个正则在原文中找出折叠后可能是某个模式首字的位置，只折叠这些位置开始的一小段来比对。
+        """
+        starts = self._starts.get(patterns)
+        if starts is None:
+            if len(self._starts) >= _MAX_CACHED_PATTERNS:
+                self._starts.clear()
+            by_first: Dict[str, List[str]] = {}
+            for pattern in patterns:
+                if pattern:
+                    by_first.setdefault(pattern[0], []).append(pattern)
+            first = re.compile("|".join(self._class(char) for char in by_first)) if by_first else None
+            starts = self._starts[patterns] = (first, by_first, max(map(len, patterns), default=0))
+        first, by_first, longest = starts
+        if first is None:
+            return
+        for match in first.finditer(text):
+            position = match.start()
+            window = self.fold(text[position:position + longest])
+            for pattern in by_first.get(window[0], ()):
+                if window.startswith(pattern):
+                    yield position, pattern
+
+
+@lru_cache(maxsize=4)
+def fold_table(width: bool = TEXT_FOLD_WIDTH, traditional: bool = TEXT_FOLD_TRADITIONAL) -> Optional[Folding]:
+    """折叠用的转换表，不需要折叠时返回None；每个进程只构建一次"""
+    table: Dict[int, int] = {}
+    if width:
+        table.update(_WIDTH_TABLE)
+    if traditional:
+        if opencc is None:
+            logger.warning("未安装opencc，跳过繁体转简体折叠")
+        else:
+            table.update(_traditional_table())
+    return Folding(table) if table else None
+
+
+def fold(text: str, table: Optional[Folding] = None) -> str:
+    return table.fold(text) if table else text
+
+
+def find(text: str, keyword: str, table: Optional[Folding] = None) -> int:
+    """折叠后的text中keyword（应已折叠）第一次出现的位置，不折叠整篇；未出现时返回-1"""
+    if table is None:
+        return text.find(keyword)
+    match = table.pattern(keyword).search(text)
+    return match.start() if match else -1
+
+
+def _clean_before(text: str, end: int, chars: int) -> str:
+    """text[:end]末尾清理后的chars个字符；清理删掉字符时向前多取，保证长度与清理整篇后截取一致"""
+    start = max(0, end - chars)
+    cleaned = clean_text(text[start:end])
+    while len(cleaned) < chars and start > 0:
+        start = max(0, start - (chars - len(cleaned)))
+        cleaned = clean_text(text[start:end])
+    return cleaned[len(cleaned) - chars:] if len(cleaned) > chars else cleaned
+
+
+def _clean_after(text: str, start: int, chars: int) -> str:
+    end = min(len(text), start + chars)
+    cleaned = clean_text(text[start:end])
+    while len(cleaned) < chars and end < len(text):
+        end = min(len(text), end + chars - len(cleaned))
+        cleaned = clean_text(text[start:end])
+    return cleaned[:chars]
+
+
+def context_window(text: str, index: int, length: int, context_chars: int,
+                   table: Optional[Folding] = None) -> Tuple[str, int]:
+    """截取text[index:index+length]处匹配前后各context_chars个字符，清理并折叠，返回(上下文, 匹配在上下文中的位置)"""
+    before = _clean_before(text, index, context_chars)
+    match = clean_text(text[index:index + length])
+    after = _clean_after(text, index + length, context_chars)
+    return fold(before + match + after, table), len(before)
@@ -0,0 +1,131 @@
+"""按请求开启的采样性能剖析
+
+剖析期间后台线程每隔PROFILING_INTERVAL_MS采样一次事件循环线程的调用栈；同一请求提交给提取进程池的分块
+在工作进程内同样采样，调用栈以"worker"为根合并进来。结果以折叠栈格式保存在PROFILE_DIR下
+（每行"帧;帧;帧 次数"，可直接用flamegraph.pl、speedscope等工具生成火焰图），另存一份JSON元数据。
+
+事件循环线程上同时处理的其他请求也会被采到，同一时间只剖析一个请求。
+"""
+import hmac
+import json
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+from config.settings import (
+    PROFILING_ENABLED, PROFILING_TOKEN, PROFILING_INTERVAL_MS, PROFILING_KEEP, PROFILE_DIR
+)
+from core.sampler import SamplingProfiler
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+PROFILE_ID_PATTERN = re.compile(r"^\d{8}-\d{6}-[0-9a-f]{6}$")
+
+# 当前请求正在收集的工作进程调用栈，提取进程池据此决定是否在工作进程内采样
+_worker_stacks: ContextVar[Optional[Counter]] = ContextVar("worker_stacks", default=None)
+
+
+def current_worker_stacks() -> Optional[Counter]:
+    """当前请求处于剖析中时返回工作进程调用栈的计数表，否则返回None"""
+    return _worker_stacks.get()
+
+
+class Profiler:
+    def __init__(self, directory: str = PROFILE_DIR, interval: float = PROFILING_INTERVAL_MS / 1000,
+                 keep: int = PROFILING_KEEP, enabled: bool = PROFILING_ENABLED, token: str = PROFILING_TOKEN):
+        self.directory = Path(directory)
+        self.interval = interval
+        self.keep = keep
+        self.enabled = enabled
+        self.token = token
+        self._busy = False
+
+    def authorize(self, flag: Optional[str]) -> bool:
+        """检查请求携带的X-Profile/profile值是否允许使用剖析功能：配置了口令时须等于口令，否则须为1或true"""
+        if not self.enabled or not flag:
+            return False
+        if self.token:
+            return hmac.compare_digest(flag.encode(), self.token.encode())
+        return flag.lower() in ("1", "true")
+
+    @staticmethod
+    def requested(flag: Optional[str]) -> bool:
+        return bool(flag) and flag.lower() not in ("0", "false", "no")
+
+    @asynccontextmanager
+    async def capture(self, label: str, details: Dict[str, Any]) -> AsyncIterator[Optional[str]]:
+        """剖析上下文内执行的代码，产出剖析id；已有剖析在进行时不剖析，产出None"""
+        if self._busy:
+            logger.warning(f"已有剖析在进行，跳过本次剖析: {label}")
+            yield None
+            return
+
+        self._busy = True
+        profile_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        worker_stacks: Counter = Counter()
+        token = _worker_stacks.set(worker_stacks)
+        sampler = SamplingProfiler(threading.get_ident(), self.interval)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            yield profile_id
+        finally:
+            stacks = sampler.stop()
+            elapsed = time.perf_counter() - started
+            _worker_stacks.reset(token)
+            self._busy = False
+            for stack, count in worker_stacks.items():
+                stacks[f"worker;{stack}"] += count
+            try:
+                self._save(profile_id, label, details, stacks, elapsed)
+            except OSError as e:
+                logger.error(f"保存剖析结果失败: {str(e)}")
+
+    def _save(self, profile_id: str, label: str, details: Dict[str, Any], stacks: Counter, elapsed: float):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        folded = "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        (self.directory / f"{profile_id}.folded").write_text(folded, encoding="utf-8")
+        meta = {
+            "id": profile_id,
+            "label": label,
+            "details": details,
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "duration_ms": round(elapsed * 1000, 1),
+            "interval_ms": self.interval * 1000,
+            "samples": sum(count for stack, count in stacks.items() if not stack.startswith("worker;")),
+            "worker_samples": sum(count for stack, count in stacks.items() if stack.startswith("worker;"))
+        }
+        (self.directory / f"{profile_id}.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        logger.info(f"剖析结果已保存 - id: {profile_id}, 耗时: {meta['duration_ms']}ms, 采样: {meta['samples']}")
+        self._prune()
+
+    def _prune(self):
+        for meta_path in sorted(self.directory.glob("*.json"), reverse=True)[self.keep:]:
+            meta_path.unlink(missing_ok=True)
+            meta_path.with_suffix(".folded").unlink(missing_ok=True)
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """最近的剖析结果元数据，新的在前"""
+        profiles = []
+        if not self.directory.exists():
+            return profiles
+        for meta_path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                profiles.append(json.loads(meta_path.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        return profiles
+
+    def get_path(self, profile_id: str) -> Optional[Path]:
+        """剖析结果文件路径，id不合法或文件不存在时返回None"""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = self.directory / f"{profile_id}.folded"
+        return path if path.exists() else None
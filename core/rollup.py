@@ -0,0 +1,257 @@
+"""作者/媒体的日汇总
+
+已结束的日期按天把每个作者、每个媒体的文档数汇总到本地SQLite，由后台任务增量回填，
+最近几天每次回填都重新汇总，补上延迟入库的文档。
+统计接口对已汇总的整天直接查本地库，只把未汇总的日期和不足一天的首尾部分交给ES，
+两部分都是精确计数，合并后的前N名也是精确的。日汇总覆盖不到或未汇总部分过大时，
+逐个取值的composite聚合比一次terms聚合慢得多，整个范围改用terms聚合取前N名。
+取值总数与terms聚合的sum_other_doc_count + 桶数含义相同，各路径的返回一致。
+"""
+import asyncio
+import heapq
+import os
+import sqlite3
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from config.settings import (
+    ROLLUP_DB_PATH, ROLLUP_BACKFILL_DAYS, ROLLUP_INTERVAL, ROLLUP_REFRESH_DAYS, ROLLUP_MAX_REMAINDER_DAYS, STATS_FIELDS
+)
+from core.es_client import ESClient
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DAY_FORMAT = "%Y-%m-%d"
+
+
+def terms_total(docs: int, top: List[Tuple[str, int]]) -> int:
+    """按terms聚合的口径计算取值总数：前N项以外的文档数（sum_other_doc_count）加前N项的个数"""
+    return docs - sum(count for _, count in top) + len(top)
+
+
+class RollupStore:
+    """日汇总的SQLite存储；某天的计数与完成标记在同一事务中写入，因此存在计数的日期都是完整的"""
+
+    def __init__(self, path: str = ROLLUP_DB_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS daily_counts ("
+                "dimension TEXT NOT NULL, day TEXT NOT NULL, key TEXT NOT NULL, count INTEGER NOT NULL, "
+                "PRIMARY KEY (dimension, day, key))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS filled_days ("
+                "dimension TEXT NOT NULL, day TEXT NOT NULL, docs INTEGER NOT NULL, "
+                "PRIMARY KEY (dimension, day))"
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def filled_days(self, dimension: str, start_day: str, end_day: str) -> Set[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT day FROM filled_days WHERE dimension = ? AND day BETWEEN ? AND ?",
+                (dimension, start_day, end_day)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def write_day(self, dimension: str, day: str, counts: Dict[str, int]):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM daily_counts WHERE dimension = ? AND day = ?", (dimension, day))
+            self._conn.executemany(
+                "INSERT INTO daily_counts (dimension, day, key, count) VALUES (?, ?, ?, ?)",
+                [(dimension, day, key, count) for key, count in counts.items()]
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO filled_days (dimension, day, docs) VALUES (?, ?, ?)",
+                (dimension, day, sum(counts.values()))
+            )
+
+    def sum_counts(self, dimension: str, start_day: str, end_day: str) -> Counter:
+        """日期范围内各取值的合计数"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, SUM(count) FROM daily_counts WHERE dimension = ? AND day BETWEEN ? AND ? GROUP BY key",
+                (dimension, start_day, end_day)
+            ).fetchall()
+        return Counter(dict(rows))
+
+    def top_counts(self, dimension: str, start_day: str, end_day: str,
+                   top_n: int) -> Tuple[int, List[Tuple[str, int]]]:
+        """日期范围内的取值总数（口径同terms_total）和计数最高的top_n项，排序与聚合都在SQLite中完成"""
+        with self._lock:
+            docs = self._conn.execute(
+                "SELECT COALESCE(SUM(count), 0) FROM daily_counts WHERE dimension = ? AND day BETWEEN ? AND ?",
+                (dimension, start_day, end_day)
+            ).fetchone()[0]
+            rows = self._conn.execute(
+                "SELECT key, SUM(count) AS total FROM daily_counts WHERE dimension = ? AND day BETWEEN ? AND ? "
+                "GROUP BY key ORDER BY total DESC, key LIMIT ?",
+                (dimension, start_day, end_day, top_n)
+            ).fetchall()
+        return terms_total(docs, rows), rows
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT dimension, COUNT(*), MIN(day), MAX(day) FROM filled_days GROUP BY dimension"
+            ).fetchall()
+        return {
+            dimension: {"days": days, "first_day": first_day, "last_day": last_day}
+            for dimension, days, first_day, last_day in rows
+        }
+
+
+def split_time_range(start_time: str, end_time: str,
+                     filled: Set[str]) -> Tuple[Optional[Tuple[str, str]], List[Tuple[str, str]]]:
+    """把时间范围拆成可由日汇总回答的整天范围，以及需要查询ES的剩余时间段
+
+    返回(整天的首尾日期或None, 剩余时间段列表)。整天范围内未汇总的日期也计入剩余时间段。
+    """
+    start = datetime.strptime(start_time, TIME_FORMAT)
+    end = datetime.strptime(end_time, TIME_FORMAT)
+    first_day = start.date() if start.time() == datetime.min.time() else start.date() + timedelta(days=1)
+    last_day = end.date() if end.strftime("%H:%M:%S") == "23:59:59" else end.date() - timedelta(days=1)
+    if first_day > last_day:
+        return None, [(start_time, end_time)]
+
+    # 连续的未汇总时间段合并为一个范围
+    remainder: List[List[datetime]] = []
+
+    def add(range_start: datetime, range_end: datetime):
+        if remainder and remainder[-1][1] + timedelta(seconds=1) >= range_start:
+            remainder[-1][1] = range_end
+        else:
+            remainder.append([range_start, range_end])
+
+    day_start = datetime.combine(first_day, datetime.min.time())
+    if start < day_start:
+        add(start, day_start - timedelta(seconds=1))
+    day = first_day
+    while day <= last_day:
+        if day.strftime(DAY_FORMAT) not in filled:
+            day_start = datetime.combine(day, datetime.min.time())
+            add(day_start, day_start + timedelta(days=1, seconds=-1))
+        day += timedelta(days=1)
+    day_end = datetime.combine(last_day, datetime.min.time()) + timedelta(days=1, seconds=-1)
+    if end > day_end:
+        add(day_end + timedelta(seconds=1), end)
+
+    return (
+        (first_day.strftime(DAY_FORMAT), last_day.strftime(DAY_FORMAT)),
+        [(range_start.strftime(TIME_FORMAT), range_end.strftime(TIME_FORMAT)) for range_start, range_end in remainder]
+    )
+
+
+class RollupService:
+    """维护日汇总并基于它回答作者/媒体统计"""
+
+    def __init__(self, es_client: ESClient, store: Optional[RollupStore] = None):
+        self.es_client = es_client
+        self.store = store or RollupStore()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """启动后台回填任务（需在事件循环中调用）"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.store.close()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.fill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"日汇总回填失败: {str(e)}")
+            await asyncio.sleep(ROLLUP_INTERVAL)
+
+    async def fill(self, days: int = ROLLUP_BACKFILL_DAYS, last_day: Optional[date] = None,
+                   refresh_days: int = ROLLUP_REFRESH_DAYS):
+        """从last_day（默认昨天）起往前回填days个已结束的日期，已汇总的日期跳过
+
+        最近refresh_days个日期即使已汇总也重新汇总：文档可能在当天结束后才入库，只汇总一次会漏计。
+        """
+        last_day = min(last_day or date.today(), date.today() - timedelta(days=1))
+        first_day = last_day - timedelta(days=days - 1)
+        refresh_from = last_day - timedelta(days=refresh_days - 1)
+        filled_count = 0
+        for dimension, field in STATS_FIELDS.items():
+            filled = await asyncio.to_thread(self.store.filled_days, dimension,
+                                             first_day.strftime(DAY_FORMAT), last_day.strftime(DAY_FORMAT))
+            day = last_day
+            while day >= first_day:
+                day_str = day.strftime(DAY_FORMAT)
+                refresh = day >= refresh_from
+                day -= timedelta(days=1)
+                if day_str in filled and not refresh:
+                    continue
+                try:
+                    counts = await self.es_client.get_term_counts(
+                        field, [(f"{day_str} 00:00:00", f"{day_str} 23:59:59")])
+                except Exception as e:
+                    logger.warning(f"日汇总跳过 - 维度: {dimension}, 日期: {day_str}, 错误: {str(e)}")
+                    continue
+                await asyncio.to_thread(self.store.write_day, dimension, day_str, counts)
+                filled_count += 1
+        if filled_count:
+            logger.info(f"日汇总回填完成 - 新增或重新汇总: {filled_count} 天·维度")
+
+    async def get_top(self, dimension: str, start_time: str, end_time: str,
+                      top_n: int) -> Tuple[int, List[Tuple[str, int]], Dict[str, Any]]:
+        """返回(取值总数, 前top_n项, 数据来源说明)
+
+        数据来源中exact表示前N名是否为精确值：用日汇总回答时精确，改用terms聚合时与未启用日汇总时相同。
+        """
+        filled = await asyncio.to_thread(self.store.filled_days, dimension, start_time[:10], end_time[:10])
+        days, remainder = split_time_range(start_time, end_time, filled)
+        rollup_days = sum(1 for day in filled if days[0] <= day <= days[1]) if days else 0
+        remainder_days = sum(
+            (datetime.strptime(end, TIME_FORMAT) - datetime.strptime(start, TIME_FORMAT)).total_seconds() + 1
+            for start, end in remainder
+        ) / 86400
+
+        if not rollup_days or remainder_days > ROLLUP_MAX_REMAINDER_DAYS:
+            logger.info(f"日汇总统计 - 维度: {dimension}, 汇总天数: {rollup_days}, "
+                        f"未汇总部分: {remainder_days:.1f} 天, 改用terms聚合")
+            result = await self.es_client.get_aggregations(start_time, end_time, [dimension], top_n)
+            top = [(entry[dimension], entry["count"]) for entry in result[dimension]["top"]]
+            source = {"rollup_days": 0, "es_ranges": [(start_time, end_time)], "exact": False}
+            return result[dimension]["total"], top, source
+
+        source = {"rollup_days": rollup_days, "es_ranges": remainder, "exact": True}
+        logger.info(f"日汇总统计 - 维度: {dimension}, 汇总天数: {source['rollup_days']}, ES查询时间段: {remainder}")
+
+        if not remainder:
+            total, top = await asyncio.to_thread(self.store.top_counts, dimension, days[0], days[1], top_n)
+            return total, top, source
+
+        counts = await self.es_client.get_term_counts(STATS_FIELDS[dimension], remainder)
+        merged = Counter(counts)
+        merged.update(await asyncio.to_thread(self.store.sum_counts, dimension, days[0], days[1]))
+        top = heapq.nsmallest(top_n, merged.items(), key=lambda item: (-item[1], item[0]))
+        return terms_total(sum(merged.values()), top), top, source
+
+    def stats(self) -> Dict[str, Any]:
+        return self.store.stats()
@@ -0,0 +1,67 @@
+"""调用栈采样器
+
+后台线程每隔interval秒读取一次目标线程的当前调用栈，按折叠栈格式（"外层帧;...;内层帧"）计数。
+本模块不依赖日志等服务组件，可以在提取进程池的工作进程中使用。
+"""
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Any, Callable, Optional, Tuple
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    path = Path(code.co_filename)
+    location = f"{path.parent.name}/{path.name}" if path.parent.name else path.name
+    name = f"{code.co_name} ({location}:{code.co_firstlineno})"
+    # 分号是折叠栈的分隔符
+    return name.replace(";", ":")
+
+
+def fold_stack(frame: Optional[FrameType]) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """在后台线程中定期采样指定线程的调用栈"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[fold_stack(frame)] += 1
+
+    def stop(self) -> Counter:
+        """停止采样，返回折叠栈 -> 采样次数"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+
+def run_profiled(interval: float, func: Callable, *args) -> Tuple[Any, Counter]:
+    """采样执行func(*args)，返回(func的返回值, 折叠栈计数)；用于在工作进程中剖析提取分块"""
+    profiler = SamplingProfiler(threading.get_ident(), interval)
+    profiler.start()
+    try:
+        result = func(*args)
+    finally:
+        stacks = profiler.stop()
+    return result, stacks
@@ -0,0 +1,63 @@
+"""抽样结果的总体估算
+
+样本是从total篇命中文档中不放回随机抽取的size篇。样本中出现count次的上下文或邻接片段，
+总体出现次数估算为count * total / size。count不超过size时按"每篇文档最多贡献一次"近似为比例估计，
+用Wilson区间并做有限总体校正后换算为次数；count超过size时按泊松计数做正态近似。
+一篇文档的多个字段各产出一条上下文，按平均每篇的上下文数作为设计效应放宽区间。
+样本量等于总体时区间退化为样本计数本身。
+"""
+import math
+from statistics import NormalDist
+from typing import Any, Dict, List, Tuple
+from config.settings import SAMPLE_CONFIDENCE
+
+
+class SampleEstimator:
+    def __init__(self, size: int, total: int, design_effect: float = 1.0, confidence: float = SAMPLE_CONFIDENCE):
+        self.size = size
+        self.total = max(total, size)
+        self.confidence = confidence
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        # 有限总体校正及设计效应（同一文档的多个字段各产出一条上下文，彼此相关）后的有效样本量
+        fpc = (self.total - size) / (self.total - 1) if self.total > 1 else 0.0
+        self.effective_size = size / (fpc * max(design_effect, 1.0)) if fpc > 0 else math.inf
+
+    @property
+    def scale(self) -> float:
+        return self.total / self.size if self.size else 0.0
+
+    def estimate(self, count: int) -> Tuple[int, int, int]:
+        """返回(估算次数, 置信区间下限, 置信区间上限)"""
+        point = round(count * self.scale)
+        if not self.size or math.isinf(self.effective_size):
+            return point, point, point
+
+        n = self.effective_size
+        if count > self.size:
+            # 一篇文档贡献多次，无法看作比例，按泊松计数用正态近似
+            half = self.z * math.sqrt(count * self.size / n) * self.scale
+            return point, max(0, math.floor(point - half)), math.ceil(point + half)
+
+        p = count / self.size
+        z2 = self.z * self.z
+        center = (p + z2 / (2 * n)) / (1 + z2 / n)
+        half = self.z * math.sqrt(p * (1 - p) / n + z2 / (4 * n * n)) / (1 + z2 / n)
+        low = math.floor(max(0.0, center - half) * self.total)
+        high = math.ceil(min(1.0, center + half) * self.total)
+        return point, min(low, point), max(high, point)
+
+    def annotate(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """为top_words/neighbors格式的条目添加estimate和ci字段"""
+        for entry in entries:
+            point, low, high = self.estimate(entry["count"])
+            entry["estimate"] = point
+            entry["ci"] = [low, high]
+        return entries
+
+    def describe(self, seed: int) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "seed": seed,
+            "fraction": round(self.size / self.total, 6) if self.total else 0.0,
+            "confidence": self.confidence
+        }
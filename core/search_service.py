@@ -1,122 +1,549 @@
-from typing import Dict, List, Any
-from concurrent.futures import ThreadPoolExecutor
-from config.settings import MAX_WORKERS, SEARCH_FIELDS, CONTEXT_CHARS, MAX_RESULTS
+import random
+from contextlib import AsyncExitStack, aclosing
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple, Union
+from config.settings import (
+    CONTEXT_CHARS, MAX_RESULTS, BATCH_SIZE, SCROLL_SLICES, STREAM_TOP_N,
+    HIGHLIGHT_MODE, COLLOCATION_NGRAM, COLLOCATION_TOP_N,
+    SEGMENT_CACHE_ENABLED, SEGMENT_CACHE_OPEN_TTL, SEARCH_COALESCE_ENABLED, ROLLUP_ENABLED,
+    INDEX_CONCURRENCY, ADMISSION_ENABLED, ADMISSION_CHEAP_DOCUMENTS, ADMISSION_COUNT_ENABLED, SAMPLE_MAX_SIZE
+)
+from core.admission import AdmissionController, AdmissionRejected
 from core.es_client import ESClient
+from core.exporter import SOURCE_FIELDS, export_header
+from core.hits import HIT_SOURCE_FIELDS
+from core.collocation import CollocationCounter
+from core.jobs import JobManager
+from core.segment_cache import SegmentCache
+from core.single_flight import SingleFlight
+from core.rollup import RollupService
+from core.sampling import SampleEstimator
+from core.worker_pool import ExtractionPool
 from utils.logger import get_logger
-import re
 
 logger = get_logger(__name__)
 
 class SearchService:
     def __init__(self):
         self.es_client = ESClient()
+        self.extraction_pool = ExtractionPool()
+        self.segment_cache = SegmentCache()
+        self.single_flight = SingleFlight()
+        self.rollup = RollupService(self.es_client) if ROLLUP_ENABLED else None
+        self.admission = AdmissionController() if ADMISSION_ENABLED else None
+        self.jobs = JobManager(self.es_client, self.extraction_pool, admission=self.admission)
 
-    def _clean_text(self, text: str) -> str:
-        """清理文本，移除无法编码的字符"""
-        # 移除 emoji 和其他特殊字符
-        text = re.sub(r'[\U00010000-\U0010ffff]', '', text)
-        # 移除代理对字符
-        text = re.sub(r'[\ud800-\udfff]', '', text)
-        return text
+    def start(self):
+        """启动上下文提取进程池（应在服务启动时、创建其他线程前调用）、日汇总后台回填，并恢复未完成的后台任务"""
+        self.extraction_pool.start()
+        self.es_client.start()
+        if self.rollup is not None:
+            self.rollup.start()
+        self.jobs.start()
 
-    def _extract_context(self, text: str, keyword: str, context_chars: int = CONTEXT_CHARS) -> str:
-        """提取关键词前后的指定字符数"""
+    async def close(self):
+        """停止后台任务和日汇总回填，释放ES连接池和提取进程池"""
+        await self.jobs.close()
+        if self.rollup is not None:
+            await self.rollup.close()
+        await self.es_client.close()
+        self.extraction_pool.shutdown()
+
+    def _new_search_state(self, keyword: str, ngram: int) -> Dict[str, Any]:
+        return {
+            "total": 0,
+            "fetched": 0,
+            "cached_segments": 0,
+            "collocations": CollocationCounter(keyword, ngram)
+        }
+
+    def _segment_key(self, keyword: str, segment: Tuple[str, str, str], context_chars: int, ngram: int,
+                     highlight: bool) -> Tuple:
+        index, segment_start, segment_end = segment
+        return (keyword, index, segment_start, segment_end, context_chars, ngram, highlight)
+
+    def _segment_ttl(self, index: str) -> Optional[float]:
+        """已结束月份的分段永久缓存，当前及未来月份只缓存SEGMENT_CACHE_OPEN_TTL秒"""
+        _, month_end = self.es_client.get_index_time_bounds(index)
+        if month_end < datetime.now().strftime("%Y-%m-%d %H:%M:%S"):
+            return None
+        return SEGMENT_CACHE_OPEN_TTL
+
+    async def _iter_search(self, keyword: str, start_time: str, end_time: str, context_chars: int,
+                           max_results: int, page_size: int, slices: int,
+                           highlight: bool, ngram: int) -> AsyncIterator[Dict[str, Any]]:
+        """按月度分段逐页拉取并处理，每处理完一页（或命中一个缓存分段）产出一次累计状态
+
+        处理完即丢弃原始文档，内存只与页数相关。完整拉取的分段计数写入分段缓存，
+        之后的查询直接复用缓存分段，只向ES查询未缓存的部分。
+        产出的是同一个状态字典，调用方不应保留引用。
+        """
+        # 记录搜索参数
+        logger.info(f"开始搜索 - 关键词: {keyword}, 时间范围: {start_time} 至 {end_time}, 上下文长度: {context_chars}, 最大结果数: {max_results}")
+
+        state = self._new_search_state(keyword, ngram)
+        # 高亮模式下ES返回的片段不以关键词为中心，片段长度取窗口的两倍以保证能截出完整上下文
+        highlight_size = 2 * (2 * context_chars + len(keyword)) if highlight else None
+
+        segments = self.es_client.plan_segments(start_time, end_time)
+        keys = {segment[0]: self._segment_key(keyword, segment, context_chars, ngram, highlight) for segment in segments}
+        cached = {}
+        if SEGMENT_CACHE_ENABLED:
+            for index, key in keys.items():
+                entry = self.segment_cache.get(key)
+                if entry is not None:
+                    cached[index] = entry
+        if cached:
+            logger.info(f"分段缓存命中 - 关键词: {keyword}, 索引: {list(cached)}")
+
+        meta: Dict[str, Any] = {}
+        cached_total = 0
+        lookahead = None
+        uncached_segments = [segment for segment in segments if segment[0] not in cached]
+        pages = self.es_client.iter_segment_pages(keyword, uncached_segments, max_results,
+                                                  page_size=page_size, slices=slices, meta=meta,
+                                                  highlight_size=highlight_size)
+        async with aclosing(pages):
+            for index, segment_start, segment_end in segments:
+                remaining = max_results - state["fetched"]
+                if remaining <= 0:
+                    break
+
+                entry = cached.get(index)
+                if entry is not None and entry["fetched"] <= remaining:
+                    state["collocations"].merge(entry["collocations"])
+                    state["fetched"] += entry["fetched"]
+                    state["cached_segments"] += 1
+                    cached_total += entry["total"]
+                    state["total"] = cached_total + meta.get("total", 0)
+                    yield state
+                    continue
+
+                if entry is not None:
+                    # 缓存的分段超出剩余额度，结果会在该段内截断，单独向ES拉取该段的前remaining条
+                    segment_meta: Dict[str, Any] = {}
+                    segment_pages = self.es_client.iter_segment_pages(
+                        keyword, [(index, segment_start, segment_end)], remaining,
+                        page_size=page_size, slices=slices, meta=segment_meta, highlight_size=highlight_size)
+                    async with aclosing(segment_pages):
+                        async for _, page in segment_pages:
+                            if page is None:
+                                continue
+                            partial = await self.extraction_pool.count(page, keyword, context_chars, ngram)
+                            state["collocations"].merge(partial)
+                            state["fetched"] += len(page)
+                            state["total"] = cached_total + entry["total"] + meta.get("total", 0)
+                            yield state
+                    break
+
+                # 从ES流中读取本索引的页；读到其他索引的项说明本索引失败，留给后续索引处理
+                segment = CollocationCounter(keyword, ngram)
+                segment_fetched = 0
+                complete = False
+                truncated = False
+                while True:
+                    item = lookahead or await anext(pages, None)
+                    lookahead = None
+                    if item is None:
+                        break
+                    item_index, page = item
+                    if item_index != index:
+                        lookahead = item
+                        break
+                    if page is None:
+                        complete = True
+                        break
+                    if segment_fetched >= remaining:
+                        break
+
+                    if len(page) > remaining - segment_fetched:
+                        # 在剩余额度处截断的分段即使随后读到结束标记也不完整，不能缓存
+                        page = page[:remaining - segment_fetched]
+                        truncated = True
+                    # 文本处理为CPU密集操作，分块交给进程池执行，避免阻塞事件循环
+                    partial = await self.extraction_pool.count(page, keyword, context_chars, ngram)
+                    segment.merge(partial)
+                    state["collocations"].merge(partial)
+                    segment_fetched += len(page)
+                    state["fetched"] += len(page)
+                    state["total"] = cached_total + meta.get("total", 0)
+                    yield state
+
+                if complete and not truncated and SEGMENT_CACHE_ENABLED:
+                    entry = {
+                        "collocations": segment,
+                        "fetched": segment_fetched,
+                        "total": meta.get("index_totals", {}).get(index, 0)
+                    }
+                    self.segment_cache.put(keys[index], entry, segment.size_bytes(), self._segment_ttl(index))
+
+        if state["fetched"] >= max_results:
+            # 达到上限提前结束时，后面的分段没有读到命中数，补全后total与缓存命中情况、并发和时序无关
+            await self.es_client.count_segment_totals(
+                keyword, [segment for segment in segments if segment[0] not in cached], meta)
+            state["total"] = sum(entry["total"] for entry in cached.values()) + meta.get("total", 0)
+            yield state
+
+        # 记录搜索结果数量
+        logger.info(f"ES返回原始结果数量: {state['fetched']}, 命中缓存分段: {state['cached_segments']}")
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取分段缓存统计"""
+        return self.segment_cache.stats()
+
+    def invalidate_cache(self, keyword: Optional[str] = None, index: Optional[str] = None) -> int:
+        """按关键词和/或索引失效分段缓存，返回删除的分段数"""
+        removed = self.segment_cache.invalidate(keyword, index)
+        logger.info(f"分段缓存失效 - 关键词: {keyword}, 索引: {index}, 删除分段数: {removed}")
+        return removed
+
+    def submit_job(self, keyword: str, start_time: str, end_time: str, context_chars: Optional[int] = CONTEXT_CHARS,
+                   max_results: Optional[int] = None, page_size: Optional[int] = BATCH_SIZE,
+                   ngram: Optional[int] = COLLOCATION_NGRAM) -> Dict[str, Any]:
+        """提交后台搜索任务，max_results为空表示拉取全部命中文档"""
+        return self.jobs.submit(keyword, start_time, end_time, context_chars or CONTEXT_CHARS, max_results,
+                                page_size or BATCH_SIZE, ngram or COLLOCATION_NGRAM)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        return self.jobs.list_jobs()
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(job_id)
+
+    def cancel_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.cancel(job_id)
+
+    async def get_job_result(self, job_id: str, top_n: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """已完成任务的结果，格式同搜索接口；任务不存在或未完成时返回None"""
+        return await self.jobs.build_result(job_id, top_n)
+
+    def get_admission_stats(self) -> Dict[str, Any]:
+        """获取准入控制的额度占用和排队情况"""
+        if self.admission is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.admission.stats()}
+
+    def get_coalescing_stats(self) -> Dict[str, Any]:
+        """获取并发请求合并统计"""
+        return self.single_flight.stats()
+
+    def _build_search_result(self, state: Dict[str, Any], top_n: Optional[int] = None,
+                             neighbors: bool = True) -> Dict[str, Any]:
+        """根据累计状态构建返回结果，top_n为空时返回全部词语"""
+        collocations: CollocationCounter = state["collocations"]
+        result = {
+            "total": state["total"],
+            "parsed": collocations.total,
+            "max_results": state["fetched"],
+            "approximate": collocations.approximate,
+            "cached_segments": state["cached_segments"],
+            "words": collocations.top_words(top_n)
+        }
+        if neighbors:
+            result["neighbors"] = collocations.neighbors(top_n or COLLOCATION_TOP_N)
+        return result
+
+    async def _collect_search(self, keyword: str, start_time: str, end_time: str, context_chars: int,
+                              max_results: int, page_size: int, slices: int,
+                              highlight: bool, ngram: int) -> Dict[str, Any]:
+        """完整执行一次搜索，返回最终累计状态"""
+        state = self._new_search_state(keyword, ngram)
+        progress = self._iter_search(keyword, start_time, end_time, context_chars, max_results,
+                                     page_size, slices, highlight, ngram)
+        async with aclosing(progress):
+            async for state in progress:
+                pass
+        return state
+
+    async def _estimate_cost(self, keyword: Union[str, Tuple[str, ...]], segments: List[Tuple[str, str, str]],
+                             max_results: int, slices: int) -> Tuple[int, int]:
+        """估算一次搜索占用的scroll上下文数和拉取的文档数
+
+        各索引并发拉取（不超过INDEX_CONCURRENCY个），每个索引占用slices个scroll；
+        文档数为max_results，开启ADMISSION_COUNT_ENABLED时再用_count的命中数收紧。
+        """
+        if not segments:
+            return 0, 0
+        scrolls = min(len(segments), INDEX_CONCURRENCY) * slices
+        documents = max_results
+        if ADMISSION_COUNT_ENABLED and documents > ADMISSION_CHEAP_DOCUMENTS:
+            try:
+                hits = await self.es_client.count_hits(list(keyword) if isinstance(keyword, tuple) else keyword,
+                                                       segments[0][1], segments[-1][2], limit=max_results)
+                documents = min(documents, hits)
+            except Exception as e:
+                logger.warning(f"估算命中数失败，按最大结果数计: {str(e)}")
+        return scrolls, documents
+
+    async def _admitted_search(self, keyword: str, start_time: str, end_time: str, context_chars: int,
+                               max_results: int, page_size: int, slices: int,
+                               highlight: bool, ngram: int) -> Dict[str, Any]:
+        """经准入控制完整执行一次搜索，已缓存的分段不计入成本"""
+        params = (keyword, start_time, end_time, context_chars, max_results, page_size, slices, highlight, ngram)
+        if self.admission is None:
+            return await self._collect_search(*params)
+
+        scrolls, documents = await self._search_cost(*params)
+        async with self.admission.admit(scrolls, documents):
+            return await self._collect_search(*params)
+
+    async def _search_cost(self, keyword: str, start_time: str, end_time: str, context_chars: int,
+                           max_results: int, page_size: int, slices: int,
+                           highlight: bool, ngram: int) -> Tuple[int, int]:
+        """单关键词搜索的成本，已缓存的分段不计入"""
+        segments = [
+            segment for segment in self.es_client.plan_segments(start_time, end_time)
+            if not (SEGMENT_CACHE_ENABLED
+                    and self.segment_cache.contains(self._segment_key(keyword, segment, context_chars, ngram, highlight)))
+        ]
+        return await self._estimate_cost(keyword, segments, max_results, slices)
+
+    async def _collect_sample(self, keyword: str, start_time: str, end_time: str, context_chars: int,
+                              sample: int, seed: int, ngram: int) -> Tuple[int, int, CollocationCounter]:
+        """抽样并提取，返回(命中总数, 样本文档数, 样本计数)"""
+        hits, total = await self.es_client.sample_search(keyword, start_time, end_time, sample, seed)
+        if not hits:
+            return total, 0, CollocationCounter(keyword, ngram)
+        return total, len(hits), await self.extraction_pool.count(hits, keyword, context_chars, ngram)
+
+    async def _sampled_search(self, keyword: str, start_time: str, end_time: str, context_chars: int,
+                              sample: int, seed: Optional[int], ngram: int, top_n: Optional[int]) -> Dict[str, Any]:
+        """抽样分析：样本计数按总体规模放大为估算值，并给出置信区间；未指定seed时随机生成并在结果中返回"""
+        if seed is None:
+            seed = random.randrange(2 ** 31)
+        logger.info(f"开始抽样分析 - 关键词: {keyword}, 时间范围: {start_time} 至 {end_time}, 样本量: {sample}, 种子: {seed}")
+
+        params = (keyword, start_time, end_time, context_chars, sample, seed, ngram)
+        if self.admission is None:
+            total, size, collocations = await self._collect_sample(*params)
+        else:
+            async with self.admission.admit(1, sample):
+                total, size, collocations = await self._collect_sample(*params)
+
+        estimator = SampleEstimator(size, total, collocations.total / size if size else 1.0)
+        parsed, parsed_low, parsed_high = estimator.estimate(collocations.total)
+        neighbors = collocations.neighbors(top_n or COLLOCATION_TOP_N)
+        for sides in neighbors.values():
+            for entries in sides.values():
+                estimator.annotate(entries)
+        return {
+            "total": total,
+            "parsed": collocations.total,
+            "max_results": size,
+            "approximate": collocations.approximate,
+            "cached_segments": 0,
+            "sample": estimator.describe(seed),
+            "estimated_parsed": parsed,
+            "estimated_parsed_ci": [parsed_low, parsed_high],
+            "words": estimator.annotate(collocations.top_words(top_n)),
+            "neighbors": neighbors
+        }
+
+    async def search(self, keyword: str, start_time: str, end_time: str, context_chars: Optional[int] = CONTEXT_CHARS,
+                     max_results: Optional[int] = MAX_RESULTS, page_size: Optional[int] = BATCH_SIZE,
+                     slices: Optional[int] = SCROLL_SLICES, highlight: Optional[bool] = HIGHLIGHT_MODE,
+                     top_n: Optional[int] = None, ngram: Optional[int] = COLLOCATION_NGRAM,
+                     sample: Optional[int] = None, seed: Optional[int] = None) -> Dict[str, Any]:
+        """搜索并处理结果；参数相同的并发搜索共享同一次ES拉取
+
+        指定sample时改为抽样分析：均匀随机抽取sample篇命中文档，返回带置信区间的总体估算，忽略max_results等拉取参数。
+        """
         try:
-            index = text.find(keyword)
-            if index == -1:
-                return ""
-            
-            start = max(0, index - context_chars)
-            end = min(len(text), index + len(keyword) + context_chars)
-            
-            return text[start:end]
+            if sample:
+                return await self._sampled_search(keyword, start_time, end_time, context_chars or CONTEXT_CHARS,
+                                                  min(sample, SAMPLE_MAX_SIZE), seed, ngram or COLLOCATION_NGRAM, top_n)
+
+            params = (keyword, start_time, end_time, context_chars or CONTEXT_CHARS, max_results or MAX_RESULTS,
+                      page_size or BATCH_SIZE, slices or SCROLL_SLICES,
+                      HIGHLIGHT_MODE if highlight is None else highlight, ngram or COLLOCATION_NGRAM)
+            if SEARCH_COALESCE_ENABLED:
+                state = await self.single_flight.do(("search", *params), lambda: self._admitted_search(*params))
+            else:
+                state = await self._admitted_search(*params)
+
+            # 构建返回结果（top_n只影响输出，不参与合并键）
+            return self._build_search_result(state, top_n)
+
+        except AdmissionRejected:
+            raise
         except Exception as e:
-            logger.error(f"提取上下文失败: {str(e)}")
-            return ""
+            logger.error(f"搜索服务失败: {str(e)}")
+            raise 
+
+    async def search_stream(self, keyword: str, start_time: str, end_time: str, context_chars: Optional[int] = CONTEXT_CHARS,
+                            max_results: Optional[int] = MAX_RESULTS, page_size: Optional[int] = BATCH_SIZE,
+                            slices: Optional[int] = SCROLL_SLICES, highlight: Optional[bool] = HIGHLIGHT_MODE,
+                            top_n: Optional[int] = None, ngram: Optional[int] = COLLOCATION_NGRAM,
+                            sample: Optional[int] = None, seed: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """流式搜索：每处理完一页产出一帧进度（含当前前STREAM_TOP_N个词），最后产出完整结果；抽样分析只产出结果帧
 
-    def _process_document(self, doc: Dict[str, Any], keyword: str, context_chars: int = CONTEXT_CHARS) -> List[str]:
-        """处理单个文档，返回所有匹配的内容列表"""
+        与普通搜索一样经过准入控制，第一帧在通过准入控制后产出，调用方可以据此在开始响应前处理过载拒绝。
+        """
         try:
-            source = doc.get("_source", {})
-            matches = []
-
-            # 处理所有可能的字段
-            for field in SEARCH_FIELDS:
-                if field in source:
-                    text = source[field]
-                    if isinstance(text, str) and keyword in text:
-                        # 清理文本
-                        cleaned_text = self._clean_text(text)
-                        if cleaned_text:
-                            # 提取上下文
-                            context = self._extract_context(cleaned_text, keyword, context_chars)
-                            if context:
-                                matches.append(context)
-
-            return matches
+            if sample:
+                yield {"type": "summary", "data": await self.search(keyword, start_time, end_time, context_chars,
+                                                                    top_n=top_n, ngram=ngram, sample=sample, seed=seed)}
+                return
+
+            params = (keyword, start_time, end_time, context_chars or CONTEXT_CHARS, max_results or MAX_RESULTS,
+                      page_size or BATCH_SIZE, slices or SCROLL_SLICES,
+                      HIGHLIGHT_MODE if highlight is None else highlight, ngram or COLLOCATION_NGRAM)
+            state = self._new_search_state(keyword, params[-1])
+            async with AsyncExitStack() as stack:
+                if self.admission is not None:
+                    scrolls, documents = await self._search_cost(*params)
+                    await stack.enter_async_context(self.admission.admit(scrolls, documents))
+
+                progress = self._iter_search(*params)
+                async with aclosing(progress):
+                    async for state in progress:
+                        yield {"type": "progress", **self._build_search_result(state, min(top_n or STREAM_TOP_N, STREAM_TOP_N),
+                                                                               neighbors=False)}
+
+            yield {"type": "summary", "data": self._build_search_result(state, top_n)}
+
+        except AdmissionRejected:
+            raise
         except Exception as e:
-            logger.error(f"处理文档失败: {str(e)}")
-            return []
+            logger.error(f"流式搜索服务失败: {str(e)}")
+            raise
+
+    async def export_contexts(self, keyword: str, start_time: str, end_time: str, fmt: str, compression: str,
+                              context_chars: Optional[int] = CONTEXT_CHARS, max_results: Optional[int] = MAX_RESULTS,
+                              page_size: Optional[int] = BATCH_SIZE,
+                              slices: Optional[int] = SCROLL_SLICES) -> AsyncIterator[bytes]:
+        """导出上下文：每到一页即提取、编码并压缩后产出，不在内存中累积结果
+
+        第一块（CSV表头或空的压缩成员）在通过准入控制后产出，调用方可以据此在开始响应前处理过载拒绝。
+        """
+        context_chars = context_chars or CONTEXT_CHARS
+        max_results = max_results or MAX_RESULTS
+        page_size = page_size or BATCH_SIZE
+        slices = slices or SCROLL_SLICES
+        logger.info(f"开始导出 - 关键词: {keyword}, 时间范围: {start_time} 至 {end_time}, 格式: {fmt}, "
+                    f"压缩: {compression}, 最大结果数: {max_results}")
+
+        async with AsyncExitStack() as stack:
+            if self.admission is not None:
+                segments = self.es_client.plan_segments(start_time, end_time)
+                scrolls, documents = await self._estimate_cost(keyword, segments, max_results, slices)
+                await stack.enter_async_context(self.admission.admit(scrolls, documents))
+
+            yield export_header(fmt, compression)
 
-    def search(self, keyword: str, start_time: str, end_time: str, context_chars: int = CONTEXT_CHARS, max_results: int = MAX_RESULTS) -> Dict[str, Any]:
-        """搜索并处理结果"""
+            fetched = 0
+            pages = self.es_client.iter_search_pages(keyword, start_time, end_time, max_results,
+                                                     page_size=page_size, slices=slices,
+                                                     source_fields=SOURCE_FIELDS)
+            try:
+                async with aclosing(pages):
+                    async for page in pages:
+                        chunk = await self.extraction_pool.export(page, keyword, context_chars, fmt, compression)
+                        fetched += len(page)
+                        if chunk:
+                            yield chunk
+            except Exception as e:
+                logger.error(f"导出失败: {str(e)}")
+                raise
+
+        logger.info(f"导出完成 - 关键词: {keyword}, 处理文档数: {fetched}")
+
+    async def _collect_batch(self, keywords: Tuple[str, ...], start_time: str, end_time: str, context_chars: int,
+                             max_results: int, page_size: int, slices: int,
+                             ngram: int) -> Tuple[int, int, Dict[str, CollocationCounter]]:
+        """完整执行一次批量搜索，返回(命中总数, 拉取文档数, 各关键词计数)"""
+        meta: Dict[str, Any] = {}
+        collocations = {keyword: CollocationCounter(keyword, ngram) for keyword in keywords}
+        fetched = 0
+        pages = self.es_client.iter_search_pages(list(keywords), start_time, end_time, max_results,
+                                                 page_size=page_size, slices=slices, meta=meta,
+                                                 source_fields=HIT_SOURCE_FIELDS)
+        async with aclosing(pages):
+            async for page in pages:
+                partials = await self.extraction_pool.count_batch(page, keywords, context_chars, ngram)
+                for keyword, partial in partials.items():
+                    collocations[keyword].merge(partial)
+                fetched += len(page)
+        return meta.get("total", 0), fetched, collocations
+
+    async def _admitted_batch(self, keywords: Tuple[str, ...], start_time: str, end_time: str, context_chars: int,
+                              max_results: int, page_size: int, slices: int,
+                              ngram: int) -> Tuple[int, int, Dict[str, CollocationCounter]]:
+        """经准入控制完整执行一次批量搜索"""
+        params = (keywords, start_time, end_time, context_chars, max_results, page_size, slices, ngram)
+        if self.admission is None:
+            return await self._collect_batch(*params)
+
+        segments = self.es_client.plan_segments(start_time, end_time)
+        scrolls, documents = await self._estimate_cost(keywords, segments, max_results, slices)
+        async with self.admission.admit(scrolls, documents):
+            return await self._collect_batch(*params)
+
+    async def search_batch(self, keywords: List[str], start_time: str, end_time: str, context_chars: Optional[int] = CONTEXT_CHARS,
+                           max_results: Optional[int] = MAX_RESULTS, page_size: Optional[int] = BATCH_SIZE,
+                           slices: Optional[int] = SCROLL_SLICES, top_n: Optional[int] = None,
+                           ngram: Optional[int] = COLLOCATION_NGRAM) -> Dict[str, Any]:
+        """多关键词批量搜索：一次查询覆盖所有关键词，每个文档只扫描一次，分别统计每个关键词的上下文"""
         try:
-            # 记录搜索参数
-            logger.info(f"开始搜索 - 关键词: {keyword}, 时间范围: {start_time} 至 {end_time}, 上下文长度: {context_chars}, 最大结果数: {max_results}")
-            
-            # 获取原始搜索结果
-            results = self.es_client.search(keyword, start_time, end_time, max_results)
-            
-            # 记录搜索结果数量
-            logger.info(f"ES返回原始结果数量: {len(results)}")
-            
-            # 使用线程池处理结果
-            all_matches = []
-            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                futures = [
-                    executor.submit(self._process_document, doc, keyword, context_chars)
-                    for doc in results
-                ]
-                for future in futures:
-                    try:
-                        matches = future.result()
-                        all_matches.extend(matches)
-                    except Exception as e:
-                        logger.error(f"处理结果失败: {str(e)}")
-
-            # 获取总数（从ES响应中获取）
-            total_hits = 0
-            if results and len(results) > 0:
-                total_hits = results[0].get("_source", {}).get("total_hits", 0)
+            context_chars = context_chars or CONTEXT_CHARS
+            max_results = max_results or MAX_RESULTS
+            keywords = tuple(dict.fromkeys(keyword for keyword in keywords if keyword))
+
+            logger.info(f"开始批量搜索 - 关键词: {list(keywords)}, 时间范围: {start_time} 至 {end_time}, "
+                        f"上下文长度: {context_chars}, 最大结果数: {max_results}")
+
+            ngram = ngram or COLLOCATION_NGRAM
+            params = (keywords, start_time, end_time, context_chars, max_results,
+                      page_size or BATCH_SIZE, slices or SCROLL_SLICES, ngram)
+            if SEARCH_COALESCE_ENABLED:
+                total, fetched, collocations = await self.single_flight.do(
+                    ("batch", *params), lambda: self._admitted_batch(*params))
+            else:
+                total, fetched, collocations = await self._admitted_batch(*params)
+
+            logger.info(f"批量搜索完成 - ES返回原始结果数量: {fetched}")
 
-            # 构建返回结果
             return {
-                "total": total_hits,
-                "parsed": len(all_matches),
-                "max_results": len(results),
-                "words": sorted(
-                    [{"word": word, "count": count} for word, count in 
-                     {word: all_matches.count(word) for word in all_matches}.items()],
-                    key=lambda x: x["count"],
-                    reverse=True
-                )
+                "total": total,
+                "max_results": fetched,
+                "keywords": [
+                    {
+                        "keyword": keyword,
+                        "parsed": counter.total,
+                        "approximate": counter.approximate,
+                        "words": counter.top_words(top_n),
+                        "neighbors": counter.neighbors(top_n or COLLOCATION_TOP_N)
+                    }
+                    for keyword, counter in collocations.items()
+                ]
             }
 
+        except AdmissionRejected:
+            raise
         except Exception as e:
-            logger.error(f"搜索服务失败: {str(e)}")
-            raise 
+            logger.error(f"批量搜索服务失败: {str(e)}")
+            raise
 
-    def get_author_stats(self, start_time: str, end_time: str, top_n: int = 10) -> Dict[str, Any]:
+    async def get_author_stats(self, start_time: str, end_time: str, top_n: int = 10) -> Dict[str, Any]:
         """获取指定时间范围内的作者统计信息"""
         try:
             # 记录统计参数
             logger.info(f"开始统计作者 - 时间范围: {start_time} 至 {end_time}, 显示数量: {top_n}")
             
-            # 获取作者聚合结果
-            results = self.es_client.get_author_aggregation(start_time, end_time, top_n)
+            if self.rollup is not None:
+                # 已汇总的整天查本地日汇总，其余时间段查ES，结果精确
+                total_authors, top, source = await self.rollup.get_top("author", start_time, end_time, top_n)
+                results = {
+                    "total_authors": total_authors,
+                    "top_authors": [{"author": author, "count": count} for author, count in top]
+                }
+            else:
+                # 获取作者聚合结果
+                results = await self.es_client.get_author_aggregation(start_time, end_time, top_n)
+                source = None
             
             # 构建返回结果
-            return {
+            result = {
                 "total_authors": results.get("total_authors", 0),
                 "time_range": {
                     "start": start_time,
@@ -124,15 +551,26 @@ class SearchService:
                 },
                 "top_authors": results.get("top_authors", [])
             }
+            if source is not None:
+                result["source"] = source
+            return result
 
         except Exception as e:
             logger.error(f"作者统计服务失败: {str(e)}")
             raise 
 
-    def get_media_stats(self, start_time: str, end_time: str, top_n: int) -> Dict[str, Any]:
+    async def get_media_stats(self, start_time: str, end_time: str, top_n: int) -> Dict[str, Any]:
         """获取媒体统计信息"""
         try:
-            result = self.es_client.get_media_aggregation(
+            if self.rollup is not None:
+                total_media, top, source = await self.rollup.get_top("media", start_time, end_time, top_n)
+                return {
+                    "total_media": total_media,
+                    "top_media": [{"media": media, "count": count} for media, count in top],
+                    "source": source
+                }
+
+            result = await self.es_client.get_media_aggregation(
                 start_time=start_time,
                 end_time=end_time,
                 top_n=top_n
@@ -140,4 +578,52 @@ class SearchService:
             return result
         except Exception as e:
             logger.error(f"媒体统计服务失败: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+
+    async def get_stats(self, start_time: str, end_time: str, dimensions: List[str], top_n: int = 10,
+                        keywords: Optional[List[str]] = None) -> Dict[str, Any]:
+        """组合统计：作者、媒体、关键词命中数等多个维度在一次ES请求中完成"""
+        try:
+            logger.info(f"开始组合统计 - 维度: {dimensions}, 时间范围: {start_time} 至 {end_time}, 显示数量: {top_n}")
+
+            results = await self.es_client.get_aggregations(start_time, end_time, dimensions, top_n, keywords)
+            return {
+                "time_range": {
+                    "start": start_time,
+                    "end": end_time
+                },
+                **results
+            }
+        except Exception as e:
+            logger.error(f"组合统计服务失败: {str(e)}")
+            raise
+
+    async def get_trend(self, keyword: str, start_time: str, end_time: str, interval: str,
+                        media_top_n: int = 0) -> Dict[str, Any]:
+        """关键词趋势：命中文档数按时间分桶，完全由ES聚合计算"""
+        try:
+            logger.info(f"开始趋势统计 - 关键词: {keyword}, 时间范围: {start_time} 至 {end_time}, "
+                        f"粒度: {interval}, 媒体数: {media_top_n}")
+
+            result = await self.es_client.get_keyword_trend(keyword, start_time, end_time, interval, media_top_n)
+            return {
+                "time_range": {
+                    "start": start_time,
+                    "end": end_time
+                },
+                **result
+            }
+        except Exception as e:
+            logger.error(f"趋势统计服务失败: {str(e)}")
+            raise
+
+    def get_index_catalog(self) -> Dict[str, Any]:
+        """获取索引目录"""
+        return self.es_client.catalog.stats()
+
+    def get_rollup_stats(self) -> Dict[str, Any]:
+        """获取日汇总的回填进度"""
+        return {
+            "enabled": self.rollup is not None,
+            "dimensions": self.rollup.stats() if self.rollup is not None else {}
+        }
@@ -0,0 +1,77 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+from config.settings import SEGMENT_CACHE_MAX_BYTES
+
+
+class SegmentCache:
+    """按字节数限制容量的LRU缓存，条目可设置过期时间
+
+    键的第一个元素为关键词、第二个元素为索引名，便于按关键词或索引失效。
+    """
+
+    def __init__(self, max_bytes: int = SEGMENT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # key -> (value, size, expires_at)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int, Optional[float]]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def contains(self, key: Hashable) -> bool:
+        """是否有未过期的条目，不影响LRU顺序和命中统计"""
+        entry = self._entries.get(key)
+        return entry is not None and (entry[2] is None or entry[2] > time.monotonic())
+
+    def put(self, key: Hashable, value: Any, size: int, ttl: Optional[float] = None):
+        """写入缓存，ttl为空表示不过期；单个条目超过容量时不缓存"""
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = (value, size, expires_at)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, keyword: Optional[str] = None, index: Optional[str] = None) -> int:
+        """按关键词和/或索引失效缓存，均为空时清空全部，返回删除的条目数"""
+        keys = [
+            key for key in self._entries
+            if (keyword is None or key[0] == keyword) and (index is None or key[1] == index)
+        ]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions
+        }
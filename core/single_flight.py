@@ -0,0 +1,52 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class SingleFlight:
+    """合并相同参数的并发请求：同一个键同一时刻只执行一次，结果（或异常）分发给所有等待者
+
+    某个等待者被取消（如客户端断开）不影响其他等待者；所有等待者都取消后才取消执行。
+    """
+
+    def __init__(self):
+        self.executions = 0
+        self.coalesced = 0
+        # key -> [task, 等待者数量]
+        self._inflight: Dict[Hashable, list] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._inflight.get(key)
+        if flight is None:
+            self.executions += 1
+            task = asyncio.ensure_future(func())
+            flight = [task, 0]
+            self._inflight[key] = flight
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+            logger.info(f"合并相同的并发请求 - 当前等待者: {flight[1] + 1}")
+
+        task = flight[0]
+        flight[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and flight[1] == 1:
+                task.cancel()
+            raise
+        finally:
+            flight[1] -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.executions + self.coalesced
+        return {
+            "requests": requests,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "waiting": sum(flight[1] for flight in self._inflight.values()),
+            "saved_ratio": round(self.coalesced / requests, 4) if requests else 0.0
+        }
@@ -0,0 +1,112 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config.settings import MAX_WORKERS, EXTRACT_CHUNK_SIZE, EXTRACT_INLINE_THRESHOLD, PROFILING_INTERVAL_MS
+from core.collocation import CollocationCounter
+from core.exporter import export_chunk
+from core.extractor import count_documents, count_documents_batch
+from core.metrics import metrics, record_stage, timed
+from core.profiler import current_worker_stacks
+from core.sampler import run_profiled
+from utils.logger import get_logger, remove_file_sink
+
+logger = get_logger(__name__)
+
+
+def _init_worker():
+    """工作进程启动时移除日志文件输出，只由主进程写日志文件"""
+    remove_file_sink()
+
+
+class ExtractionPool:
+    """应用生命周期内常驻的上下文提取进程池
+
+    文档按chunk_size分块提交给工作进程，每块返回部分计数后在主进程合并，
+    不受GIL限制。文档数少于inline_threshold时直接在当前进程中处理，省去进程间传输开销。
+    """
+
+    def __init__(self, workers: int = MAX_WORKERS, chunk_size: int = EXTRACT_CHUNK_SIZE,
+                 inline_threshold: int = EXTRACT_INLINE_THRESHOLD):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.inline_threshold = inline_threshold
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        """启动进程池；workers小于等于1时不启用进程池，全部在当前进程处理"""
+        if self._executor is None and self.workers > 1:
+            # 使用spawn启动工作进程，不继承监听端口等文件描述符，主进程退出后不会残留占用端口
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker)
+            logger.info(f"上下文提取进程池已启动 - 进程数: {self.workers}")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def _map_chunks(self, func: Callable, docs: List[Dict[str, Any]], *args) -> List[Any]:
+        if len(docs) < self.inline_threshold or self.workers <= 1:
+            return [func(docs, *args)]
+
+        self.start()
+        loop = asyncio.get_running_loop()
+        chunks = [docs[i:i + self.chunk_size] for i in range(0, len(docs), self.chunk_size)]
+        worker_stacks = current_worker_stacks()
+        if worker_stacks is None:
+            return await asyncio.gather(*[
+                loop.run_in_executor(self._executor, func, chunk, *args) for chunk in chunks
+            ])
+
+        # 当前请求正在剖析：在工作进程内同样采样，调用栈汇总到本次剖析
+        profiled = await asyncio.gather(*[
+            loop.run_in_executor(self._executor, run_profiled, PROFILING_INTERVAL_MS / 1000, func, chunk, *args)
+            for chunk in chunks
+        ])
+        for _, stacks in profiled:
+            worker_stacks.update(stacks)
+        return [result for result, _ in profiled]
+
+    def _record(self, docs: List[Dict[str, Any]], partials: List[Tuple[Any, Dict[str, float]]]):
+        """记录工作进程内各阶段的耗时（各进程累加，不是墙钟时间）和处理的文档数"""
+        metrics.inc("documents_processed_total", len(docs))
+        for _, timings in partials:
+            for stage, seconds in timings.items():
+                record_stage(stage, seconds)
+
+    async def count(self, docs: List[Dict[str, Any]], keyword: str, context_chars: int,
+                    ngram: int) -> CollocationCounter:
+        """处理一页文档，返回合并后的计数"""
+        with timed("extract_pool"):
+            partials = await self._map_chunks(count_documents, docs, keyword, context_chars, ngram)
+        self._record(docs, partials)
+        with timed("merge"):
+            collocations = partials[0][0]
+            for partial, _ in partials[1:]:
+                collocations.merge(partial)
+        metrics.inc("matches_total", collocations.total)
+        return collocations
+
+    async def count_batch(self, docs: List[Dict[str, Any]], keywords: Tuple[str, ...], context_chars: int,
+                          ngram: int) -> Dict[str, CollocationCounter]:
+        """多关键词版本的count，返回每个关键词合并后的计数"""
+        with timed("extract_pool"):
+            partials = await self._map_chunks(count_documents_batch, docs, keywords, context_chars, ngram)
+        self._record(docs, partials)
+        with timed("merge"):
+            collocations = partials[0][0]
+            for partial, _ in partials[1:]:
+                for keyword, counter in partial.items():
+                    collocations[keyword].merge(counter)
+        metrics.inc("matches_total", sum(counter.total for counter in collocations.values()))
+        return collocations
+
+    async def export(self, docs: List[Dict[str, Any]], keyword: str, context_chars: int, fmt: str,
+                     compression: str) -> bytes:
+        """提取一页文档的上下文并编码压缩，各块的压缩结果按文档顺序拼接"""
+        with timed("extract_pool"):
+            chunks = await self._map_chunks(export_chunk, docs, keyword, context_chars, fmt, compression)
+        metrics.inc("documents_processed_total", len(docs))
+        return b"".join(chunks)
@@ -1,10 +1,14 @@
+import time
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from api.routes import router
-from config.settings import API_HOST, API_PORT
+from api.routes import router, search_service
+from config.settings import API_HOST, API_PORT, MAX_RESULTS, CONTEXT_CHARS
+from core import codec
+from core.metrics import metrics, server_timing_header, start_request_timings
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -14,9 +18,15 @@ async def lifespan(app: FastAPI):
     """服务生命周期管理"""
     # 启动时的操作
     logger.info("服务启动中...")
+    logger.info(f"查询配置 - MAX_RESULTS: {MAX_RESULTS}, CONTEXT_CHARS: {CONTEXT_CHARS}")
+    logger.info(f"JSON编解码: {codec.CODEC}")
+    if codec.CODEC != "orjson":
+        logger.warning("未安装orjson，JSON编解码退回标准库json，请按requirements.txt安装依赖")
+    search_service.start()
     yield
     # 关闭时的操作
     logger.info("服务关闭中...")
+    await search_service.close()
 
 app = FastAPI(
     title="ES 模糊词查询服务",
@@ -34,6 +44,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """记录API请求耗时，并通过Server-Timing响应头返回本次请求各阶段的累计耗时
+
+    流式响应在开始发送时就已返回响应头，只包含此前的阶段。
+    """
+    if not request.url.path.startswith("/api/"):
+        return await call_next(request)
+
+    timings = start_request_timings()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    metrics.observe("http_request_seconds", elapsed, path=path)
+    metrics.inc("http_requests_total", path=path, status=str(response.status_code))
+    response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
 # 挂载静态文件
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -46,6 +77,11 @@ async def root():
     from fastapi.responses import FileResponse
     return FileResponse("static/index.html")
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus格式的指标"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/author_stats.html")
 async def author_stats():
     """作者统计页面"""
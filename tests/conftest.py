@@ -0,0 +1,65 @@
+"""测试公共夹具
+
+服务连接进程内启动的本地ES替身（benchmarks.fake_es），配置在导入服务模块前通过环境变量设置：
+不启用进程池、日汇总和索引目录，同时查询的索引数为2，日志和任务目录写到临时目录。
+"""
+import os
+import socket
+import tempfile
+
+import pytest
+from aiohttp import web
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+_TMP = tempfile.mkdtemp(prefix="keyword-context-tests-")
+os.environ.update({
+    "ES_HOST": "127.0.0.1",
+    "ES_PORT": str(_free_port()),
+    "ES_PASSWORD": "",
+    "MAX_WORKERS": "1",
+    "INDEX_CONCURRENCY": "2",
+    "ROLLUP_ENABLED": "false",
+    "INDEX_CATALOG_ENABLED": "false",
+    "SEARCH_COALESCE_ENABLED": "false",
+    "LOG_DIR": os.path.join(_TMP, "logs"),
+    "JOB_DIR": os.path.join(_TMP, "jobs"),
+})
+
+from benchmarks.corpus import generate_corpus  # noqa: E402
+from benchmarks.fake_es import FakeElasticsearch  # noqa: E402
+from config.settings import ES_HOST, ES_PORT  # noqa: E402
+from core.search_service import SearchService  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def corpus():
+    """默认两个月、每月80篇文档，测试模块可覆盖"""
+    return generate_corpus("2024-01", 2, 80)
+
+
+@pytest.fixture
+async def fake_es(corpus):
+    fake = FakeElasticsearch(corpus)
+    runner = web.AppRunner(fake.build_app())
+    await runner.setup()
+    await web.TCPSite(runner, ES_HOST, ES_PORT).start()
+    yield fake
+    await runner.cleanup()
+
+
+@pytest.fixture
+async def service(fake_es):
+    service = SearchService()
+    yield service
+    await service.es_client.close()
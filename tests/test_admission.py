@@ -0,0 +1,107 @@
+"""准入控制：额度、排队顺序、拒绝与/api/search的429响应"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Request
+
+from api import routes
+from core.admission import AdmissionController, AdmissionRejected
+
+pytestmark = pytest.mark.anyio
+
+
+def _controller(**kwargs):
+    options = {"max_scrolls": 4, "max_documents": 1000, "cheap_documents": 10, "max_queue": 2, "queue_timeout": 1.0}
+    options.update(kwargs)
+    return AdmissionController(**options)
+
+
+async def test_usage_is_released_after_the_block():
+    admission = _controller()
+    async with admission.admit(2, 600):
+        assert (admission.scrolls, admission.documents) == (2, 600)
+    assert (admission.scrolls, admission.documents) == (0, 0)
+    assert admission.admitted == 1
+
+
+async def test_oversized_request_is_capped_to_global_limits():
+    admission = _controller()
+    async with admission.admit(100, 10 ** 6):
+        assert (admission.scrolls, admission.documents) == (4, 1000)
+
+
+async def test_waiters_are_admitted_in_arrival_order():
+    admission = _controller()
+    order = []
+
+    async def heavy(name, documents):
+        async with admission.admit(1, documents):
+            order.append(name)
+
+    async with admission.admit(1, 900):
+        first = asyncio.ensure_future(heavy("first", 500))
+        await asyncio.sleep(0)
+        # 后到的请求额度够用也要排在前面的等待者之后
+        second = asyncio.ensure_future(heavy("second", 50))
+        await asyncio.sleep(0)
+        assert admission.stats()["waiting"] == 2 and order == []
+    await asyncio.gather(first, second)
+    assert order == ["first", "second"]
+    assert admission.queued == 2
+
+
+async def test_cheap_requests_bypass_the_queue():
+    admission = _controller(max_queue=0)
+    async with admission.admit(4, 1000):
+        async with admission.admit(1, 5):
+            assert admission.bypassed == 1
+
+
+async def test_full_queue_is_rejected_with_retry_after():
+    admission = _controller(max_queue=0)
+    async with admission.admit(1, 1000):
+        with pytest.raises(AdmissionRejected) as excinfo:
+            async with admission.admit(1, 500):
+                pass
+    assert excinfo.value.retry_after >= 1
+    assert admission.rejected == 1
+
+
+async def test_queue_timeout_is_rejected_and_leaves_no_waiter():
+    admission = _controller(queue_timeout=0.05)
+    async with admission.admit(1, 1000):
+        with pytest.raises(AdmissionRejected):
+            async with admission.admit(1, 500):
+                pass
+        assert admission.stats()["waiting"] == 0
+    assert (admission.scrolls, admission.documents) == (0, 0)
+
+
+async def test_cancelled_waiter_does_not_leak_usage():
+    admission = _controller()
+    holder = admission.admit(1, 1000)
+    await holder.__aenter__()
+
+    async def waiting():
+        async with admission.admit(1, 500):
+            await asyncio.Event().wait()
+
+    waiter = asyncio.ensure_future(waiting())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    await holder.__aexit__(None, None, None)
+    assert (admission.scrolls, admission.documents) == (0, 0)
+    assert admission.stats()["waiting"] == 0
+
+
+async def test_search_route_returns_429_when_overloaded(service, monkeypatch):
+    monkeypatch.setattr(routes, "search_service", service)
+    service.admission = _controller(max_scrolls=1, max_documents=1, cheap_documents=0, max_queue=0)
+    request = Request({"type": "http", "method": "POST", "headers": [], "query_string": b""})
+    async with service.admission.admit(1, 1):
+        with pytest.raises(HTTPException) as excinfo:
+            await routes.search(routes.SearchRequest(
+                keyword="经济", start_time="2024-01-01 00:00:00", end_time="2024-02-28 23:59:59"), request)
+    assert excinfo.value.status_code == 429
+    assert int(excinfo.value.headers["Retry-After"]) >= 1
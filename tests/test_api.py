@@ -0,0 +1,93 @@
+"""接口层：直接调用路由函数，检查返回的状态码与流式帧"""
+import json
+
+import pytest
+from fastapi import HTTPException, Request
+
+from api import routes
+from core.admission import AdmissionController
+from core.hits import HIT_SOURCE_FIELDS
+
+pytestmark = pytest.mark.anyio
+
+KEYWORD = "经济"
+START_TIME = "2024-01-01 00:00:00"
+END_TIME = "2024-02-28 23:59:59"
+
+
+@pytest.fixture
+def api_service(service, monkeypatch):
+    monkeypatch.setattr(routes, "search_service", service)
+    return service
+
+
+@pytest.fixture
+def search_bodies(api_service, monkeypatch):
+    """记录发往ES的搜索请求体"""
+    bodies = []
+    make_request = api_service.es_client._make_request
+
+    async def recording(method, endpoint, data=None):
+        if endpoint.split("?", 1)[0].endswith("_search") and data and "query" in data:
+            bodies.append(data)
+        return await make_request(method, endpoint, data)
+
+    monkeypatch.setattr(api_service.es_client, "_make_request", recording)
+    return bodies
+
+
+def _http_request() -> Request:
+    return Request({"type": "http", "method": "POST", "headers": [], "query_string": b""})
+
+
+async def _read_frames(response):
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    return [json.loads(line) for line in body.splitlines()]
+
+
+async def test_search_stream_returns_progress_and_summary(api_service):
+    response = await routes.search_stream(routes.SearchRequest(
+        keyword=KEYWORD, start_time=START_TIME, end_time=END_TIME, page_size=20))
+    frames = await _read_frames(response)
+    assert {frame["type"] for frame in frames[:-1]} == {"progress"}
+    assert frames[-1]["type"] == "summary"
+    assert frames[-1]["data"]["total"] == frames[-2]["total"]
+    assert api_service.admission.scrolls == 0 and api_service.admission.documents == 0
+
+
+async def test_search_stream_rejected_before_streaming(api_service):
+    admission = AdmissionController(max_scrolls=1, max_documents=1, cheap_documents=0, max_queue=0)
+    api_service.admission = admission
+    async with admission.admit(1, 1):
+        with pytest.raises(HTTPException) as excinfo:
+            await routes.search_stream(routes.SearchRequest(
+                keyword=KEYWORD, start_time=START_TIME, end_time=END_TIME, page_size=20))
+    assert excinfo.value.status_code == 429
+    assert int(excinfo.value.headers["Retry-After"]) >= 1
+    assert admission.rejected == 1
+
+
+async def test_search_fetches_only_hit_fields(api_service, search_bodies):
+    response = await routes.search(routes.SearchRequest(
+        keyword=KEYWORD, start_time=START_TIME, end_time=END_TIME, page_size=20, highlight=False), _http_request())
+    data = json.loads(response.body)["data"]
+    assert data["total"] > 0 and data["words"]
+    assert search_bodies and all(body["_source"] == HIT_SOURCE_FIELDS for body in search_bodies)
+
+
+async def test_batch_search_fetches_only_hit_fields(api_service, search_bodies):
+    response = await routes.search_batch(routes.BatchSearchRequest(
+        keywords=[KEYWORD, "发展"], start_time=START_TIME, end_time=END_TIME, page_size=20))
+    result = json.loads(response.body)
+    assert [entry["keyword"] for entry in result["data"]["keywords"]] == [KEYWORD, "发展"]
+    assert all(entry["words"] for entry in result["data"]["keywords"])
+    assert search_bodies and all(body["_source"] == HIT_SOURCE_FIELDS for body in search_bodies)
+
+
+async def test_sampled_search_extracts_compact_hits(api_service, search_bodies):
+    response = await routes.search(routes.SearchRequest(
+        keyword=KEYWORD, start_time=START_TIME, end_time=END_TIME, sample=30, seed=7), _http_request())
+    data = json.loads(response.body)["data"]
+    assert data["sample"]["size"] == 30
+    assert all(low <= word["estimate"] <= high for word in data["words"] for low, high in [word["ci"]])
+    assert search_bodies[-1]["_source"] == HIT_SOURCE_FIELDS
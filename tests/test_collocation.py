@@ -0,0 +1,65 @@
+"""搭配计数：堆取前N名与Counter.most_common一致，超出条目上限时标记为近似"""
+import random
+from collections import Counter
+
+from core.collocation import CollocationCounter
+
+KEYWORD = "经济"
+
+
+def random_contexts(rng, count):
+    words = ["发展", "增长", "数字", "政策", "市场", "全球", "新", "的"]
+    return [rng.choice(words) + KEYWORD + rng.choice(words) for _ in range(count)]
+
+
+def test_top_matches_most_common():
+    rng = random.Random(3)
+    counter = Counter(rng.choice("abcdefghij") for _ in range(500))
+    for top_n in (1, 3, 10, 20):
+        assert CollocationCounter.top(counter, top_n) == counter.most_common(top_n)
+    assert CollocationCounter.top(counter) == counter.most_common()
+
+
+def test_counts_and_neighbors_are_exact_below_max_entries():
+    contexts = random_contexts(random.Random(5), 300)
+    collocations = CollocationCounter(KEYWORD, ngram=2)
+    collocations.update(contexts)
+
+    expected = Counter(contexts)
+    assert not collocations.approximate
+    assert collocations.total == len(contexts)
+    assert collocations.top_words(5) == [{"word": word, "count": count} for word, count in expected.most_common(5)]
+    left = Counter(context[:context.index(KEYWORD)][-1:] for context in contexts)
+    assert collocations.neighbors()["left"]["1"] == [{"word": word, "count": count} for word, count in left.most_common()]
+
+
+def test_merge_equals_sequential_updates():
+    contexts = random_contexts(random.Random(11), 200)
+    merged = CollocationCounter(KEYWORD)
+    for start in range(0, len(contexts), 50):
+        partial = CollocationCounter(KEYWORD)
+        partial.update(contexts[start:start + 50])
+        merged.merge(partial)
+
+    sequential = CollocationCounter(KEYWORD)
+    sequential.update(contexts)
+    assert merged.to_state() == sequential.to_state()
+
+
+def test_pruning_keeps_heavy_hitters_and_sets_approximate():
+    collocations = CollocationCounter(KEYWORD, ngram=1, max_entries=10)
+    heavy = [f"热门{KEYWORD}{n}" for n in range(3)]
+    for _ in range(50):
+        collocations.update(heavy)
+    collocations.update(f"长尾{n}{KEYWORD}" for n in range(30))
+
+    assert collocations.approximate
+    assert len(collocations.contexts) <= 10
+    assert [entry["word"] for entry in collocations.top_words(3)] == heavy
+    assert all(entry["count"] == 50 for entry in collocations.top_words(3))
+
+    # 近似标记在合并和落盘后保留
+    merged = CollocationCounter(KEYWORD, ngram=1)
+    merged.merge(collocations)
+    assert merged.approximate
+    assert CollocationCounter.from_state(collocations.to_state()).approximate
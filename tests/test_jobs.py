@@ -0,0 +1,69 @@
+"""后台任务经过准入控制：额度不足时等待，被拒绝时重试且不计入失败次数"""
+import asyncio
+
+import pytest
+
+from core import jobs as jobs_module
+from core.admission import AdmissionController
+from core.jobs import JobManager
+
+pytestmark = pytest.mark.anyio
+
+KEYWORD = "经济"
+START_TIME = "2024-01-01 00:00:00"
+END_TIME = "2024-02-28 23:59:59"
+
+
+@pytest.fixture
+def job_manager(service, tmp_path, monkeypatch):
+    # 每批2页，两个月的任务要多次归还、重新申请额度
+    monkeypatch.setattr(jobs_module, "JOB_SPILL_PAGES", 2)
+
+    def create(admission):
+        return JobManager(service.es_client, service.extraction_pool, str(tmp_path), admission=admission)
+    return create
+
+
+async def _wait_for_status(manager, job_id, statuses, timeout=10):
+    async def poll():
+        while manager.get(job_id)["status"] not in statuses:
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+    return manager.get(job_id)
+
+
+async def test_job_waits_for_admission(service, job_manager):
+    admission = AdmissionController(max_scrolls=2, max_documents=1000, cheap_documents=0, max_queue=5,
+                                    queue_timeout=5)
+    manager = job_manager(admission)
+    async with admission.admit(2, 1000):
+        job = manager.submit(KEYWORD, START_TIME, END_TIME, 50, None, 20, 2)
+        await asyncio.sleep(0.2)
+        assert manager.get(job["id"])["progress"]["fetched"] == 0
+        assert admission.stats()["waiting"] == 1
+
+    job = await _wait_for_status(manager, job["id"], ("completed", "failed"))
+    assert job["status"] == "completed"
+    expected = await service.es_client.count_hits(KEYWORD, START_TIME, END_TIME)
+    assert job["progress"]["fetched"] == expected
+    # 每批落盘后归还额度并重新申请
+    assert admission.admitted > 2
+    assert (admission.scrolls, admission.documents) == (0, 0)
+    await manager.close()
+
+
+async def test_rejected_job_retries_without_counting_attempts(service, job_manager):
+    # 没有已完成的占用时Retry-After取queue_timeout
+    admission = AdmissionController(max_scrolls=1, max_documents=1000, cheap_documents=0, max_queue=0,
+                                    queue_timeout=1)
+    manager = job_manager(admission)
+    holder = admission.admit(1, 1000)
+    await holder.__aenter__()
+    job = manager.submit(KEYWORD, START_TIME, END_TIME, 50, None, 20, 2)
+    await asyncio.sleep(0.2)
+    await holder.__aexit__(None, None, None)
+
+    job = await _wait_for_status(manager, job["id"], ("completed", "failed"))
+    assert job["status"] == "completed" and job["attempts"] == 0
+    assert admission.rejected >= 1
+    await manager.close()
@@ -0,0 +1,44 @@
+"""多模式匹配：与逐个关键词str.find的结果一致"""
+import random
+
+import pytest
+
+from core import matcher as matcher_module
+from core.matcher import AhoCorasick
+
+ALPHABET = "经济发展ab"
+PATTERNS = ["经济", "经济发展", "济发", "发展经济", "a", "ab", "aba", "b"]
+
+
+def naive_finditer(text, patterns):
+    found = []
+    for pattern in dict.fromkeys(patterns):
+        index = text.find(pattern)
+        while index != -1:
+            found.append((index, pattern))
+            index = text.find(pattern, index + 1)
+    return sorted(found)
+
+
+@pytest.fixture(params=["python", "pyahocorasick"])
+def implementation(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(matcher_module, "ahocorasick", None)
+    elif matcher_module.ahocorasick is None:
+        pytest.skip("未安装pyahocorasick")
+    return request.param
+
+
+def test_finditer_matches_naive_find(implementation):
+    rng = random.Random(7)
+    for _ in range(500):
+        patterns = rng.sample(PATTERNS, rng.randint(1, len(PATTERNS)))
+        text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 40)))
+        assert sorted(AhoCorasick(patterns).finditer(text)) == naive_finditer(text, patterns)
+
+
+def test_duplicate_and_empty_patterns_are_ignored(implementation):
+    matcher = AhoCorasick(["经济", "", "经济", "发展"])
+    assert matcher.patterns == ["经济", "发展"]
+    assert sorted(matcher.finditer("经济经济发展")) == [(0, "经济"), (2, "经济"), (4, "发展")]
+    assert list(AhoCorasick([]).finditer("经济")) == []
@@ -0,0 +1,89 @@
+"""只清理、折叠上下文窗口：结果与先清理、折叠整篇再截取一致"""
+import random
+
+import pytest
+
+from core import normalizer
+from core.extractor import find_context, process_document_batch
+from core.matcher import AhoCorasick
+from core.normalizer import clean_text, context_window, fold_table
+
+ALPHABET = list("经济發展經ab ＡＢａｂ") + ["😀", "\ud800"]
+KEYWORDS = ("经济", "ab", "a b", "济发", "b")
+
+
+def whole_text_context(text, keyword, context_chars, table):
+    text = normalizer.fold(clean_text(text), table)
+    index = text.find(keyword)
+    return "" if index == -1 else text[max(0, index - context_chars):index + len(keyword) + context_chars]
+
+
+def whole_text_matches(text, keywords, context_chars, table):
+    text = normalizer.fold(clean_text(text), table)
+    matches = []
+    for keyword in keywords:
+        index = text.find(keyword)
+        while index != -1:
+            start = max(0, index - context_chars)
+            matches.append((keyword, text[start:index + len(keyword) + context_chars], index - start))
+            index = text.find(keyword, index + 1)
+    return sorted(matches)
+
+
+@pytest.fixture(params=[(False, False), (True, False), (True, True)], ids=["plain", "width", "traditional"])
+def table(request):
+    width, traditional = request.param
+    if traditional and normalizer.opencc is None:
+        pytest.skip("未安装opencc")
+    return fold_table(width=width, traditional=traditional)
+
+
+def test_context_window_cleans_only_the_window():
+    text = "前😀文" * 5 + "经济" + "后\ud800文" * 5
+    index = text.index("经济")
+    context, offset = context_window(text, index, 2, 4)
+    assert context == "前文前文经济后文后文"
+    assert context[offset:offset + 2] == "经济"
+
+
+def test_keyword_split_by_removed_character_falls_back_to_whole_text():
+    text = "开头经😀济发展，后面又出现经济"
+    assert find_context(text, "经济", 2) == whole_text_context(text, "经济", 2, None) == "开头经济发展"
+
+
+def test_find_context_matches_whole_text_cleaning(table):
+    rng = random.Random(17)
+    for _ in range(3000):
+        text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 30)))
+        keyword = rng.choice(KEYWORDS)
+        context_chars = rng.randint(0, 5)
+        assert find_context(text, keyword, context_chars, table) == \
+            whole_text_context(text, keyword, context_chars, table), (text, keyword, context_chars)
+
+
+def test_batch_matches_whole_text_cleaning(table):
+    rng = random.Random(19)
+    matcher = AhoCorasick(KEYWORDS)
+    for _ in range(3000):
+        text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 30)))
+        context_chars = rng.randint(0, 5)
+        found = process_document_batch({"_source": {"content": text}}, matcher, context_chars, table)
+        assert sorted(found) == whole_text_matches(text, KEYWORDS, context_chars, table), (text, context_chars)
+
+
+def test_width_folding_locates_without_folding_the_text():
+    table = fold_table(width=True, traditional=False)
+    text = "全角的ＧＤＰ增长"
+    assert find_context(text, "GDP", 2, table) == "角的GDP增长"
+    assert find_context(text, "ＧＤＰ", 2, table) == ""
+
+
+@pytest.mark.skipif(normalizer.opencc is None, reason="未安装opencc")
+def test_traditional_folding():
+    table = fold_table(width=False, traditional=True)
+    keyword = normalizer.fold("經濟", table)
+    assert keyword == "经济"
+    text = "今年經濟發展，经济增长"
+    assert find_context(text, keyword, 2, table) == "今年经济发展"
+    matches = process_document_batch({"_source": {"content": text}}, AhoCorasick([keyword]), 2, table)
+    assert [context for _, context, _ in matches] == ["今年经济发展", "展，经济增长"]
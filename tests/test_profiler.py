@@ -0,0 +1,20 @@
+"""剖析授权：未配置口令时只接受明确开启的值"""
+from core.profiler import Profiler
+
+
+def test_authorize_without_token_accepts_only_explicit_true(tmp_path):
+    profiler = Profiler(directory=str(tmp_path), enabled=True, token="")
+    assert profiler.authorize("1") and profiler.authorize("true") and profiler.authorize("TRUE")
+    for flag in (None, "", "0", "false", "no", "yes", "abc"):
+        assert not profiler.authorize(flag)
+
+
+def test_authorize_with_token_requires_exact_token(tmp_path):
+    profiler = Profiler(directory=str(tmp_path), enabled=True, token="s3cret")
+    assert profiler.authorize("s3cret")
+    assert not profiler.authorize("1") and not profiler.authorize("true")
+
+
+def test_authorize_disabled(tmp_path):
+    profiler = Profiler(directory=str(tmp_path), enabled=False, token="")
+    assert not profiler.authorize("1")
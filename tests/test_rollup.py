@@ -0,0 +1,68 @@
+"""日汇总：各路径返回的取值总数口径一致、未汇总部分过大时改用terms聚合、最近日期重新汇总"""
+from collections import Counter
+from datetime import date
+
+import pytest
+
+from core.rollup import RollupService, RollupStore
+
+pytestmark = pytest.mark.anyio
+
+MONTH_START = "2024-01-01 00:00:00"
+MONTH_END = "2024-01-31 23:59:59"
+
+
+@pytest.fixture
+def rollup(service, tmp_path):
+    rollup = RollupService(service.es_client, RollupStore(str(tmp_path / "rollup.db")))
+    yield rollup
+    rollup.store.close()
+
+
+async def test_rollup_matches_terms_aggregation(rollup):
+    await rollup.fill(days=31, last_day=date(2024, 1, 31))
+    for dimension in ("author", "media"):
+        total, top, source = await rollup.get_top(dimension, MONTH_START, MONTH_END, 5)
+        expected = (await rollup.es_client.get_aggregations(MONTH_START, MONTH_END, [dimension], 5))[dimension]
+        assert source == {"rollup_days": 31, "es_ranges": [], "exact": True}
+        assert total == expected["total"]
+        assert [count for _, count in top] == [entry["count"] for entry in expected["top"]]
+
+
+async def test_rollup_with_small_remainder_merges_composite_counts(rollup):
+    await rollup.fill(days=28, last_day=date(2024, 1, 28))
+    total, top, source = await rollup.get_top("author", MONTH_START, MONTH_END, 5)
+    expected = (await rollup.es_client.get_aggregations(MONTH_START, MONTH_END, ["author"], 5))["author"]
+    assert source["exact"] and source["es_ranges"] == [("2024-01-29 00:00:00", MONTH_END)]
+    assert total == expected["total"]
+    assert [count for _, count in top] == [entry["count"] for entry in expected["top"]]
+
+
+async def test_large_remainder_uses_terms_aggregation(rollup, monkeypatch):
+    await rollup.fill(days=5, last_day=date(2024, 1, 31))
+
+    async def composite(*args, **kwargs):
+        raise AssertionError("未汇总部分过大时不应逐个取值聚合")
+
+    monkeypatch.setattr(rollup.es_client, "get_term_counts", composite)
+    total, top, source = await rollup.get_top("media", MONTH_START, MONTH_END, 5)
+    expected = (await rollup.es_client.get_aggregations(MONTH_START, MONTH_END, ["media"], 5))["media"]
+    assert source == {"rollup_days": 0, "es_ranges": [(MONTH_START, MONTH_END)], "exact": False}
+    assert (total, [count for _, count in top]) == (expected["total"], [entry["count"] for entry in expected["top"]])
+
+
+async def test_fill_rerolls_recent_days(rollup, fake_es):
+    await rollup.fill(days=10, last_day=date(2024, 1, 20), refresh_days=2)
+    before = {day: rollup.store.sum_counts("media", day, day) for day in ("2024-01-12", "2024-01-20")}
+
+    # 已汇总的日期之后才入库的文档
+    for day in ("2024-01-12", "2024-01-20"):
+        fake_es.corpus["qb2024011"].append({
+            "_index": "qb2024011", "_id": f"late-{day}",
+            "_source": {"title": "", "content": "", "add_time": f"{day} 12:00:00", "author": "迟到作者",
+                        "media_name": "迟到媒体"}
+        })
+    await rollup.fill(days=10, last_day=date(2024, 1, 20), refresh_days=2)
+
+    assert rollup.store.sum_counts("media", "2024-01-12", "2024-01-12") == before["2024-01-12"]
+    assert rollup.store.sum_counts("media", "2024-01-20", "2024-01-20") == before["2024-01-20"] + Counter({"迟到媒体": 1})
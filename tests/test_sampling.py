@@ -0,0 +1,69 @@
+"""抽样估算：已知比例的总体上置信区间的覆盖率、有限总体校正与设计效应"""
+import random
+
+from core.sampling import SampleEstimator
+
+TOTAL = 5000
+
+
+def _coverage(proportion, size, trials=1000, seed=23):
+    rng = random.Random(seed)
+    matching = round(TOTAL * proportion)
+    population = [1] * matching + [0] * (TOTAL - matching)
+    estimator = SampleEstimator(size, TOTAL, confidence=0.95)
+    covered = 0
+    for _ in range(trials):
+        count = sum(rng.sample(population, size))
+        point, low, high = estimator.estimate(count)
+        assert low <= point <= high
+        covered += low <= matching <= high
+    return covered / trials
+
+
+def test_interval_covers_known_proportion():
+    for proportion in (0.02, 0.2, 0.5):
+        assert _coverage(proportion, 200) >= 0.9
+
+
+def test_interval_with_large_sampling_fraction():
+    # 抽取一半总体时有限总体校正收窄区间，覆盖率仍应接近名义水平
+    assert _coverage(0.3, TOTAL // 2, trials=300) >= 0.9
+
+
+def test_point_estimate_scales_sample_count():
+    estimator = SampleEstimator(100, 10000)
+    assert estimator.estimate(7)[0] == 700
+    assert estimator.estimate(0)[:2] == (0, 0)
+
+
+def test_census_returns_exact_counts():
+    estimator = SampleEstimator(300, 300)
+    assert estimator.estimate(42) == (42, 42, 42)
+    assert estimator.estimate(500) == (500, 500, 500)
+
+
+def test_finite_population_correction_narrows_interval():
+    small = SampleEstimator(100, 1000).estimate(30)
+    large = SampleEstimator(900, 1000).estimate(270)
+    assert large[0] == small[0] == 300
+    assert large[2] - large[1] < small[2] - small[1]
+
+
+def test_design_effect_widens_interval():
+    plain = SampleEstimator(200, 10000).estimate(40)
+    clustered = SampleEstimator(200, 10000, design_effect=3.0).estimate(40)
+    assert clustered[0] == plain[0]
+    assert clustered[1] <= plain[1] and clustered[2] > plain[2]
+
+
+def test_counts_above_sample_size_use_poisson_interval():
+    point, low, high = SampleEstimator(100, 10000).estimate(250)
+    assert point == 25000
+    assert low < point < high
+
+
+def test_annotate_adds_estimate_and_interval():
+    entries = SampleEstimator(50, 500).annotate([{"word": "经济发展", "count": 5}])
+    assert entries[0]["estimate"] == 50
+    low, high = entries[0]["ci"]
+    assert low <= 50 <= high
@@ -0,0 +1,50 @@
+"""max_results提前结束时返回的命中总数与并发和时序无关"""
+import pytest
+
+from benchmarks.corpus import generate_corpus
+from config.settings import INDEX_CONCURRENCY
+
+pytestmark = pytest.mark.anyio
+
+KEYWORD = "经济"
+START_TIME = "2024-01-01 00:00:00"
+END_TIME = "2024-08-31 23:59:59"
+MONTHS = 8
+
+
+@pytest.fixture
+def corpus():
+    assert MONTHS > INDEX_CONCURRENCY
+    return generate_corpus("2024-01", MONTHS, 200)
+
+
+@pytest.fixture
+async def expected_total(service):
+    return await service.es_client.count_hits(KEYWORD, START_TIME, END_TIME)
+
+
+@pytest.mark.parametrize("max_results", [10, 150, 250, 100000])
+async def test_search_total_independent_of_max_results(service, expected_total, max_results):
+    result = await service.search(KEYWORD, START_TIME, END_TIME, max_results=max_results, page_size=50)
+    assert result["total"] == expected_total
+    assert result["max_results"] == min(max_results, expected_total)
+
+
+async def test_search_total_with_cached_segments(service, expected_total):
+    # 前两个月完整拉取后进入分段缓存，再查全部月份时在缓存分段之后就达到上限
+    await service.search(KEYWORD, START_TIME, "2024-02-29 23:59:59", max_results=100000, page_size=50)
+    result = await service.search(KEYWORD, START_TIME, END_TIME, max_results=10, page_size=50)
+    assert result["cached_segments"] == 0
+    assert result["total"] == expected_total
+
+    cached = await service.search(KEYWORD, START_TIME, "2024-02-29 23:59:59", max_results=100000, page_size=50)
+    result = await service.search(KEYWORD, START_TIME, END_TIME, max_results=cached["max_results"] + 10, page_size=50)
+    assert result["cached_segments"] == 2
+    assert result["total"] == expected_total
+
+
+@pytest.mark.parametrize("max_results", [10, 250])
+async def test_batch_total_independent_of_max_results(service, max_results):
+    expected = await service.es_client.count_hits([KEYWORD, "发展"], START_TIME, END_TIME)
+    result = await service.search_batch([KEYWORD, "发展"], START_TIME, END_TIME, max_results=max_results, page_size=50)
+    assert result["total"] == expected
@@ -0,0 +1,68 @@
+"""分段缓存与max_results上限的交互"""
+import pytest
+
+from config.settings import CONTEXT_CHARS, COLLOCATION_NGRAM
+
+pytestmark = pytest.mark.anyio
+
+KEYWORD = "经济"
+START_TIME = "2024-01-01 00:00:00"
+END_TIME = "2024-02-28 23:59:59"
+
+
+def _cached_entries(service):
+    """本次查询各月分段的缓存项，未缓存为None"""
+    return {
+        segment[0]: service.segment_cache.get(
+            service._segment_key(KEYWORD, segment, CONTEXT_CHARS, COLLOCATION_NGRAM, False))
+        for segment in service.es_client.plan_segments(START_TIME, END_TIME)
+    }
+
+
+async def test_full_search_caches_every_segment(service):
+    result = await service.search(KEYWORD, START_TIME, END_TIME, max_results=10000, page_size=20, highlight=False)
+    entries = _cached_entries(service)
+    assert all(entry is not None for entry in entries.values())
+    assert sum(entry["fetched"] for entry in entries.values()) == result["total"]
+
+
+async def test_segment_cut_by_max_results_is_not_cached(service):
+    await service.search(KEYWORD, START_TIME, END_TIME, max_results=10000, page_size=20, highlight=False)
+    full = _cached_entries(service)
+    january, february = full
+    service.invalidate_cache(KEYWORD, february)
+
+    # 一月命中缓存，二月从ES拉取；整段只有一页，截断后紧接着就是该段的结束标记
+    max_results = full[january]["fetched"] + full[february]["fetched"] // 2
+    result = await service.search(KEYWORD, START_TIME, END_TIME, max_results=max_results, page_size=1000,
+                                  highlight=False)
+    assert result["cached_segments"] == 1
+    assert _cached_entries(service)[february] is None
+
+    # 再次完整查询时二月按全量拉取，结果与首次一致
+    result = await service.search(KEYWORD, START_TIME, END_TIME, max_results=10000, page_size=20, highlight=False)
+    assert _cached_entries(service)[february]["fetched"] == full[february]["fetched"]
+    assert result["total"] == full[january]["fetched"] + full[february]["fetched"]
+
+
+@pytest.mark.parametrize("page_size", [20, 1000])
+async def test_segment_exhausted_exactly_at_max_results_is_cached(service, page_size):
+    await service.search(KEYWORD, START_TIME, END_TIME, max_results=10000, page_size=20, highlight=False)
+    full = _cached_entries(service)
+    january, february = full
+    service.invalidate_cache(KEYWORD)
+
+    # 上限恰好等于一月的命中数：一月在上限处取完，仍是完整分段
+    result = await service.search(KEYWORD, START_TIME, END_TIME, max_results=full[january]["fetched"],
+                                  page_size=page_size, highlight=False)
+    assert result["max_results"] == full[january]["fetched"]
+    entries = _cached_entries(service)
+    assert entries[january]["fetched"] == full[january]["fetched"]
+    assert entries[february] is None
+
+    # 一月命中缓存，二月恰好在上限处取完
+    result = await service.search(KEYWORD, START_TIME, END_TIME,
+                                  max_results=full[january]["fetched"] + full[february]["fetched"],
+                                  page_size=page_size, highlight=False)
+    assert result["cached_segments"] == 1
+    assert _cached_entries(service)[february]["fetched"] == full[february]["fetched"]
@@ -0,0 +1,103 @@
+"""相同参数的并发请求合并：合并键、异常分发与取消"""
+import asyncio
+
+import pytest
+
+from core import search_service as search_service_module
+from core.single_flight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+KEYWORD = "经济"
+START_TIME = "2024-01-01 00:00:00"
+END_TIME = "2024-02-28 23:59:59"
+
+
+async def test_same_key_executes_once():
+    flight = SingleFlight()
+    release = asyncio.Event()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await release.wait()
+        return "done"
+
+    waiters = [asyncio.ensure_future(flight.do("key", work)) for _ in range(3)]
+    other = asyncio.ensure_future(flight.do("other", work))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters, other) == ["done"] * 4
+    assert len(calls) == 2
+    assert flight.stats()["executions"] == 2 and flight.stats()["coalesced"] == 2
+    assert flight.stats()["in_flight"] == 0
+
+
+async def test_exception_is_delivered_to_every_waiter():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise ValueError("ES不可用")
+
+    results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.executions == 1
+
+
+async def test_cancelling_one_waiter_keeps_execution_running():
+    flight = SingleFlight()
+    release = asyncio.Event()
+    started = asyncio.Event()
+
+    async def work():
+        started.set()
+        await release.wait()
+        return "done"
+
+    first = asyncio.ensure_future(flight.do("key", work))
+    second = asyncio.ensure_future(flight.do("key", work))
+    await started.wait()
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await second == "done"
+    assert first.cancelled()
+
+
+async def test_cancelling_all_waiters_cancels_execution():
+    flight = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def work():
+        started.set()
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    waiters = [asyncio.ensure_future(flight.do("key", work)) for _ in range(2)]
+    await started.wait()
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    await asyncio.sleep(0)
+    assert flight.stats()["in_flight"] == 0
+
+
+async def test_search_coalesces_on_fetch_parameters_only(service, monkeypatch):
+    monkeypatch.setattr(search_service_module, "SEARCH_COALESCE_ENABLED", True)
+    first, second, third = await asyncio.gather(
+        service.search(KEYWORD, START_TIME, END_TIME, page_size=20, top_n=5),
+        service.search(KEYWORD, START_TIME, END_TIME, page_size=20, top_n=10),
+        service.search(KEYWORD, START_TIME, END_TIME, page_size=20, max_results=10),
+    )
+    # top_n只影响输出，不参与合并键；max_results不同则单独拉取
+    assert service.single_flight.executions == 2 and service.single_flight.coalesced == 1
+    assert first["total"] == second["total"] == third["total"]
+    assert len(first["words"]) <= 5 and len(second["words"]) <= 10
+    assert third["max_results"] == 10
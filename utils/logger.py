@@ -18,17 +18,26 @@ logger.add(
     colorize=True
 )
 
-# 添加文件输出
-logger.add(
+# 添加文件输出（第一次写入时才打开文件）
+_file_sink = logger.add(
     log_path / "app_{time:YYYY-MM-DD}.log",
     rotation="00:00",  # 每天午夜创建新文件
     retention="30 days",  # 保留30天的日志
     compression="zip",  # 压缩旧日志
     format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
     level=LOG_LEVEL,
-    encoding="utf-8"
+    encoding="utf-8",
+    delay=True
 )
 
+def remove_file_sink():
+    """移除文件输出，只保留控制台输出
+
+    进程池工作进程导入本模块时同样会添加文件输出，多个进程各自轮转、压缩同一个日志文件会相互冲突，
+    工作进程启动时调用本函数，日志只写到stderr。
+    """
+    logger.remove(_file_sink)
+
 def get_logger(name: str):
     """获取指定名称的logger实例"""
     return logger.bind(name=name) 
\ No newline at end of file